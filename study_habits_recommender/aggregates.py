@@ -0,0 +1,148 @@
+"""
+Running per-student statistics updated as study logs arrive
+"""
+
+import bisect
+from array import array
+from datetime import date
+
+
+def _value_order(value):
+    # SQLite stores the category columns as TEXT and sorts NULL first
+    return (value is not None, str(value))
+
+
+class StudentAggregates:
+    """Counts, sums and category frequencies for one student's logs
+
+    Every field is updated in O(1) per log, including the most common
+    distraction level and study time, so nothing needs to rescan the
+    student's history.
+    """
+
+    __slots__ = ('sessions', 'total_hours', 'score_sum', 'score_count',
+                 'distractions', 'study_times', 'top_distraction', 'top_study_time')
+
+    def __init__(self):
+        self.sessions = 0
+        self.total_hours = 0.0
+        self.score_sum = 0
+        self.score_count = 0
+        self.distractions = {}
+        self.study_times = {}
+        self.top_distraction = None
+        self.top_study_time = None
+
+    @staticmethod
+    def _bump(table, value, top):
+        """Increment a frequency table and return the (possibly new) mode
+
+        Ties go to the smallest value, as in SQLiteStorage's
+        ORDER BY count DESC, value (where NULL sorts first).
+        """
+        count = table.get(value, 0) + 1
+        table[value] = count
+        if top not in table or count > table[top]:
+            return value
+        if count == table[top] and _value_order(value) < _value_order(top):
+            return value
+        return top
+
+    def add(self, log):
+        """Fold one log entry into the aggregates"""
+        self.sessions += 1
+        self.total_hours += log['study_hours']
+        if log['quiz_score']:
+            self.score_sum += log['quiz_score']
+            self.score_count += 1
+        self.top_distraction = self._bump(self.distractions, log['distractions'], self.top_distraction)
+        self.top_study_time = self._bump(self.study_times, log['study_time'], self.top_study_time)
+
+    @property
+    def avg_hours(self):
+        return self.total_hours / self.sessions if self.sessions else 0
+
+    @property
+    def avg_score(self):
+        return self.score_sum / self.score_count if self.score_count else 0
+
+
+def day_ordinal(date_str):
+    """Convert a 'YYYY-MM-DD' string to a proleptic ordinal, or None if it isn't a date"""
+    try:
+        return date.fromisoformat(date_str).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_iso_date(date_str):
+    """True only for a canonical 'YYYY-MM-DD' string (fromisoformat also takes '20240105' etc.)"""
+    ordinal = day_ordinal(date_str)
+    return ordinal is not None and date.fromordinal(ordinal).isoformat() == date_str
+
+
+# Study logs must be dated inside this window (canonical dates compare correctly as strings)
+MIN_LOG_DATE = '1970-01-01'
+MAX_LOG_DATE = '2099-12-31'
+
+
+def is_log_date(date_str):
+    """True for a canonical 'YYYY-MM-DD' date inside the window study logs may use"""
+    return is_iso_date(date_str) and MIN_LOG_DATE <= date_str <= MAX_LOG_DATE
+
+
+class StreakTracker:
+    """Runs of consecutive study days for one student
+
+    Days are ordinal integers. Only the run boundaries are kept, in two
+    parallel sorted int32 arrays (the in-memory twin of SQLiteStorage's
+    student_runs table), so memory grows with the number of runs rather
+    than the number of logs. Adding a day (even a back-dated one that
+    bridges two runs) is a bisect plus at most one insert or delete, and
+    the longest streak only ever needs updating at that point.
+    """
+
+    __slots__ = ('starts', 'ends', 'longest')
+
+    def __init__(self):
+        self.starts = array('i')
+        self.ends = array('i')
+        self.longest = 0
+
+    def add(self, day):
+        if day is None:
+            return
+        # Runs before i start on or before day
+        i = bisect.bisect_right(self.starts, day)
+        if i and self.ends[i - 1] >= day:
+            return  # already inside a run
+
+        joins_left = i > 0 and self.ends[i - 1] == day - 1
+        joins_right = i < len(self.starts) and self.starts[i] == day + 1
+        if joins_left and joins_right:
+            self.ends[i - 1] = self.ends[i]
+            del self.starts[i]
+            del self.ends[i]
+            i -= 1
+        elif joins_left:
+            i -= 1
+            self.ends[i] = day
+        elif joins_right:
+            self.starts[i] = day
+        else:
+            self.starts.insert(i, day)
+            self.ends.insert(i, day)
+        self.longest = max(self.longest, self.ends[i] - self.starts[i] + 1)
+
+    def current(self, today):
+        """Consecutive days ending today (0 if there is no log today)
+
+        Future-dated logs don't cancel the streak: if today sits inside a run
+        that carries on past it, the days from the run's start up to today
+        count. (The original per-request scan returned 0 as soon as any log
+        was dated after today.)
+        """
+        i = bisect.bisect_right(self.starts, today)
+        if i and self.ends[i - 1] >= today:
+            return today - self.starts[i - 1] + 1
+        return 0
@@ -0,0 +1,140 @@
+"""
+Materialized admin analytics and cluster insights
+"""
+
+import threading
+
+import numpy as np
+
+from shared_model import nearest_centroid
+
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+
+class AnalyticsView:
+    """Counters behind /api/admin/analytics, updated as events happen
+
+    Used by the in-memory storage backend (SQLite keeps the same counters
+    in a table). Every mutation bumps ``version``, which the endpoint uses
+    as its ETag, so an unchanged dashboard costs a 304 and no work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.total_students = 0
+        self.total_logs = 0
+        self.active_students = 0
+        self.hours_sum = 0.0
+        self.cluster_counts = {}
+
+    def student_added(self):
+        with self._lock:
+            self.total_students += 1
+            self.version += 1
+
+    def log_added(self, log, first_for_student=False):
+        with self._lock:
+            self.total_logs += 1
+            self.hours_sum += log['study_hours']
+            if first_for_student:
+                self.active_students += 1
+            self.version += 1
+
+    def cluster_changed(self, old_cluster, new_cluster):
+        if old_cluster == new_cluster:
+            return
+        with self._lock:
+            if old_cluster is not None:
+                self.cluster_counts[old_cluster] -= 1
+            if new_cluster is not None:
+                self.cluster_counts[new_cluster] = self.cluster_counts.get(new_cluster, 0) + 1
+            self.version += 1
+
+    def rollups_rebuilt(self):
+        with self._lock:
+            self.version += 1
+
+    def counters(self):
+        """Return a consistent copy of the counters (the shape every storage backend reports)"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'total_students': self.total_students,
+                'total_logs': self.total_logs,
+                'active_students': self.active_students,
+                'hours_sum': self.hours_sum,
+                'cluster_counts': dict(self.cluster_counts)
+            }
+
+
+def analytics_payload(counters, cluster_profiles):
+    """Build the /api/admin/analytics response from counters; O(number of clusters)"""
+    distribution = {}
+    for cluster_id, count in sorted(counters['cluster_counts'].items()):
+        if count:
+            name = cluster_profiles.get(cluster_id, {}).get('name', f'Cluster {cluster_id}')
+            distribution[name] = distribution.get(name, 0) + count
+    total_logs = counters['total_logs']
+    return {
+        'total_students': counters['total_students'],
+        'total_logs': total_logs,
+        'active_students': counters['active_students'],
+        'avg_study_hours': round(counters['hours_sum'] / total_logs, 2) if total_logs else 0,
+        'cluster_distribution': distribution
+    }
+
+
+def compute_cluster_insights(features, model, feature_names, chunk_size):
+    """Summarize a model: per-cluster centroids, sizes and silhouette scores
+
+    model holds the scaler's 'mean' and 'scale' and the scaled-space
+    'centers' (an exported centroid record, or the same fields of a freshly
+    fitted model), so the insights can follow online centroid updates.
+    features may be a memory-mapped matrix; labels are computed chunk by
+    chunk and silhouette scores on a fixed-size random subsample, so the
+    cost stays bounded for large datasets.
+    """
+    from sklearn.metrics import silhouette_samples
+
+    mean, scale = np.asarray(model['mean']), np.asarray(model['scale'])
+    n_clusters = len(model['centers'])
+    n_samples = len(features)
+
+    sizes = np.zeros(n_clusters, dtype=np.int64)
+    for start in range(0, n_samples, chunk_size):
+        chunk = np.asarray(features[start:start + chunk_size], dtype=np.float64)
+        sizes += np.bincount(nearest_centroid(model, chunk), minlength=n_clusters)
+
+    rng = np.random.default_rng(42)
+    sample_idx = np.sort(rng.choice(n_samples, size=min(n_samples, SILHOUETTE_SAMPLE_SIZE), replace=False))
+    raw_sample = np.asarray(features[sample_idx], dtype=np.float64)
+    sample = (raw_sample - mean) / scale
+    sample_labels = nearest_centroid(model, raw_sample)
+
+    if len(np.unique(sample_labels)) > 1:
+        scores = silhouette_samples(sample, sample_labels)
+        overall = float(scores.mean())
+    else:
+        scores, overall = None, None
+
+    centroids = np.asarray(model['centers']) * scale + mean
+    clusters = []
+    for cluster_id in range(n_clusters):
+        members = sample_labels == cluster_id
+        silhouette = float(scores[members].mean()) if scores is not None and members.any() else None
+        clusters.append({
+            'cluster_id': cluster_id,
+            'size': int(sizes[cluster_id]),
+            'share': round(100 * sizes[cluster_id] / n_samples, 1) if n_samples else 0,
+            'centroid': {name: round(float(value), 3) for name, value in zip(feature_names, centroids[cluster_id])},
+            'silhouette': round(silhouette, 3) if silhouette is not None else None
+        })
+
+    return {
+        'samples': n_samples,
+        'silhouette': round(overall, 3) if overall is not None else None,
+        # Silhouette rescaled from [-1, 1] to a 0-100 quality score
+        'data_quality': round(50 * (overall + 1), 1) if overall is not None else None,
+        'clusters': clusters
+    }
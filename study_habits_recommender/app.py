@@ -1,33 +1,182 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 import json
 import numpy as np
-import pandas as pd
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-import pickle
 import secrets
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from model_registry import ModelRegistry, atomic_pickle_dump
+from jobs import SingleFlightExecutor
+from ingest import ingest_csv, validate_log_batch, CHUNK_SIZE, FEATURE_COLUMNS
+from feature_cache import FeatureCache
+from analytics import analytics_payload, compute_cluster_insights
+from storage import create_storage, LOG_COLUMNS
+from response_cache import LRUCache
+from shared_model import SharedCentroids, export_centroids, label_agreement, file_lock
+from metrics import MetricsRegistry, SpanTimer
+from profiler import SamplingProfiler, ProfileStore
+from online_clustering import OnlineClusterer
+from model_selection import fit_minibatch_kmeans, select_model
+from cluster_profiles import ClusterProfileFile, build_cluster_profiles, save_cluster_profiles
+from dashboard_events import ChangeNotifier, StreamSlots, client_disconnected, sse_event
+from exports import EXPORT_FORMATS, STUDENT_EXPORT_FIELDS, log_records, student_records, encode_records, gzip_chunks
+from aggregates import MIN_LOG_DATE, MAX_LOG_DATE, day_ordinal, is_iso_date, is_log_date
+from rollups import PERIODS, UNASSIGNED, bucket, correlation_payload, period_keys, period_label, series_payload
+
+def load_secret_key(path='data/.secret_key'):
+    """Session signing key shared by every worker process
+    
+    Taken from SECRET_KEY if set, otherwise generated once into a file
+    that all workers (and later restarts) read back.
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another worker may still be writing it
+        for _ in range(50):
+            with open(path) as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise RuntimeError(f'Secret key file {path} is empty')
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
+class JSONProvider(DefaultJSONProvider):
+    """Also serializes read-only mappings such as the in-memory store's log rows"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+app.json_provider_class = JSONProvider
+app.json = JSONProvider(app)
+app.secret_key = load_secret_key()
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['DATA_FILE'] = 'data/sample_student_data.csv'
+app.config['TRAINING_EPOCHS'] = 3  # passes over the data for MiniBatchKMeans
+app.config['N_CLUSTERS'] = 4  # until model selection picks another count
+# Candidates tried by /api/admin/select-model, in parallel processes
+app.config['MODEL_SELECTION_K'] = list(range(2, 9))
+app.config['MODEL_SELECTION_DBSCAN_EPS'] = [0.3, 0.5]  # reported for comparison only
+app.config['MODEL_SELECTION_METRIC'] = 'silhouette'  # or 'davies_bouldin'
+app.config['MODEL_SELECTION_WORKERS'] = None  # default: one per CPU
+# 'memory' (default, process-local) or 'sqlite' (persistent, shareable by workers)
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'memory')
+app.config['DATABASE_PATH'] = os.environ.get('DATABASE_PATH', 'data/study_habits.db')
+app.config['RECOMMENDATION_CACHE_SIZE'] = 10000  # students
+# Bearer token that lets a Prometheus scraper read /api/admin/metrics without a session
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Allow "X-Profile: 1" for every client, not just signed-in admins
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED') == '1'
+# Online k-means: live student features nudge the centroids between retrains
+app.config['ONLINE_LEARNING'] = os.environ.get('ONLINE_LEARNING') == '1'
+# Seconds for older data's weight in the centroids to halve (by elapsed time, not per batch or worker)
+app.config['ONLINE_HALF_LIFE'] = float(os.environ.get('ONLINE_HALF_LIFE', 86400))
+app.config['ONLINE_BATCH_SIZE'] = 256
+app.config['ONLINE_FLUSH_INTERVAL'] = 5.0  # seconds before a partial batch is applied
+app.config['ONLINE_QUEUE_SIZE'] = 10000
+app.config['EXPORT_CHUNK_SIZE'] = 5000  # rows read from storage per chunk of an export
+# Live student dashboard (Server-Sent Events)
+app.config['DASHBOARD_STREAM_POLL_INTERVAL'] = 2.0  # seconds between checks for changes from other workers
+app.config['DASHBOARD_STREAM_HEARTBEAT'] = 15.0  # also how soon a closed connection is noticed
+app.config['DASHBOARD_STREAM_MAX_AGE'] = 300.0  # seconds before the client is made to reconnect
+# Streams open at once per process; each holds a worker thread (gunicorn.conf.py sets half the threads)
+app.config['DASHBOARD_STREAM_MAX'] = int(os.environ.get('DASHBOARD_STREAM_MAX', 64))
+# Seconds between conditional (ETag) refreshes for dashboards that can't get a stream
+app.config['DASHBOARD_POLL_INTERVAL'] = 10.0
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('models', exist_ok=True)
 os.makedirs('data', exist_ok=True)
 
-# In-memory database (replace with SQLite/PostgreSQL in production)
-students_db = {}
-study_logs_db = []
-clusters_db = {}
-recommendations_db = []
+# Model selection's spawned worker processes re-import this file as __mp_main__
+# when the app runs as a script. They only run model_selection functions, so
+# they skip opening storage, training and starting background threads.
+SPAWNED_WORKER = __name__ == '__mp_main__'
+
+# Students, study logs and the counters derived from them
+storage = None if SPAWNED_WORKER else create_storage(app.config['STORAGE_BACKEND'], app.config['DATABASE_PATH'])
 admin_users = {'admin': generate_password_hash('admin123')}
 
+# Built /api/get-recommendations payloads, evicted when a student's logs or cluster change
+recommendation_cache = LRUCache(app.config['RECOMMENDATION_CACHE_SIZE'])
+
+# Fitted model shared by all request threads (reloaded when the pickles change)
+model_registry = ModelRegistry('models/kmeans_model.pkl', 'models/scaler.pkl')
+# Scaler and centroids memory-mapped by every worker for prediction
+shared_centroids = SharedCentroids('models/centroids.npy')
+# Serializes training runs so model files are never written concurrently
+# (the thread lock within a process, the file lock across worker processes)
+training_lock = threading.Lock()
+TRAINING_LOCK_FILE = 'models/.training.lock'
+# Applies queued student feature rows to the shared centroids in the background
+# (and regenerates the cluster profiles from the moved centers)
+online_clusterer = OnlineClusterer(shared_centroids.path, TRAINING_LOCK_FILE,
+                                   half_life=app.config['ONLINE_HALF_LIFE'],
+                                   batch_size=app.config['ONLINE_BATCH_SIZE'],
+                                   queue_size=app.config['ONLINE_QUEUE_SIZE'],
+                                   flush_interval=app.config['ONLINE_FLUSH_INTERVAL'],
+                                   on_update=lambda record: _online_update_applied(record))
+# Job records are also written to disk so any worker can report their status
+background_jobs = SingleFlightExecutor(state_dir='data/jobs')
+# Parsed, encoded copy of the data file that training and insights memory-map
+feature_cache = FeatureCache(app.config['DATA_FILE'], 'data/cache')
+
+# Instrumentation (per process; each worker is scraped separately)
+metrics = MetricsRegistry('study_habits')
+request_latency = metrics.histogram('http_request_duration_seconds', 'Request latency by route',
+                                    labels=('endpoint', 'method', 'status'))
+requests_total = metrics.counter('http_requests_total', 'Requests answered, by route and status',
+                                 labels=('endpoint', 'method', 'status'))
+request_errors = metrics.counter('http_request_exceptions_total', 'Requests that raised an unhandled exception',
+                                 labels=('endpoint', 'exception'))
+spans = SpanTimer(metrics.histogram('span_duration_seconds', 'Time spent in instrumented code regions',
+                                    labels=('span',)))
+metrics.callback('recommendation_cache_hits_total', 'Recommendation cache hits', 'counter',
+                 lambda: recommendation_cache.stats()['hits'])
+metrics.callback('recommendation_cache_misses_total', 'Recommendation cache misses', 'counter',
+                 lambda: recommendation_cache.stats()['misses'])
+metrics.callback('recommendation_cache_evictions_total', 'Recommendation cache evictions', 'counter',
+                 lambda: recommendation_cache.stats()['evictions'])
+metrics.callback('recommendation_cache_entries', 'Recommendation payloads currently cached', 'gauge',
+                 lambda: recommendation_cache.stats()['size'])
+metrics.callback('model_reloads_total', 'Model loads from disk', 'counter',
+                 lambda: [(('pickle',), model_registry.reloads), (('centroids',), shared_centroids.reloads)],
+                 labels=('model',))
+metrics.callback('online_kmeans_points_total', 'Student feature rows seen by the online learner', 'counter',
+                 lambda: [((state,), online_clusterer.stats()[state]) for state in ('submitted', 'dropped', 'applied')],
+                 labels=('state',))
+metrics.callback('online_kmeans_batches_total', 'Online centroid updates applied', 'counter',
+                 lambda: online_clusterer.batches)
+request_profiles = ProfileStore()
+# Wakes this process's dashboard streams when a student's logs change
+dashboard_notifier = ChangeNotifier()
+dashboard_streams = StreamSlots(app.config['DASHBOARD_STREAM_MAX'])
+metrics.callback('dashboard_streams_open', 'Live dashboard streams currently open', 'gauge',
+                 lambda: dashboard_streams.active)
+metrics.callback('dashboard_streams_rejected_total', 'Dashboard streams refused at the limit', 'counter',
+                 lambda: dashboard_streams.rejected)
+
 # Sample behavioral clusters
 CLUSTER_PROFILES = {
     0: {
@@ -84,8 +233,13 @@ CLUSTER_PROFILES = {
     }
 }
 
+# Profiles generated from the live model's centroids (the ones above until then)
+cluster_profiles = ClusterProfileFile('models/cluster_profiles.json', CLUSTER_PROFILES)
+
 def generate_sample_data():
     """Generate sample student behavior data for demonstration"""
+    import pandas as pd
+    
     np.random.seed(42)
     n_students = 1248
     
@@ -99,68 +253,286 @@ def generate_sample_data():
     }
     
     df = pd.DataFrame(data)
-    df.to_csv('data/sample_student_data.csv', index=False)
+    df.to_csv(app.config['DATA_FILE'], index=False)
     return df
 
-def train_clustering_model():
-    """Train the clustering model on student behavior data"""
-    try:
-        df = pd.read_csv('data/sample_student_data.csv')
-    except:
-        df = generate_sample_data()
+@spans.timed('train_clustering_model')
+def train_clustering_model(progress=None):
+    """Train the clustering model on student behavior data
     
-    # Feature engineering
-    df['distraction_encoded'] = df['distraction_frequency'].map({'Low': 0, 'Medium': 1, 'High': 2})
-    df['time_encoded'] = df['preferred_time'].map({'Morning': 0, 'Afternoon': 1, 'Evening': 2, 'Night': 3})
+    progress, if given, is called as progress(fraction, message).
+    """
+    with training_lock, file_lock(TRAINING_LOCK_FILE):
+        return _train_clustering_model(progress or (lambda fraction, message: None))
+
+def _train_clustering_model(progress):
+    if not os.path.exists(app.config['DATA_FILE']):
+        generate_sample_data()
     
-    features = df[['study_hours', 'quiz_score', 'distraction_encoded', 'time_encoded']]
+    progress(0.05, 'Loading training data')
+    features = feature_cache.load()
+    n_samples = len(features)
+    n_clusters = _current_n_clusters()
+    if n_samples < n_clusters:
+        raise ValueError('Not enough valid rows to train the model')
+    
+    # First pass: fit the scaler incrementally, one chunk at a time
+    progress(0.1, 'Scaling features')
+    scaler = _fit_scaler(features)
+    
+    # Further passes: Mini-batch K-Means over the scaled chunks, so peak
+    # memory is one chunk no matter how large the dataset is
+    epochs = app.config['TRAINING_EPOCHS']
+    kmeans = fit_minibatch_kmeans(features, scaler, n_clusters, epochs, CHUNK_SIZE,
+                                  progress=lambda fraction: progress(0.2 + 0.6 * fraction, 'Fitting K-Means'))
+    
+    _publish_model(kmeans, scaler, features, progress)
+    return kmeans, scaler, n_samples
+
+def _current_n_clusters():
+    """Cluster count of the deployed model (possibly chosen by model selection), else the default"""
+    try:
+        return len(shared_centroids.get()['centers'])
+    except (FileNotFoundError, ValueError):
+        return app.config['N_CLUSTERS']
+
+def _fit_scaler(features):
+    from sklearn.preprocessing import StandardScaler
     
-    # Standardize features
     scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(features)
+    for start in range(0, len(features), CHUNK_SIZE):
+        scaler.partial_fit(features[start:start + CHUNK_SIZE].astype(np.float64))
+    return scaler
+
+def _publish_model(kmeans, scaler, features, progress):
+    """Score, save and export a fitted model, then make it the live one (caller holds the training locks)"""
+    # Centroids, sizes and silhouette scores travel with the model
+    progress(0.8, 'Scoring clusters')
+    model = {'mean': scaler.mean_, 'scale': scaler.scale_, 'centers': kmeans.cluster_centers_}
+    kmeans.insights_ = compute_cluster_insights(features, model, FEATURE_COLUMNS, CHUNK_SIZE)
     
-    # Train K-Means clustering
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-    df['cluster'] = kmeans.fit_predict(features_scaled)
+    # Save model and scaler (tagged so readers can tell the pair belongs together)
+    progress(0.9, 'Saving model')
+    kmeans.training_id_ = scaler.training_id_ = uuid.uuid4().hex
+    atomic_pickle_dump(scaler, 'models/scaler.pkl')
+    atomic_pickle_dump(kmeans, 'models/kmeans_model.pkl')
+    export_centroids(kmeans, scaler, shared_centroids.path)
     
-    # Save model and scaler
-    with open('models/kmeans_model.pkl', 'wb') as f:
-        pickle.dump(kmeans, f)
-    with open('models/scaler.pkl', 'wb') as f:
-        pickle.dump(scaler, f)
+    # The NumPy predictor must label the data exactly like scikit-learn
+    agreement = label_agreement(shared_centroids.path, kmeans, scaler,
+                                features[:PREDICT_CHUNK_SIZE].astype(np.float64))
+    if agreement < 1.0:
+        app.logger.warning('Exported model agrees with scikit-learn on %.4f%% of rows', 100 * agreement)
     
-    return kmeans, scaler, df
+    # Names and recommendations for the clusters this model actually found
+    sizes = [cluster['size'] for cluster in kmeans.insights_['clusters']]
+    profiles = build_cluster_profiles(scaler.inverse_transform(kmeans.cluster_centers_), sizes, CLUSTER_PROFILES)
+    _save_cluster_profiles(profiles, kmeans.training_id_)
+    
+    model_registry.publish(kmeans, scaler)
+    shared_centroids.refresh()
+    cluster_profiles.refresh()
 
-def predict_cluster(study_hours, quiz_score, distraction_level, preferred_time):
-    """Predict cluster for a new student"""
+def _online_update_applied(record):
+    """Pick up centers moved by an online update and regenerate the cluster profiles
+    
+    Runs in the learner thread under the training file lock. Cluster sizes
+    stay those of the last training run.
+    """
+    shared_centroids.refresh()
+    cluster_profiles.refresh()
+    current = cluster_profiles.get()
+    centroids = record['centers'] * record['scale'] + record['mean']
+    sizes = [current.get(cluster_id, {}).get('size', 0) for cluster_id in range(len(centroids))]
+    profiles = build_cluster_profiles(centroids, sizes, CLUSTER_PROFILES)
+    _save_cluster_profiles(profiles, f"{record['training_id'].item().decode()}-{int(record['updates'])}")
+
+def _save_cluster_profiles(profiles, version):
+    """Write the profiles unless they equal the current ones (caller holds the training file lock)
+    
+    The profiles version is part of every worker's recommendation cache
+    tokens and ETags, so an unchanged set keeps the old version and those
+    stay valid.
+    """
+    cluster_profiles.refresh()
+    if profiles != cluster_profiles.get():
+        save_cluster_profiles(profiles, cluster_profiles.path, version)
+        cluster_profiles.refresh()
+
+DISTRACTION_MAP = {'None': 0, 'Low': 0, 'Medium': 1, 'High': 2}
+TIME_MAP = {'Morning': 0, 'Afternoon': 1, 'Evening': 2, 'Night': 3}
+PREDICT_CHUNK_SIZE = 10000
+
+def _load_model():
+    """Return the shared (kmeans, scaler), training one if none exists yet"""
     try:
-        with open('models/kmeans_model.pkl', 'rb') as f:
-            kmeans = pickle.load(f)
-        with open('models/scaler.pkl', 'rb') as f:
-            scaler = pickle.load(f)
+        snapshot = model_registry.get()
+        return snapshot.kmeans, snapshot.scaler
     except:
         kmeans, scaler, _ = train_clustering_model()
-    
-    distraction_map = {'None': 0, 'Low': 0, 'Medium': 1, 'High': 2}
-    time_map = {'Morning': 0, 'Afternoon': 1, 'Evening': 2, 'Night': 3}
-    
-    features = np.array([[
+        return kmeans, scaler
+
+def encode_features(study_hours, quiz_score, distraction_level, preferred_time):
+    """Encode one student's behaviour as a model feature row"""
+    return [
         study_hours,
         quiz_score,
-        distraction_map.get(distraction_level, 1),
-        time_map.get(preferred_time, 0)
-    ]])
+        DISTRACTION_MAP.get(distraction_level, 1),
+        TIME_MAP.get(preferred_time, 0)
+    ]
+
+def _load_centroids():
+    """Make sure the exported model exists, exporting or training it if needed"""
+    try:
+        shared_centroids.get()
+    except (FileNotFoundError, ValueError):
+        # Missing or older-format export: rebuild it from the pickled model
+        kmeans, scaler = _load_model()
+        with file_lock(TRAINING_LOCK_FILE):
+            # Another worker (or a training run) may have exported meanwhile
+            shared_centroids.refresh()
+            try:
+                shared_centroids.get()
+            except (FileNotFoundError, ValueError):
+                export_centroids(kmeans, scaler, shared_centroids.path)
+                shared_centroids.refresh()
+    return shared_centroids
+
+@spans.timed('predict_clusters')
+def predict_clusters(features, chunk_size=PREDICT_CHUNK_SIZE):
+    """Predict clusters for an (n, 4) feature matrix, chunk by chunk"""
+    centroids = _load_centroids()
+    features = np.asarray(features, dtype=np.float64)
+    labels = np.empty(len(features), dtype=np.int64)
+    
+    for start in range(0, len(features), chunk_size):
+        labels[start:start + chunk_size] = centroids.predict(features[start:start + chunk_size])
+    
+    return labels
+
+@spans.timed('predict_cluster')
+def predict_cluster(study_hours, quiz_score, distraction_level, preferred_time):
+    """Predict cluster for a new student"""
+    features = encode_features(study_hours, quiz_score, distraction_level, preferred_time)
+    return _load_centroids().predict_one(features)
+
+@spans.timed('reassign_all_clusters')
+def reassign_all_clusters(chunk_size=PREDICT_CHUNK_SIZE):
+    """Re-cluster every student with enough logs using batch prediction
+    
+    Features are built one chunk at a time so memory stays bounded by
+    chunk_size rather than the number of students.
+    """
+    total = changed = 0
+    
+    for chunk in storage.iter_aggregates(min_sessions=3, chunk_size=chunk_size):
+        changed += storage.set_student_clusters(_cluster_assignments(chunk, chunk_size))
+        total += len(chunk)
+    
+    if changed:
+        recommendation_cache.clear()
+    return total, changed
+
+def recluster_students(student_ids):
+    """Recompute clusters for the given students with a single batch prediction"""
+    eligible = []
+    for student_id in student_ids:
+        stats = storage.student_aggregates(student_id)
+        if stats is not None and stats.sessions >= 3:
+            eligible.append((student_id, stats))
+    
+    if not eligible:
+        return 0, 0
+    return len(eligible), storage.set_student_clusters(_cluster_assignments(eligible, learn=True))
+
+def _cluster_assignments(students, chunk_size=PREDICT_CHUNK_SIZE, learn=False):
+    """Predict (student_id, cluster) pairs for (student_id, aggregates) pairs
+    
+    With learn=True the feature rows also go to the online learner.
+    """
+    features = np.array([
+        encode_features(stats.avg_hours, stats.avg_score, stats.top_distraction, stats.top_study_time)
+        for _, stats in students
+    ], dtype=np.float64)
+    if learn:
+        learn_online(zip((student_id for student_id, _ in students), features))
+    labels = predict_clusters(features, chunk_size=chunk_size)
+    return [(student_id, int(label)) for (student_id, _), label in zip(students, labels)]
+
+def model_files_exist():
+    return os.path.exists(model_registry.model_path) and os.path.exists(model_registry.scaler_path)
+
+def train_if_missing():
+    """Train a model only if none has been saved yet
+    
+    A saved model is used as-is (and only loaded when first needed), so
+    restarts and extra workers start in well under a second. Under
+    gunicorn the first worker to take the lock trains; the rest wait and
+    then find the files.
+    """
+    if model_files_exist():
+        return
+    with training_lock, file_lock(TRAINING_LOCK_FILE):
+        if not model_files_exist():
+            _train_clustering_model(lambda fraction, message: None)
+
+def learn_online(rows):
+    """Queue (student_id, feature row) pairs for the online k-means learner, if enabled"""
+    if app.config['ONLINE_LEARNING']:
+        for student_id, row in rows:
+            online_clusterer.submit(student_id, row)
+
+if not SPAWNED_WORKER:
+    # Make sure a model exists on startup
+    try:
+        train_if_missing()
+    except:
+        pass
     
-    features_scaled = scaler.transform(features)
-    cluster = kmeans.predict(features_scaled)[0]
+    if app.config['ONLINE_LEARNING']:
+        online_clusterer.start()
+
+# Request instrumentation
+def profiling_allowed():
+    return app.config['PROFILING_ENABLED'] or 'admin' in session
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Opt-in sampling profile of this one request
+    if request.headers.get('X-Profile') == '1' and profiling_allowed():
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profile_id = request_profiles.add(profiler.stop(), request.path)
+        response.headers['X-Profile-Id'] = profile_id
+        response.headers['X-Profile-Url'] = url_for('request_profile', profile_id=profile_id)
     
-    return int(cluster)
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = metrics_endpoint()
+        request_latency.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+        requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def record_request_exception(exc):
+    if exc is not None:
+        request_errors.inc(endpoint=metrics_endpoint(), exception=type(exc).__name__)
+
+def metrics_endpoint():
+    # Route templates (not raw paths) keep the label set bounded
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
 
-# Initialize clustering model on startup
-try:
-    train_clustering_model()
-except:
-    pass
+@app.teardown_appcontext
+def release_storage_connection(exc):
+    # Hand the SQLite connection back so short-lived request threads don't each keep one open
+    if storage is not None:
+        storage.release_connection()
 
 # Routes
 @app.route('/')
@@ -171,7 +543,7 @@ def index():
 def student_dashboard():
     if 'student_id' not in session:
         return redirect(url_for('student_login'))
-    return render_template('student_dashboard.html')
+    return render_template('student_dashboard.html', poll_interval=app.config['DASHBOARD_POLL_INTERVAL'])
 
 @app.route('/admin')
 def admin_dashboard():
@@ -179,17 +551,19 @@ def admin_dashboard():
         return redirect(url_for('admin_login'))
     
     # Calculate statistics
-    total_students = len(students_db)
-    total_logs = len(study_logs_db)
+    counters = storage.analytics_counters()
+    total_students = counters['total_students']
+    total_logs = counters['total_logs']
     
     # Get recent logs
-    recent_logs = sorted(study_logs_db, key=lambda x: x.get('date', ''), reverse=True)[:10]
+    with spans.span('storage.recent_logs'):
+        recent_logs = storage.recent_logs(10)
     
     return render_template('admin_dashboard.html', 
                          total_students=total_students,
                          total_logs=total_logs,
                          recent_logs=recent_logs,
-                         clusters=CLUSTER_PROFILES)
+                         clusters=cluster_profiles.get())
 
 @app.route('/student/login', methods=['GET', 'POST'])
 def student_login():
@@ -200,13 +574,12 @@ def student_login():
         
         if email and name:
             student_id = email
-            if student_id not in students_db:
-                students_db[student_id] = {
-                    'name': name,
-                    'email': email,
-                    'cluster_id': None,
-                    'created_at': datetime.now().isoformat()
-                }
+            storage.add_student(student_id, {
+                'name': name,
+                'email': email,
+                'cluster_id': None,
+                'created_at': datetime.now().isoformat()
+            })
             
             session['student_id'] = student_id
             session['student_name'] = name
@@ -243,10 +616,14 @@ def log_study():
     
     data = request.get_json()
     
+    date_str = data.get('date', datetime.now().strftime('%Y-%m-%d'))
+    if not is_log_date(date_str):
+        return jsonify({'success': False,
+                        'message': f'Invalid date (expected YYYY-MM-DD between {MIN_LOG_DATE} and {MAX_LOG_DATE})'}), 400
+    
     log_entry = {
-        'log_id': len(study_logs_db) + 1,
         'student_id': session['student_id'],
-        'date': data.get('date', datetime.now().strftime('%Y-%m-%d')),
+        'date': date_str,
         'study_hours': float(data.get('study_hours', 0)),
         'subject': data.get('subject', ''),
         'study_time': data.get('study_time', ''),
@@ -255,49 +632,136 @@ def log_study():
         'quiz_score': int(data.get('quiz_score', 0)) if data.get('quiz_score') else None
     }
     
-    study_logs_db.append(log_entry)
+    with spans.span('storage.add_logs'):
+        log_entry = storage.add_log(log_entry)
+    recommendation_cache.invalidate(session['student_id'])
+    with spans.span('storage.student_aggregates'):
+        stats = storage.student_aggregates(session['student_id'])
     
     # Update student cluster if we have enough data
-    student_logs = [log for log in study_logs_db if log['student_id'] == session['student_id']]
-    
-    if len(student_logs) >= 3:
-        avg_hours = np.mean([log['study_hours'] for log in student_logs])
-        avg_score = np.mean([log['quiz_score'] for log in student_logs if log['quiz_score']])
-        most_common_distraction = max(set([log['distractions'] for log in student_logs]), 
-                                      key=[log['distractions'] for log in student_logs].count)
-        most_common_time = max(set([log['study_time'] for log in student_logs]), 
-                              key=[log['study_time'] for log in student_logs].count)
-        
-        cluster = predict_cluster(avg_hours, avg_score, most_common_distraction, most_common_time)
-        students_db[session['student_id']]['cluster_id'] = cluster
+    if stats.sessions >= 3:
+        cluster = predict_cluster(stats.avg_hours, stats.avg_score,
+                                  stats.top_distraction, stats.top_study_time)
+        storage.set_student_cluster(session['student_id'], cluster)
+        learn_online([(session['student_id'], encode_features(stats.avg_hours, stats.avg_score,
+                                                              stats.top_distraction, stats.top_study_time))])
+    
+    dashboard_notifier.notify([session['student_id']])
     
     return jsonify({'success': True, 'log_id': log_entry['log_id']})
 
+def _read_bulk_records():
+    """Parse a bulk import body: a JSON array or NDJSON (one log object per line)"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = []
+        for line_no, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    raise ValueError(f'Invalid JSON on line {line_no}')
+    else:
+        records = request.get_json(silent=True)
+        if isinstance(records, dict):
+            records = records.get('logs')
+    
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise ValueError('Expected a JSON array of log objects or NDJSON')
+    return records
+
+@app.route('/api/bulk-log-study', methods=['POST'])
+def bulk_log_study():
+    """Import many study logs for one student (own session) or many (admin)"""
+    is_admin = 'admin' in session
+    if not is_admin and 'student_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    try:
+        records = _read_bulk_records()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not is_admin:
+        student_id = session['student_id']
+        if any(record.get('student_id') not in (None, '', student_id) for record in records):
+            return jsonify({'success': False, 'message': 'Students can only import their own logs'}), 403
+        records = [dict(record, student_id=student_id) for record in records]
+    
+    with spans.span('validate_log_batch'):
+        entries, errors = validate_log_batch(records, datetime.now().strftime('%Y-%m-%d'))
+    
+    affected = list(dict.fromkeys(entry['student_id'] for entry in entries))
+    if is_admin:
+        # Admin imports may introduce students who have never signed in
+        now = datetime.now().isoformat()
+        for student_id in affected:
+            storage.add_student(student_id, {'name': student_id, 'email': student_id,
+                                             'cluster_id': None, 'created_at': now})
+    
+    with spans.span('storage.add_logs'):
+        storage.add_logs(entries)
+    for student_id in affected:
+        recommendation_cache.invalidate(student_id)
+    
+    # Each affected student is re-clustered once, after all their logs are in
+    students_updated, clusters_changed = recluster_students(affected)
+    dashboard_notifier.notify(affected)
+    
+    return jsonify({
+        'success': True,
+        'inserted': len(entries),
+        'rejected': len(errors),
+        'errors': errors[:100],
+        'students': len(affected),
+        'students_reclustered': students_updated,
+        'clusters_changed': clusters_changed
+    })
+
 @app.route('/api/get-recommendations')
 def get_recommendations():
     if 'student_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
-    student = students_db.get(session['student_id'])
+    student_id = session['student_id']
+    today = datetime.now().date()
+    recommendation, cache_hit = build_recommendations(student_id, today, recommendation_token(student_id, today))
+    response = jsonify(recommendation)
+    if recommendation['has_recommendations']:
+        response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+    return response
+
+def recommendation_token(student_id, today):
+    # Changes when the student logs, changes cluster, the cluster profiles change or a new week starts
+    return (storage.student_version(student_id), cluster_profiles.version, today.isocalendar()[:2])
+
+def build_recommendations(student_id, today, token):
+    """Recommendation payload for a student and whether it came from the cache"""
+    recommendation = recommendation_cache.get(student_id, token)
+    if recommendation is not None:
+        return recommendation, True
+    
+    student = storage.get_student(student_id)
     
     if not student or student.get('cluster_id') is None:
-        return jsonify({
+        return {
             'success': True,
             'has_recommendations': False,
             'message': 'Log at least 3 study sessions to get personalized recommendations'
-        })
+        }, False
     
     cluster_id = student['cluster_id']
-    cluster_profile = CLUSTER_PROFILES.get(cluster_id, CLUSTER_PROFILES[0])
+    profiles = cluster_profiles.get()
+    cluster_profile = profiles.get(cluster_id, profiles[min(profiles)])
     
-    # Get student's recent performance
-    student_logs = [log for log in study_logs_db if log['student_id'] == session['student_id']]
-    recent_logs = sorted(student_logs, key=lambda x: x['date'], reverse=True)[:7]
+    # Get student's recent performance (already in date order)
+    with spans.span('storage.latest_logs'):
+        recent_logs = storage.latest_logs(student_id, 7)
     
     performance_data = {
-        'dates': [log['date'] for log in recent_logs][::-1],
-        'study_hours': [log['study_hours'] for log in recent_logs][::-1],
-        'quiz_scores': [log['quiz_score'] for log in recent_logs if log['quiz_score']][::-1]
+        'dates': [log['date'] for log in recent_logs],
+        'study_hours': [log['study_hours'] for log in recent_logs],
+        'quiz_scores': [log['quiz_score'] for log in recent_logs if log['quiz_score']]
     }
     
     recommendation = {
@@ -311,65 +775,161 @@ def get_recommendations():
         'recommended_tools': cluster_profile['recommended_tools'],
         'preferred_time': cluster_profile['preferred_time'],
         'performance_data': performance_data,
-        'weekly_schedule': generate_weekly_schedule(cluster_profile)
+        'weekly_schedule': generate_weekly_schedule(cluster_profile, student_id, cluster_id, today)
     }
     
-    return jsonify(recommendation)
+    recommendation_cache.put(student_id, token, recommendation)
+    return recommendation, False
+
+SCHEDULE_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
 
-def generate_weekly_schedule(cluster_profile):
-    """Generate a weekly study schedule based on cluster profile"""
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    base_hours = cluster_profile['recommended_hours']
+def generate_weekly_schedule(cluster_profile, student_id, cluster_id, today=None):
+    """Generate a weekly study schedule based on cluster profile
     
-    # Vary hours slightly across the week
-    schedule = []
-    for i, day in enumerate(days):
-        variation = np.random.uniform(-0.5, 0.5)
-        hours = max(1.0, base_hours + variation)
-        schedule.append({
-            'day': day,
-            'hours': round(hours, 1)
-        })
+    The schedule is fixed for a given (student, cluster, ISO week), so
+    repeat dashboard loads return the same plan and are served from cache.
+    """
+    iso_year, iso_week, _ = (today or datetime.now().date()).isocalendar()
+    hours = _weekly_hours(student_id, cluster_id, cluster_profile['recommended_hours'], iso_year, iso_week)
+    return [{'day': day, 'hours': day_hours} for day, day_hours in zip(SCHEDULE_DAYS, hours)]
+
+@functools.lru_cache(maxsize=4096)
+def _weekly_hours(student_id, cluster_id, base_hours, iso_year, iso_week):
+    # Seed from a stable digest (not hash(), which differs between processes)
+    key = f'{student_id}|{cluster_id}|{iso_year}-W{iso_week}'.encode()
+    seed = int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+    rng = np.random.default_rng(seed)
     
-    return schedule
+    # Vary hours slightly across the week
+    variation = rng.uniform(-0.5, 0.5, size=len(SCHEDULE_DAYS))
+    hours = np.maximum(1.0, base_hours + variation).round(1)
+    return tuple(float(h) for h in hours)
 
 @app.route('/api/student-stats')
 def student_stats():
     if 'student_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
-    student_logs = [log for log in study_logs_db if log['student_id'] == session['student_id']]
+    return jsonify(build_student_stats(session['student_id'], datetime.now().date()))
+
+def build_student_stats(student_id, today):
+    """Session totals, average score and streaks from the running aggregates"""
+    with spans.span('storage.student_aggregates'):
+        stats = storage.student_aggregates(student_id)
     
-    if not student_logs:
-        return jsonify({
+    if not stats:
+        return {
             'total_sessions': 0,
             'total_hours': 0,
             'avg_score': 0,
-            'current_streak': 0
-        })
+            'current_streak': 0,
+            'longest_streak': 0
+        }
+    
+    # Streaks are tracked per student as logs arrive
+    streak, longest = storage.student_streak(student_id, today.toordinal())
     
-    total_hours = sum(log['study_hours'] for log in student_logs)
-    scores = [log['quiz_score'] for log in student_logs if log['quiz_score']]
-    avg_score = np.mean(scores) if scores else 0
+    return {
+        'total_sessions': stats.sessions,
+        'total_hours': round(stats.total_hours, 1),
+        'avg_score': round(stats.avg_score, 1),
+        'current_streak': streak,
+        'longest_streak': longest
+    }
+
+def build_dashboard(student_id, today, token):
+    """Everything the student dashboard shows, sharing one recommendation token"""
+    return {
+        'success': True,
+        'stats': build_student_stats(student_id, today),
+        'recommendations': build_recommendations(student_id, today, token)[0]
+    }
+
+@app.route('/api/student-dashboard')
+def student_dashboard_data():
+    """Stats, performance trend and recommendations for the dashboard in one response"""
+    if 'student_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
-    # Calculate streak
-    dates = sorted(set(log['date'] for log in student_logs), reverse=True)
-    streak = 0
-    current_date = datetime.now().date()
+    student_id = session['student_id']
+    today = datetime.now().date()
+    token = recommendation_token(student_id, today)
+    # Streaks also depend on the day; the student id keeps a shared browser from reusing another's copy
+    etag = 'dashboard-' + hashlib.sha1(repr((student_id, token, today.toordinal())).encode()).hexdigest()
+    return conditional_json(etag, lambda: build_dashboard(student_id, today, token))
+
+@app.route('/api/student-dashboard/stream')
+def student_dashboard_stream():
+    """Server-Sent Events: a full dashboard snapshot, then a stats or
+    recommendations event each time that part changes
     
-    for date_str in dates:
-        log_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        if (current_date - log_date).days == streak:
-            streak += 1
-        else:
-            break
+    Logs posted to this process wake the stream at once; changes made in
+    other worker processes (or by retraining) are picked up by re-checking
+    the storage version every DASHBOARD_STREAM_POLL_INTERVAL seconds.
     
-    return jsonify({
-        'total_sessions': len(student_logs),
-        'total_hours': round(total_hours, 1),
-        'avg_score': round(avg_score, 1),
-        'current_streak': streak
-    })
+    Each open stream holds a worker thread, so at most
+    DASHBOARD_STREAM_MAX run per process; past that the answer is a 503
+    and the page polls /api/student-dashboard instead. A heartbeat comment
+    every DASHBOARD_STREAM_HEARTBEAT seconds keeps proxies from dropping
+    an idle connection. A client that has gone away is noticed within a
+    poll interval under gunicorn (which exposes the socket), and otherwise
+    when a heartbeat write fails; either way the stream ends and frees the
+    thread. Streams also end after DASHBOARD_STREAM_MAX_AGE; browsers
+    reconnect.
+    """
+    if 'student_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    if not dashboard_streams.acquire():
+        response = jsonify({'success': False, 'message': 'Too many live dashboards; poll /api/student-dashboard'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(app.config['DASHBOARD_STREAM_MAX_AGE']))
+        return response
+    
+    student_id = session['student_id']
+    poll_interval = app.config['DASHBOARD_STREAM_POLL_INTERVAL']
+    heartbeat = app.config['DASHBOARD_STREAM_HEARTBEAT']
+    max_age = app.config['DASHBOARD_STREAM_MAX_AGE']
+    client_socket = request.environ.get('gunicorn.socket')
+    
+    def events():
+        started = time.monotonic()
+        seen = dashboard_notifier.version(student_id)
+        today = datetime.now().date()
+        key = (recommendation_token(student_id, today), today)
+        sent = build_dashboard(student_id, today, key[0])
+        yield f'retry: {int(poll_interval * 1000)}\n\n'
+        yield sse_event('dashboard', sent)
+        last_write = time.monotonic()
+        
+        while time.monotonic() - started < max_age:
+            seen = dashboard_notifier.wait(student_id, seen, min(poll_interval, heartbeat))
+            if client_disconnected(client_socket):
+                return
+            today = datetime.now().date()
+            new_key = (recommendation_token(student_id, today), today)
+            if new_key != key:
+                dashboard = build_dashboard(student_id, today, new_key[0])
+                for section in ('stats', 'recommendations'):
+                    if dashboard[section] != sent[section]:
+                        yield sse_event(section, dashboard[section])
+                        last_write = time.monotonic()
+                key, sent = new_key, dashboard
+            if time.monotonic() - last_write >= heartbeat:
+                # Comment line: ignored by EventSource, but fails fast if the client has disconnected
+                yield ': keep-alive\n\n'
+                last_write = time.monotonic()
+    
+    def stream_closed():
+        # The server closes the response however the stream ends (finished,
+        # disconnected or never started), so the slot is always given back
+        dashboard_streams.release()
+        storage.release_connection()
+    
+    response = app.response_class(events(), mimetype='text/event-stream')
+    response.call_on_close(stream_closed)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
 
 @app.route('/api/admin/upload-data', methods=['POST'])
 def upload_data():
@@ -385,74 +945,433 @@ def upload_data():
         return jsonify({'success': False, 'message': 'No file selected'}), 400
     
     if file and file.filename.endswith('.csv'):
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'uploaded_data.csv')
-        file.save(filepath)
+        # Validate and encode the upload chunk by chunk straight into the data file
+        try:
+            with spans.span('ingest_csv'):
+                summary = ingest_csv(file.stream, app.config['DATA_FILE'])
+        except ValueError as e:
+            # Includes unparseable or non-UTF-8 content anywhere in the file; the data file is left as it was
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        # Copy to data folder for processing
-        import shutil
-        shutil.copy(filepath, 'data/sample_student_data.csv')
-        
-        return jsonify({'success': True, 'message': 'File uploaded successfully'})
+        return jsonify({
+            'success': True,
+            'message': f"File uploaded successfully ({summary['rows']} rows, {summary['rejected']} rejected)",
+            'rows': summary['rows'],
+            'rejected': summary['rejected']
+        })
     
     return jsonify({'success': False, 'message': 'Invalid file format'}), 400
 
+def _retrain_job(job):
+    """Background job: retrain the model, then re-cluster existing students"""
+    previous_profiles = cluster_profiles.version
+    kmeans, scaler, n_samples = train_clustering_model(
+        progress=lambda fraction, message: job.set_progress(fraction * 0.9, message))
+    
+    # Cached payloads embed the cluster profiles; drop them only if those changed
+    if cluster_profiles.version != previous_profiles:
+        recommendation_cache.clear()
+    
+    job.set_progress(0.9, 'Re-assigning student clusters')
+    total, changed = reassign_all_clusters()
+    # Cluster ids mean something else under the new model; re-attribute the trend history
+    job.set_progress(0.95, 'Rebuilding cluster trends')
+    storage.rebuild_cluster_rollups()
+    
+    return {
+        'clusters': int(kmeans.n_clusters),
+        'samples': n_samples,
+        'students': total,
+        'reassigned': changed
+    }
+
 @app.route('/api/admin/retrain-model', methods=['POST'])
 def retrain_model():
     if 'admin' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
+    job = background_jobs.submit('retrain-model', _retrain_job)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Model retraining started',
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.job_id)
+    }), 202
+
+def _select_model_job(job):
+    """Background job: pick the cluster count by fitting candidates in parallel, deploy the best"""
+    if not os.path.exists(app.config['DATA_FILE']):
+        generate_sample_data()
+    
+    job.set_progress(0.02, 'Loading training data')
+    features = feature_cache.load()
+    scaler = _fit_scaler(features)
+    
+    candidates = [('kmeans', k) for k in app.config['MODEL_SELECTION_K'] if k < len(features)]
+    candidates += [('dbscan', eps) for eps in app.config['MODEL_SELECTION_DBSCAN_EPS']]
+    job.set_progress(0.05, f'Evaluating {len(candidates)} candidates')
+    
+    def candidate_done(fraction, result):
+        label = f"k={result['n_clusters']}" if result['algorithm'] == 'kmeans' else f"DBSCAN eps={result['eps']}"
+        job.set_progress(0.05 + 0.65 * fraction, f'Evaluated {label} in {result["wall_seconds"]}s')
+    
+    started = time.perf_counter()
+    kmeans, results = select_model(feature_cache.ensure()['path'], scaler, candidates,
+                                   app.config['TRAINING_EPOCHS'], CHUNK_SIZE,
+                                   metric=app.config['MODEL_SELECTION_METRIC'],
+                                   max_workers=app.config['MODEL_SELECTION_WORKERS'],
+                                   progress=candidate_done)
+    search_seconds = time.perf_counter() - started
+    
+    previous_profiles = cluster_profiles.version
+    with training_lock, file_lock(TRAINING_LOCK_FILE):
+        _publish_model(kmeans, scaler, features,
+                       lambda fraction, message: job.set_progress(0.7 + 0.2 * fraction, message))
+    if cluster_profiles.version != previous_profiles:
+        recommendation_cache.clear()
+    
+    job.set_progress(0.9, 'Re-assigning student clusters')
+    total, changed = reassign_all_clusters()
+    # Cluster ids mean something else under the new model; re-attribute the trend history
+    job.set_progress(0.95, 'Rebuilding cluster trends')
+    storage.rebuild_cluster_rollups()
+    
+    return {
+        'clusters': int(kmeans.n_clusters),
+        'metric': app.config['MODEL_SELECTION_METRIC'],
+        'samples': len(features),
+        'search_seconds': round(search_seconds, 3),
+        'candidates': results,
+        'profiles': [profile['name'] for _, profile in sorted(cluster_profiles.get().items())],
+        'students': total,
+        'reassigned': changed
+    }
+
+@app.route('/api/admin/select-model', methods=['POST'])
+def select_model_route():
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    job = background_jobs.submit('select-model', _select_model_job)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Model selection started',
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.job_id)
+    }), 202
+
+@app.route('/api/admin/jobs/<job_id>')
+def job_status(job_id):
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    job = background_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/admin/reassign-clusters', methods=['POST'])
+def reassign_clusters():
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
     try:
-        kmeans, scaler, df = train_clustering_model()
+        started = time.perf_counter()
+        total, changed = reassign_all_clusters()
+        elapsed = time.perf_counter() - started
         
         return jsonify({
             'success': True,
-            'message': 'Model retrained successfully',
-            'clusters': 4,
-            'samples': len(df)
+            'students': total,
+            'reassigned': changed,
+            'elapsed_seconds': round(elapsed, 4),
+            'students_per_second': round(total / elapsed, 1) if elapsed > 0 else 0
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def conditional_json(etag, build):
+    """Serve build()'s JSON with an ETag, answering 304 without building it on a match"""
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/api/admin/analytics')
 def admin_analytics():
     if 'admin' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'}), 401
     
-    # Generate analytics data
-    analytics = {
-        'total_students': len(students_db),
-        'total_logs': len(study_logs_db),
-        'active_students': len(set(log['student_id'] for log in study_logs_db)),
-        'avg_study_hours': round(np.mean([log['study_hours'] for log in study_logs_db]) if study_logs_db else 0, 2),
-        'cluster_distribution': {}
-    }
-    
-    # Count students per cluster
-    for student in students_db.values():
-        cluster_id = student.get('cluster_id')
-        if cluster_id is not None:
-            cluster_name = CLUSTER_PROFILES[cluster_id]['name']
-            analytics['cluster_distribution'][cluster_name] = \
-                analytics['cluster_distribution'].get(cluster_name, 0) + 1
+    # Counters are maintained by the storage backend as students and logs arrive
+    counters = storage.analytics_counters()
+    etag = f"analytics-{counters['version']}-{cluster_profiles.version}"
+    return conditional_json(etag, lambda: analytics_payload(counters, cluster_profiles.get()))
+
+insights_lock = threading.Lock()
+# Insights for the live centroids, keyed by (training id, online updates applied)
+live_insights = {'key': None, 'insights': None}
+
+def centroids_key(record):
+    """(training id, online updates) naming one state of the exported centroids"""
+    return record['training_id'].item().decode(), int(record['updates'])
+
+def model_cluster_insights(snapshot):
+    """Centroids, sizes and silhouette scores of the live model, and the key they belong to
     
-    return jsonify(analytics)
+    A training run stores them with the model. Once the online learner
+    has moved the centers, or for a model saved without them (such as the
+    pickles shipped with the app), they are computed from the live
+    centroids and the feature cache on first use, once per centroid state.
+    """
+    record = _load_centroids().get()
+    key = centroids_key(record)
+    if key[1] == 0 and key[0] == getattr(snapshot.kmeans, 'training_id_', '') and \
+            getattr(snapshot.kmeans, 'insights_', None) is not None:
+        return key, snapshot.kmeans.insights_
+    with insights_lock:
+        if live_insights['key'] != key:
+            if not os.path.exists(app.config['DATA_FILE']):
+                return key, {}
+            with spans.span('compute_cluster_insights'):
+                insights = compute_cluster_insights(feature_cache.load(), record, FEATURE_COLUMNS, CHUNK_SIZE)
+            live_insights.update(key=key, insights=insights)
+        return key, live_insights['insights']
 
 @app.route('/api/clustering-insights')
 def clustering_insights():
     """Get detailed clustering insights for visualization"""
     try:
-        df = pd.read_csv('data/sample_student_data.csv')
-        
-        # Calculate cluster statistics
-        insights = {
-            'cluster_profiles': CLUSTER_PROFILES,
-            'total_students': len(df),
-            'data_quality': 82  # Placeholder
-        }
-        
-        return jsonify(insights)
+        snapshot = model_registry.get()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    (training_id, updates), model_insights = model_cluster_insights(snapshot)
+    profiles = cluster_profiles.get()
+    
+    def build():
+        clusters = []
+        for cluster in model_insights.get('clusters', []):
+            profile = profiles.get(cluster['cluster_id'], {})
+            clusters.append(dict(cluster, name=profile.get('name', f"Cluster {cluster['cluster_id']}")))
+        return {
+            'cluster_profiles': profiles,
+            'total_students': model_insights.get('samples', 0),
+            'silhouette': model_insights.get('silhouette'),
+            'data_quality': model_insights.get('data_quality'),
+            'clusters': clusters
+        }
+    
+    etag = f'insights-{training_id}-{updates}-{cluster_profiles.version}'
+    return conditional_json(etag, build)
+
+def _trend_args():
+    """(period, start, end, cluster_id) from the query string; start/end as date ordinals, or None"""
+    period = request.args.get('period', 'week')
+    if period not in PERIODS:
+        raise ValueError('period must be day, week or month')
+    bounds = []
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if value is not None and not is_iso_date(value):
+            raise ValueError(f'{name} must be a YYYY-MM-DD date')
+        bounds.append(day_ordinal(value) if value is not None else None)
+    cluster_id = request.args.get('cluster_id')
+    if cluster_id is not None:
+        try:
+            cluster_id = int(cluster_id)
+        except ValueError:
+            raise ValueError('cluster_id must be an integer')
+    return period, bounds[0], bounds[1], cluster_id
+
+def _trends_etag(version):
+    # Rollups only change when the storage version does; the query picks the slice
+    return f"trends-{version}-{hashlib.sha1(request.full_path.encode()).hexdigest()[:16]}"
+
+@app.route('/api/admin/trends')
+def admin_trends():
+    """Sessions, hours and average score per day, week or month (?cluster_id= for one cluster)"""
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    try:
+        period, start, end, cluster_id = _trend_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    def build():
+        with spans.span('storage.cluster_daily_rollups'):
+            cluster_ids, days, values = storage.cluster_daily_rollups(start, end)
+        if cluster_id is not None:
+            selected = cluster_ids == cluster_id
+            days, values = days[selected], values[selected]
+        keys, totals = bucket(days, values, period)
+        return dict(series_payload(keys, totals, period), success=True, period=period, cluster_id=cluster_id)
+    
+    return conditional_json(_trends_etag(storage.analytics_counters()['version']), build)
+
+@app.route('/api/admin/trends/clusters')
+def admin_cluster_trends():
+    """One series per cluster over the same periods, for side-by-side comparison"""
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    try:
+        period, start, end, _ = _trend_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    profiles = cluster_profiles.get()
+    
+    def build():
+        with spans.span('storage.cluster_daily_rollups'):
+            cluster_ids, days, values = storage.cluster_daily_rollups(start, end)
+        keys = np.unique(period_keys(days, period))
+        clusters = []
+        for cluster_id in np.unique(cluster_ids).tolist():
+            selected = cluster_ids == cluster_id
+            _, totals = bucket(days[selected], values[selected], period, keys)
+            series = series_payload(keys, totals, period)
+            del series['periods']
+            name = 'Unassigned' if cluster_id == UNASSIGNED else profiles.get(cluster_id, {}).get('name', f'Cluster {cluster_id}')
+            clusters.append(dict(series, cluster_id=cluster_id, name=name))
+        return {
+            'success': True,
+            'period': period,
+            'periods': [period_label(key, period) for key in keys],
+            'clusters': clusters
+        }
+    
+    etag = _trends_etag(f"{storage.analytics_counters()['version']}-{cluster_profiles.version}")
+    return conditional_json(etag, build)
+
+@app.route('/api/admin/trends/correlation')
+def admin_score_hours_correlation():
+    """Correlation between study hours and quiz score, overall and per period"""
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    try:
+        period, start, end, cluster_id = _trend_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    def build():
+        with spans.span('storage.cluster_daily_rollups'):
+            cluster_ids, days, values = storage.cluster_daily_rollups(start, end)
+        if cluster_id is not None:
+            selected = cluster_ids == cluster_id
+            days, values = days[selected], values[selected]
+        keys, totals = bucket(days, values, period)
+        return dict(correlation_payload(keys, totals, period), success=True, period=period, cluster_id=cluster_id)
+    
+    return conditional_json(_trends_etag(storage.analytics_counters()['version']), build)
+
+@app.route('/api/student-trends')
+def student_trends():
+    """The signed-in student's sessions, hours and average score per day, week or month"""
+    if 'student_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    try:
+        period, start, end, _ = _trend_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    student_id = session['student_id']
+    
+    def build():
+        days, values = storage.student_daily_rollups(student_id, start, end)
+        keys, totals = bucket(days, values, period)
+        return dict(series_payload(keys, totals, period), success=True, period=period)
+    
+    version = hashlib.sha1(repr((student_id, storage.student_version(student_id))).encode()).hexdigest()[:16]
+    return conditional_json(_trends_etag(version), build)
+
+@app.route('/api/admin/metrics')
+def admin_metrics():
+    """Prometheus text-format metrics for this worker process"""
+    token = app.config['METRICS_TOKEN']
+    authorized = 'admin' in session or (
+        token and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+    if not authorized:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/profiles/<profile_id>')
+def request_profile(profile_id):
+    """A request profile captured with the X-Profile header (?format=folded for flame graphs)"""
+    if not profiling_allowed():
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    
+    entry = request_profiles.get(profile_id)
+    if entry is None:
+        return jsonify({'success': False, 'message': 'Profile not found'}), 404
+    path, profiler = entry
+    
+    if request.args.get('format') == 'folded':
+        return app.response_class(profiler.folded(), mimetype='text/plain')
+    
+    return jsonify({
+        'success': True,
+        'path': path,
+        'duration_seconds': round(profiler.duration, 4),
+        'samples': profiler.samples,
+        'top_functions': profiler.top_functions()
+    })
+
+@app.route('/api/admin/export/<dataset>')
+def export_data(dataset):
+    """Stream all study logs or all students (aggregates and cluster) as CSV or NDJSON
+    
+    Query parameters: format=csv|ndjson, start/end (YYYY-MM-DD, logs only),
+    cluster_id, and gzip=1 for a .gz download. Rows are read and written a
+    chunk at a time, so memory use does not grow with the export size.
+    """
+    if 'admin' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'}), 401
+    if dataset not in ('logs', 'students'):
+        return jsonify({'success': False, 'message': 'Unknown export (use logs or students)'}), 404
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    start, end = request.args.get('start'), request.args.get('end')
+    for value in (start, end):
+        if value is not None and not is_iso_date(value):
+            return jsonify({'success': False, 'message': 'start and end must be YYYY-MM-DD dates'}), 400
+    cluster_id = request.args.get('cluster_id')
+    if cluster_id is not None:
+        try:
+            cluster_id = int(cluster_id)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'cluster_id must be an integer'}), 400
+    
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    if dataset == 'logs':
+        records = log_records(storage.iter_logs(start, end, cluster_id, chunk_size))
+        fields = LOG_COLUMNS
+    else:
+        records = student_records(storage.iter_students(cluster_id, chunk_size))
+        fields = STUDENT_EXPORT_FIELDS
+    body = encode_records(records, fields, fmt)
+    
+    filename = f'{dataset}.{fmt}'
+    mimetype = EXPORT_FORMATS[fmt]
+    if request.args.get('gzip') == '1':
+        body = gzip_chunks(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    response = app.response_class(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
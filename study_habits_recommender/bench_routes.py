@@ -0,0 +1,240 @@
+"""
+Benchmark for the request hot paths, driven through Flask's test client
+
+The app is imported in a scratch working directory and seeded through
+/api/bulk-log-study with a deterministic synthetic dataset, then each
+endpoint is timed with a pool of logged-in student sessions. Results
+(latency percentiles and throughput per endpoint) are written as JSON
+so runs can be compared between versions.
+
+Usage:
+    python bench_routes.py --preset small --output results.json
+    python bench_routes.py --logs 250000 --students 20000 --backend sqlite
+    python bench_routes.py --preset medium --baseline results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (logs, students)
+PRESETS = {
+    'small': (1000, 100),
+    'medium': (100000, 10000),
+    'large': (1000000, 100000)
+}
+
+SEED_BATCH_SIZE = 20000
+SESSION_POOL_SIZE = 50
+
+
+def synthetic_logs(n_logs, n_students, seed):
+    """Yield batches of log dicts spread over the last 90 days"""
+    rng = np.random.default_rng(seed)
+    today = date.today().toordinal()
+    times = np.array(['Morning', 'Afternoon', 'Evening', 'Night'])
+    distractions = np.array(['None', 'Low', 'Medium', 'High'])
+    for start in range(0, n_logs, SEED_BATCH_SIZE):
+        size = min(SEED_BATCH_SIZE, n_logs - start)
+        # Every student gets at least one log before any gets a second
+        students = (np.arange(start, start + size) % n_students)
+        days = today - rng.integers(0, 90, size)
+        hours = np.round(rng.uniform(0.5, 8, size), 1)
+        scores = rng.integers(50, 101, size)
+        slots = rng.integers(0, 4, size)
+        levels = rng.integers(0, 4, size)
+        yield [
+            {
+                'student_id': f'bench{students[i]}@example.com',
+                'date': date.fromordinal(int(days[i])).isoformat(),
+                'study_hours': float(hours[i]),
+                'quiz_score': int(scores[i]),
+                'study_time': str(times[slots[i]]),
+                'distractions': str(distractions[levels[i]]),
+                'subject': 'Math'
+            }
+            for i in range(size)
+        ]
+
+
+def latency_summary(samples, elapsed):
+    samples = np.asarray(samples) * 1000
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed > 0 else None,
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p90_ms': round(float(np.percentile(samples, 90)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'max_ms': round(float(samples.max()), 3)
+    }
+
+
+def time_requests(call, count):
+    """Run call(i) count times; return the latency summary"""
+    samples = []
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        response = call(i)
+        samples.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            raise RuntimeError(f'Request failed with {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return latency_summary(samples, time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    sys.path.insert(0, APP_DIR)
+    os.environ['STORAGE_BACKEND'] = args.backend
+    started = time.perf_counter()
+    import app as app_module
+    import_seconds = time.perf_counter() - started
+    flask_app = app_module.app
+
+    admin = flask_app.test_client()
+    admin.post('/admin/login', json={'username': 'admin', 'password': 'admin123'})
+
+    # Seed
+    started = time.perf_counter()
+    for batch in synthetic_logs(args.logs, args.students, args.seed):
+        response = admin.post('/api/bulk-log-study', json=batch)
+        if response.status_code != 200:
+            raise RuntimeError(f'Seeding failed: {response.get_data(as_text=True)[:200]}')
+    seed_seconds = time.perf_counter() - started
+
+    pool = []
+    for i in range(min(SESSION_POOL_SIZE, args.students)):
+        client = flask_app.test_client()
+        email = f'bench{i}@example.com'
+        client.post('/student/login', json={'email': email, 'name': f'Bench {i}'})
+        pool.append(client)
+
+    today = date.today().isoformat()
+    endpoints = {}
+
+    endpoints['log-study'] = time_requests(
+        lambda i: pool[i % len(pool)].post('/api/log-study', json={
+            'date': today, 'study_hours': 1 + i % 7, 'quiz_score': 60 + i % 40,
+            'study_time': 'Morning', 'distractions': 'Low'}),
+        args.requests)
+
+    # After the first pass through the pool every request is a cache hit
+    endpoints['get-recommendations'] = time_requests(
+        lambda i: pool[i % len(pool)].get('/api/get-recommendations'), args.requests)
+
+    endpoints['student-stats'] = time_requests(
+        lambda i: pool[i % len(pool)].get('/api/student-stats'), args.requests)
+
+    endpoints['admin-analytics'] = time_requests(
+        lambda i: admin.get('/api/admin/analytics'), args.requests)
+
+    def retrain(i):
+        response = admin.post('/api/admin/retrain-model')
+        status_url = response.get_json()['status_url']
+        while True:
+            job = admin.get(status_url).get_json()['job']
+            if job['status'] == 'failed':
+                raise RuntimeError(f"Retrain failed: {job['error']}")
+            if job['status'] == 'succeeded':
+                return response
+            time.sleep(0.01)
+
+    endpoints['retrain-model'] = time_requests(retrain, args.retrain_runs)
+
+    storage = app_module.storage
+    storage.close()
+
+    return {
+        'benchmark': 'routes',
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'backend': args.backend,
+            'logs': args.logs,
+            'students': args.students,
+            'requests': args.requests,
+            'retrain_runs': args.retrain_runs,
+            'seed': args.seed
+        },
+        'import_seconds': round(import_seconds, 3),
+        'seed_seconds': round(seed_seconds, 3),
+        'seed_logs_per_second': round(args.logs / seed_seconds, 1) if seed_seconds > 0 else None,
+        'endpoints': endpoints
+    }
+
+
+def print_report(results, baseline=None):
+    config = results['config']
+    print(f"{config['backend']} backend, {config['logs']} logs, {config['students']} students "
+          f"(seeded in {results['seed_seconds']:.1f}s)")
+    print(f"{'endpoint':<22}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in results['endpoints'].items():
+        line = (f"{name:<22}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}"
+                f"{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+        previous = (baseline or {}).get('endpoints', {}).get(name)
+        if previous and previous['p50_ms']:
+            change = 100 * (stats['p50_ms'] - previous['p50_ms']) / previous['p50_ms']
+            line += f'   p50 {change:+.1f}% vs baseline'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small',
+                        help='dataset scale (overridden by --logs/--students)')
+    parser.add_argument('--logs', type=int, help='study logs to seed')
+    parser.add_argument('--students', type=int, help='students to spread the logs over')
+    parser.add_argument('--requests', type=int, default=1000, help='timed requests per endpoint')
+    parser.add_argument('--retrain-runs', type=int, default=3, help='timed retrain jobs')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='earlier results JSON to compare p50 latencies against')
+    args = parser.parse_args()
+
+    preset_logs, preset_students = PRESETS[args.preset]
+    args.logs = args.logs or preset_logs
+    args.students = min(args.students or preset_students, args.logs)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            results = run(args)
+        finally:
+            os.chdir(cwd)
+
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Startup benchmark: import time and time-to-first-request for app.py
+
+Each run starts a fresh interpreter in a scratch working directory, so
+the numbers include every import the app pulls in. The first run has
+no saved model and has to train one; the remaining runs reuse it, as a
+restarted server or a new worker would.
+
+Usage:
+    python bench_startup.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter; prints one JSON line of timings
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app
+imported = time.perf_counter()
+
+client = app.app.test_client()
+client.get('/')
+first_request = time.perf_counter()
+
+client.post('/student/login', json={'email': 'bench@example.com', 'name': 'Bench'})
+for day in range(1, 4):
+    client.post('/api/log-study', json={'date': f'2024-01-0{day}', 'study_hours': 3,
+                                        'quiz_score': 80, 'study_time': 'Morning'})
+first_prediction = time.perf_counter()
+
+print(json.dumps({
+    'import_seconds': imported - started,
+    'first_request_seconds': first_request - started,
+    'first_prediction_seconds': first_prediction - started,
+    'pandas_loaded': 'pandas' in sys.modules,
+    'sklearn_loaded': 'sklearn' in sys.modules
+}))
+"""
+
+
+def run_once(workdir):
+    env = dict(os.environ, STORAGE_BACKEND='memory', PYTHONWARNINGS='ignore')
+    output = subprocess.run([sys.executable, '-c', PROBE, APP_DIR], cwd=workdir, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    summary = {}
+    for key in ('import_seconds', 'first_request_seconds', 'first_prediction_seconds'):
+        values = [run[key] for run in runs]
+        summary[key] = {'median': round(statistics.median(values), 4),
+                        'min': round(min(values), 4), 'max': round(max(values), 4)}
+    summary['pandas_loaded'] = any(run['pandas_loaded'] for run in runs)
+    summary['sklearn_loaded'] = any(run['sklearn_loaded'] for run in runs)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='warm runs (after the cold one)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cold = run_once(workdir)
+        warm = [run_once(workdir) for _ in range(args.runs)]
+
+    results = {'cold': summarize([cold]), 'warm': summarize(warm), 'warm_runs': len(warm)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for label in ('cold', 'warm'):
+        stats = results[label]
+        print(f'{label} start ({1 if label == "cold" else len(warm)} run(s), median seconds):')
+        print(f"  import app            {stats['import_seconds']['median']:.3f}")
+        print(f"  first request         {stats['first_request_seconds']['median']:.3f}")
+        print(f"  first prediction      {stats['first_prediction_seconds']['median']:.3f}")
+        print(f"  pandas loaded: {stats['pandas_loaded']}, scikit-learn loaded: {stats['sklearn_loaded']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Cluster profiles (names, descriptions, recommendations) generated from
+the fitted centroids
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from ingest import DISTRACTION_LEVELS, TIME_SLOTS
+
+TIME_LABELS = {
+    'Morning': 'Morning (8am-12pm)',
+    'Afternoon': 'Afternoon (2pm-6pm)',
+    'Evening': 'Evening (6pm-8pm)',
+    'Night': 'Night (8pm-12am)'
+}
+
+# Rough spread of each feature, so no single one dominates archetype matching
+ARCHETYPE_FEATURE_SCALE = (2.0, 10.0, 1.0, 1.0)
+
+
+def _archetype_signature(profile):
+    time_slot = profile['preferred_time'].split()[0]
+    return (profile['avg_study_duration'], profile['quiz_performance'],
+            DISTRACTION_LEVELS.index(profile['distraction_level']), TIME_SLOTS.index(time_slot))
+
+
+def build_cluster_profiles(centroids, sizes, archetypes):
+    """Describe each cluster from its centroid in raw feature units
+
+    centroids rows are (study_hours, quiz_score, distraction_encoded,
+    time_encoded). Each cluster borrows the recommendations of the
+    closest archetype profile (the hand-written CLUSTER_PROFILES), while
+    its descriptive numbers come from the data. Returns {cluster_id: profile}.
+    """
+    signatures = {cluster_id: _archetype_signature(profile) for cluster_id, profile in archetypes.items()}
+    profiles = {}
+    name_counts = {}
+    for cluster_id, centroid in enumerate(centroids):
+        hours, score, distraction, time_code = (float(value) for value in centroid)
+        nearest = min(signatures, key=lambda key: sum(
+            ((a - b) / scale) ** 2 for a, b, scale in zip(centroid, signatures[key], ARCHETYPE_FEATURE_SCALE)))
+        archetype = archetypes[nearest]
+
+        level = DISTRACTION_LEVELS[min(max(int(round(distraction)), 0), len(DISTRACTION_LEVELS) - 1)]
+        slot = TIME_SLOTS[min(max(int(round(time_code)), 0), len(TIME_SLOTS) - 1)]
+
+        # Two clusters can resemble the same archetype; keep names unique
+        name_counts[archetype['name']] = name_counts.get(archetype['name'], 0) + 1
+        name = archetype['name']
+        if name_counts[name] > 1:
+            name = f'{name} ({name_counts[name]})'
+
+        profiles[cluster_id] = dict(
+            archetype,
+            name=name,
+            description=f'{hours:.1f}h sessions, {level.lower()} distractions, mostly {slot.lower()}',
+            avg_study_duration=round(hours, 1),
+            quiz_performance=int(round(score)),
+            distraction_level=level,
+            preferred_time=TIME_LABELS[slot],
+            size=int(sizes[cluster_id])
+        )
+    return profiles
+
+
+def save_cluster_profiles(profiles, path, version):
+    """Atomically write profiles (tagged with the model's training id) as JSON"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'version': version, 'profiles': profiles}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ClusterProfileFile:
+    """Profiles for the current model, re-read when the file changes
+
+    Falls back to the given defaults until a model has written its own
+    profiles. ``version`` changes whenever the profiles do, so it can be
+    part of cache keys and ETags in every worker process.
+    """
+
+    def __init__(self, path, defaults, check_interval=2.0):
+        self.path = path
+        self.defaults = defaults
+        self.check_interval = check_interval
+        self._profiles = defaults
+        self._version = 'default'
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._profiles, self._version, self._mtime = self.defaults, 'default', None
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return  # keep serving the previous profiles
+            # JSON object keys are strings; cluster ids are ints everywhere else
+            self._profiles = {int(key): value for key, value in data['profiles'].items()}
+            self._version = data.get('version') or str(mtime)
+            self._mtime = mtime
+
+    def refresh(self):
+        """Look at the file again on the next call (after this process wrote it)"""
+        self._last_check = 0.0
+
+    def get(self):
+        self._refresh()
+        return self._profiles
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
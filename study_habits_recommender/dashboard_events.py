@@ -0,0 +1,90 @@
+"""
+Change notifications and Server-Sent Events framing for live dashboards
+"""
+
+import json
+import select
+import socket
+import threading
+
+
+class ChangeNotifier:
+    """Wake the dashboard streams in this process when a student's data changes
+
+    Each student has a counter bumped by notify(); a stream remembers the
+    last counter it saw and sleeps in wait() until it moves. Changes made
+    by other worker processes are not seen here, so streams also re-check
+    the storage version every few seconds.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._counters = {}
+
+    def version(self, student_id):
+        with self._condition:
+            return self._counters.get(student_id, 0)
+
+    def notify(self, student_ids):
+        with self._condition:
+            for student_id in student_ids:
+                self._counters[student_id] = self._counters.get(student_id, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, student_id, seen, timeout):
+        """Block until the student's counter differs from seen (or timeout); return the counter"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._counters.get(student_id, 0) != seen, timeout)
+            return self._counters.get(student_id, 0)
+
+
+class StreamSlots:
+    """Cap on the streams one process keeps open at a time
+
+    Under gunicorn's gthread workers every open stream occupies a worker
+    thread, so only some of the threads may be given to streams; the rest
+    stay free for ordinary requests.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a slot; False (and counted) when all are in use"""
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+def client_disconnected(sock):
+    """True once the peer of a streaming response has closed its connection
+
+    An EventSource sends nothing after its request, so a readable socket
+    with no data to peek at means end-of-file. Without the socket (the
+    server doesn't expose it) or where peeking isn't possible (TLS), this
+    returns False and the failed heartbeat write ends the stream instead.
+    """
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and not sock.recv(1, socket.MSG_PEEK)
+    except ValueError:
+        return False
+    except OSError:
+        return True
+
+
+def sse_event(event, data):
+    """One text/event-stream message carrying data as JSON"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
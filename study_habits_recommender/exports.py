@@ -0,0 +1,75 @@
+"""
+Streaming CSV / NDJSON exports of study logs and student assignments
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from storage import LOG_COLUMNS
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+STUDENT_EXPORT_FIELDS = ('student_id', 'name', 'email', 'cluster_id', 'created_at', 'sessions',
+                         'total_hours', 'avg_hours', 'avg_score', 'top_study_time', 'top_distraction')
+
+
+def log_records(chunks):
+    """Chunks of stored logs as chunks of plain dicts in LOG_COLUMNS order"""
+    for chunk in chunks:
+        yield [{column: log[column] for column in LOG_COLUMNS} for log in chunk]
+
+
+def student_records(chunks):
+    """Chunks of (student_id, record, aggregates) as one flat dict per student"""
+    for chunk in chunks:
+        records = []
+        for student_id, record, stats in chunk:
+            records.append({
+                'student_id': student_id,
+                'name': record.get('name'),
+                'email': record.get('email'),
+                'cluster_id': record.get('cluster_id'),
+                'created_at': record.get('created_at'),
+                'sessions': stats.sessions if stats else 0,
+                'total_hours': round(stats.total_hours, 2) if stats else 0,
+                'avg_hours': round(stats.avg_hours, 2) if stats else 0,
+                'avg_score': round(stats.avg_score, 1) if stats else 0,
+                'top_study_time': stats.top_study_time if stats else None,
+                'top_distraction': stats.top_distraction if stats else None
+            })
+        yield records
+
+
+def encode_records(chunks, fields, fmt):
+    """Yield the export body one encoded chunk at a time (CSV with a header row, or NDJSON)"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for records in chunks:
+            writer.writerows(records)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    else:
+        for records in chunks:
+            if records:
+                yield ''.join(json.dumps(record, separators=(',', ':')) + '\n'
+                              for record in records).encode()
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a byte stream into a gzip file incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16+15: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
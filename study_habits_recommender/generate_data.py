@@ -0,0 +1,318 @@
+"""
+Synthetic dataset generator for load testing
+
+Writes student behaviour profiles (the training CSV format, plus each
+student's true cluster) and matching time-series study logs. Students
+are drawn from a mixture of behaviour clusters whose sizes follow a
+Zipf-like skew; each student's logs scatter around their own profile.
+
+Students are generated in fixed-size blocks, each with its own
+SeedSequence child stream, by a pool of worker processes. Each block is
+written to a part file as it is generated, and the parts are then
+joined in block order. The output therefore depends only on the seed
+and the size options, not on how many workers ran. Dates are offsets
+back from --end-date (default: today), so pass --end-date as well for
+byte-identical reruns.
+
+Usage:
+    python generate_data.py --students 500000 --logs-per-student 20 --output data/load
+    python generate_data.py --students 100000 --clusters 6 --skew 1.5 --format npy --output data/npy
+    python generate_data.py --students 1000000 --logs-per-student 0 --output data/profiles
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import numpy as np
+
+from ingest import DISTRACTION_LEVELS, TIME_SLOTS
+
+STUDY_METHODS = ['Pomodoro', 'Continuous', 'Spaced', 'Active', 'Intensive']
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'History', 'Literature',
+            'Computer Science', 'Economics']
+
+STUDENT_COLUMNS = ('student_id', 'study_hours', 'quiz_score', 'distraction_frequency',
+                   'preferred_time', 'study_method', 'true_cluster')
+LOG_COLUMNS = ('student_id', 'date', 'study_hours', 'subject', 'study_time',
+               'method_used', 'distractions', 'quiz_score')
+
+# Categories of the coded columns in the npy format
+CATEGORIES = {
+    'distraction_frequency': DISTRACTION_LEVELS,
+    'preferred_time': TIME_SLOTS,
+    'study_method': STUDY_METHODS,
+    'subject': SUBJECTS,
+    'study_time': TIME_SLOTS,
+    'method_used': STUDY_METHODS,
+    'distractions': DISTRACTION_LEVELS
+}
+
+QUIZ_RATE = 0.7  # share of logs with a quiz score
+
+
+def student_ids(indices):
+    """Login-ready student ids (the app uses the email address)"""
+    return np.char.add(np.char.add('student', indices.astype(str)), '@example.com')
+
+
+def make_clusters(rng, n_clusters, skew):
+    """Cluster centres and mixture weights (weight of the rank-r cluster ~ 1 / r**skew)"""
+    weights = 1.0 / np.arange(1, n_clusters + 1) ** skew
+    return {
+        'weights': weights / weights.sum(),
+        'hours': rng.uniform(1.0, 7.0, n_clusters),
+        'score': rng.uniform(55, 95, n_clusters),
+        'distraction': rng.integers(0, len(DISTRACTION_LEVELS), n_clusters),
+        'time': rng.integers(0, len(TIME_SLOTS), n_clusters),
+        'method': rng.integers(0, len(STUDY_METHODS), n_clusters)
+    }
+
+
+def _mostly(rng, preferred, n_choices, rate):
+    """preferred codes, each replaced by a uniformly random one with probability 1 - rate"""
+    return np.where(rng.random(len(preferred)) < rate, preferred,
+                    rng.integers(0, n_choices, len(preferred))).astype(np.int8)
+
+
+def generate_students(rng, start, end, clusters, spread):
+    """Profiles for students start..end-1 as a dict of arrays (categoricals as codes)"""
+    n = end - start
+    cluster = rng.choice(len(clusters['weights']), size=n, p=clusters['weights']).astype(np.int8)
+    return {
+        'student': np.arange(start, end, dtype=np.int64),
+        'study_hours': np.clip(rng.normal(clusters['hours'][cluster], 0.6 * spread), 0.5, 12).astype(np.float32),
+        'quiz_score': np.clip(np.round(rng.normal(clusters['score'][cluster], 6 * spread)), 0, 100).astype(np.int16),
+        'distraction_frequency': _mostly(rng, clusters['distraction'][cluster], len(DISTRACTION_LEVELS), 0.8),
+        'preferred_time': _mostly(rng, clusters['time'][cluster], len(TIME_SLOTS), 0.8),
+        'study_method': _mostly(rng, clusters['method'][cluster], len(STUDY_METHODS), 0.7),
+        'true_cluster': cluster
+    }
+
+
+def generate_logs(rng, students, logs_per_student, activity_skew, days, end_ordinal, spread):
+    """Date-ordered logs for each student, scattered around their profile
+
+    Log counts are Poisson with a log-normal activity factor per student
+    (mean-preserving), so activity_skew > 0 gives a long tail of very
+    active students.
+    """
+    n = len(students['student'])
+    activity = rng.lognormal(-activity_skew ** 2 / 2, activity_skew, n) if activity_skew > 0 else 1.0
+    counts = rng.poisson(logs_per_student * activity)
+    owner = np.repeat(np.arange(n), counts)
+    total = len(owner)
+
+    # Sort each student's days so their logs form a time series
+    offsets = rng.integers(0, days, total)
+    offsets = offsets[np.lexsort((offsets, owner))]
+    scores = np.clip(np.round(rng.normal(students['quiz_score'][owner], 8)), 0, 100).astype(np.int16)
+    scores[rng.random(total) >= QUIZ_RATE] = -1
+    return {
+        'student': students['student'][owner],
+        'date': (end_ordinal - days + 1 + offsets).astype(np.int32),
+        'study_hours': np.clip(np.round(rng.normal(students['study_hours'][owner], 0.5 * spread), 1),
+                               0.5, 12).astype(np.float32),
+        'subject': rng.integers(0, len(SUBJECTS), total).astype(np.int8),
+        'study_time': _mostly(rng, students['preferred_time'][owner], len(TIME_SLOTS), 0.8),
+        'method_used': _mostly(rng, students['study_method'][owner], len(STUDY_METHODS), 0.7),
+        'distractions': _mostly(rng, students['distraction_frequency'][owner], len(DISTRACTION_LEVELS), 0.7),
+        'quiz_score': scores
+    }
+
+
+def _students_frame(students):
+    import pandas as pd
+    return pd.DataFrame({
+        'student_id': student_ids(students['student']),
+        'study_hours': students['study_hours'].round(2),
+        'quiz_score': students['quiz_score'],
+        'distraction_frequency': np.array(DISTRACTION_LEVELS)[students['distraction_frequency']],
+        'preferred_time': np.array(TIME_SLOTS)[students['preferred_time']],
+        'study_method': np.array(STUDY_METHODS)[students['study_method']],
+        'true_cluster': students['true_cluster']
+    }, columns=STUDENT_COLUMNS)
+
+
+def _logs_frame(logs):
+    import pandas as pd
+    epoch = np.datetime64(date.fromordinal(1).isoformat())  # ordinal 1
+    return pd.DataFrame({
+        'student_id': student_ids(logs['student']),
+        'date': (epoch + (logs['date'] - 1).astype('timedelta64[D]')).astype(str),
+        'study_hours': logs['study_hours'].round(1),
+        'subject': np.array(SUBJECTS)[logs['subject']],
+        'study_time': np.array(TIME_SLOTS)[logs['study_time']],
+        'method_used': np.array(STUDY_METHODS)[logs['method_used']],
+        'distractions': np.array(DISTRACTION_LEVELS)[logs['distractions']],
+        'quiz_score': pd.Series(logs['quiz_score'], dtype='Int16').mask(logs['quiz_score'] < 0)
+    }, columns=LOG_COLUMNS)
+
+
+def _write_part(columns, frame, part_dir, name, fmt):
+    """Write one block's rows; return {column or 'csv': part path}"""
+    if fmt == 'csv':
+        path = os.path.join(part_dir, f'{name}.csv')
+        frame(columns).to_csv(path, index=False, header=False)
+        return {'csv': path}
+    paths = {}
+    for column, values in columns.items():
+        paths[column] = os.path.join(part_dir, f'{name}.{column}.npy')
+        np.save(paths[column], values)
+    return paths
+
+
+def generate_block(block, seed_seq, options, clusters, part_dir):
+    """Generate and write one block of students and their logs; runs in a worker process"""
+    rng = np.random.default_rng(seed_seq)
+    start = block * options['block_size']
+    end = min(start + options['block_size'], options['students'])
+    students = generate_students(rng, start, end, clusters, options['spread'])
+    result = {
+        'block': block,
+        'students': end - start,
+        'cluster_sizes': np.bincount(students['true_cluster'], minlength=len(clusters['weights'])),
+        'student_parts': _write_part(students, _students_frame, part_dir,
+                                     f'students-{block:06d}', options['format'])
+    }
+    if options['logs_per_student'] > 0:
+        logs = generate_logs(rng, students, options['logs_per_student'], options['activity_skew'],
+                             options['days'], options['end_ordinal'], options['spread'])
+        result['logs'] = len(logs['student'])
+        result['log_parts'] = _write_part(logs, _logs_frame, part_dir,
+                                          f'logs-{block:06d}', options['format'])
+    return result
+
+
+def _join_csv(parts, header, path):
+    """Concatenate part files (in order) under one header row, deleting them as they go"""
+    with open(path, 'wb') as out:
+        out.write((','.join(header) + '\n').encode())
+        for part in parts:
+            with open(part['csv'], 'rb') as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.remove(part['csv'])
+
+
+def _join_npy(parts, counts, directory):
+    """Concatenate each column's part arrays into one memory-mapped .npy file per column"""
+    os.makedirs(directory, exist_ok=True)
+    total = sum(counts)
+    for column in parts[0]:
+        first = np.load(parts[0][column], mmap_mode='r')
+        out = np.lib.format.open_memmap(os.path.join(directory, f'{column}.npy'), mode='w+',
+                                        dtype=first.dtype, shape=(total,))
+        del first
+        offset = 0
+        for part, count in zip(parts, counts):
+            out[offset:offset + count] = np.load(part[column], mmap_mode='r')
+            offset += count
+            os.remove(part[column])
+        out.flush()
+        del out
+
+
+def generate(options, progress=None):
+    """Generate the dataset described by options into options['output']; return a summary"""
+    started = time.perf_counter()
+    output = options['output']
+    os.makedirs(output, exist_ok=True)
+    n_blocks = -(-options['students'] // options['block_size'])
+
+    # Child 0 drives the cluster layout; child i + 1 drives block i
+    children = np.random.SeedSequence(options['seed']).spawn(n_blocks + 1)
+    clusters = make_clusters(np.random.default_rng(children[0]), options['clusters'], options['skew'])
+
+    results = [None] * n_blocks
+    part_dir = tempfile.mkdtemp(dir=output, prefix='.parts-')
+    try:
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(generate_block, block, children[block + 1], options, clusters, part_dir)
+                       for block in range(n_blocks)]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results[result['block']] = result
+                if progress is not None:
+                    progress(done, n_blocks)
+
+        files = []
+        student_counts = [r['students'] for r in results]
+        log_counts = [r.get('logs', 0) for r in results]
+        if options['format'] == 'csv':
+            files.append(os.path.join(output, 'students.csv'))
+            _join_csv([r['student_parts'] for r in results], STUDENT_COLUMNS, files[-1])
+            if options['logs_per_student'] > 0:
+                files.append(os.path.join(output, 'logs.csv'))
+                _join_csv([r['log_parts'] for r in results], LOG_COLUMNS, files[-1])
+        else:
+            files.append(os.path.join(output, 'students'))
+            _join_npy([r['student_parts'] for r in results], student_counts, files[-1])
+            if options['logs_per_student'] > 0:
+                files.append(os.path.join(output, 'logs'))
+                _join_npy([r['log_parts'] for r in results], log_counts, files[-1])
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    summary = {
+        'students': sum(student_counts),
+        'logs': sum(log_counts),
+        'cluster_sizes': sum(r['cluster_sizes'] for r in results).tolist(),
+        'cluster_centres': {key: values.tolist() for key, values in clusters.items() if key != 'weights'},
+        'files': files,
+        'seconds': round(time.perf_counter() - started, 2),
+        'options': {key: value for key, value in options.items() if key != 'output'}
+    }
+    if options['format'] == 'npy':
+        # Readers need the code -> category tables and the id / date encodings
+        schema = dict(summary, categories=CATEGORIES,
+                      encodings={'student': "index i of student 'student{i}@example.com'",
+                                 'date': 'proleptic Gregorian day ordinal (date.fromordinal)',
+                                 'quiz_score': '-1 when the log has no quiz'})
+        with open(os.path.join(output, 'schema.json'), 'w') as f:
+            json.dump(schema, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--logs-per-student', type=float, default=20,
+                        help='mean logs per student (0 for profiles only)')
+    parser.add_argument('--clusters', type=int, default=4, help='behaviour clusters in the mixture')
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='cluster size skew: rank-r cluster weight ~ 1/r**skew (0 = equal sizes)')
+    parser.add_argument('--spread', type=float, default=1.0, help='within-cluster spread multiplier')
+    parser.add_argument('--activity-skew', type=float, default=0.5,
+                        help='log-normal sigma of per-student activity (0 = same mean for everyone)')
+    parser.add_argument('--days', type=int, default=180, help='length of the log date window')
+    parser.add_argument('--end-date', default=date.today().isoformat(), help='last date of the window')
+    parser.add_argument('--format', choices=['csv', 'npy'], default='csv',
+                        help='CSV files, or a directory of .npy columns per table')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--block-size', type=int, default=20000, help='students per work unit')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', required=True, help='output directory')
+    args = parser.parse_args()
+
+    if args.students < 1 or args.clusters < 1 or args.days < 1 or args.block_size < 1:
+        parser.error('--students, --clusters, --days and --block-size must be positive')
+    try:
+        end_ordinal = date.fromisoformat(args.end_date).toordinal()
+    except ValueError:
+        parser.error('--end-date must be YYYY-MM-DD')
+
+    options = dict(vars(args), end_ordinal=end_ordinal)
+    summary = generate(options, progress=lambda done, total: print(
+        f'\rblocks {done}/{total}', end='', file=sys.stderr, flush=True))
+    print(file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for multi-process serving
+
+Run from this directory with:  gunicorn -c gunicorn.conf.py app:app
+"""
+
+import multiprocessing
+import os
+
+# Workers only share state through SQLite; the in-memory backend would
+# give every worker its own separate copy of students and logs
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 4))
+# Each live dashboard stream holds a thread; keep the other half for ordinary requests
+os.environ.setdefault('DASHBOARD_STREAM_MAX', str(max(1, threads // 2)))
+timeout = 120
+
+# Each worker imports the app itself (no preload), so SQLite connections
+# and background threads are never inherited across fork()
+preload_app = False
@@ -0,0 +1,177 @@
+"""
+Validation and ingestion of uploaded data: behaviour CSVs for training
+and bulk study-log imports
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from aggregates import MIN_LOG_DATE, MAX_LOG_DATE, is_log_date
+
+CHUNK_SIZE = 50000
+
+REQUIRED_COLUMNS = ['study_hours', 'quiz_score', 'distraction_frequency', 'preferred_time']
+FEATURE_COLUMNS = ['study_hours', 'quiz_score', 'distraction_encoded', 'time_encoded']
+
+# Category order defines the encoding used by the model (Low=0, Morning=0, ...)
+DISTRACTION_LEVELS = ['Low', 'Medium', 'High']
+TIME_SLOTS = ['Morning', 'Afternoon', 'Evening', 'Night']
+
+
+def csv_dtypes():
+    """Column dtypes for reading behaviour CSVs (pandas is imported on first use)"""
+    import pandas as pd
+    return {
+        'student_id': 'string',
+        'distraction_frequency': pd.CategoricalDtype(DISTRACTION_LEVELS),
+        'preferred_time': pd.CategoricalDtype(TIME_SLOTS),
+        'study_method': 'category'
+    }
+
+
+def iter_valid_chunks(source, chunksize=CHUNK_SIZE):
+    """Yield (chunk, rejected) pairs of validated, encoded rows
+
+    source is a path or file object. Each chunk holds at most chunksize
+    rows with compact dtypes: categoricals for the text columns, float32
+    hours, int16 scores and int8 encoded feature columns. Rows with
+    missing or out-of-range values are dropped and counted in rejected.
+    Raises ValueError if the file is empty, lacks a required column, isn't
+    UTF-8 or can't be parsed as CSV (which may only show up chunks into
+    the file, after earlier chunks were yielded).
+    """
+    import pandas as pd
+    try:
+        reader = pd.read_csv(source, chunksize=chunksize, dtype=csv_dtypes())
+        first = True
+        for chunk in reader:
+            if first:
+                missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+                if missing:
+                    raise ValueError(f"Missing required columns: {', '.join(missing)}")
+                first = False
+
+            hours = pd.to_numeric(chunk['study_hours'], errors='coerce')
+            scores = pd.to_numeric(chunk['quiz_score'], errors='coerce')
+            valid = (hours.between(0, 24) & scores.between(0, 100)
+                     & chunk['distraction_frequency'].notna()
+                     & chunk['preferred_time'].notna())
+
+            chunk = chunk[valid].copy()
+            chunk['study_hours'] = hours[valid].astype(np.float32)
+            chunk['quiz_score'] = scores[valid].round().astype(np.int16)
+            chunk['distraction_encoded'] = chunk['distraction_frequency'].cat.codes
+            chunk['time_encoded'] = chunk['preferred_time'].cat.codes
+
+            yield chunk, int((~valid).sum())
+    except pd.errors.EmptyDataError:
+        raise ValueError('The CSV file is empty')
+    except pd.errors.ParserError as e:
+        # e.g. "Error tokenizing data. C error: Expected 4 fields in line 120002, saw 6"
+        detail = str(e).strip().split('C error: ')[-1]
+        raise ValueError(f'Malformed CSV: {detail}') from e
+    except UnicodeDecodeError as e:
+        raise ValueError('The CSV file is not valid UTF-8 text') from e
+
+
+def ingest_csv(source, dest_path, chunksize=CHUNK_SIZE):
+    """Validate a CSV chunk by chunk and atomically replace dest_path with the valid rows
+
+    Only one chunk is held in memory at a time, whatever the file size.
+    Returns {'rows': accepted, 'rejected': dropped}.
+    """
+    directory = os.path.dirname(dest_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.csv')
+    rows = rejected = 0
+    try:
+        with os.fdopen(fd, 'w', newline='') as out:
+            for chunk, dropped in iter_valid_chunks(source, chunksize):
+                rejected += dropped
+                if chunk.empty:
+                    continue
+                chunk = chunk.drop(columns=['distraction_encoded', 'time_encoded'])
+                chunk.to_csv(out, header=(rows == 0), index=False)
+                rows += len(chunk)
+
+        if rows == 0:
+            raise ValueError('No valid rows found in the uploaded file')
+        os.replace(tmp_path, dest_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return {'rows': rows, 'rejected': rejected}
+
+
+LOG_FIELDS = ['student_id', 'date', 'study_hours', 'subject', 'study_time',
+              'method_used', 'distractions', 'quiz_score']
+LOG_TEXT_DEFAULTS = {'subject': '', 'study_time': '', 'method_used': '', 'distractions': 'None'}
+
+
+def validate_log_batch(records, default_date):
+    """Validate and normalise a batch of study-log dicts in one vectorized pass
+
+    Applies the same defaults as /api/log-study. Returns (entries, errors)
+    where entries are clean log dicts ready for storage and errors is a
+    list of {'index', 'message'} for the rejected records.
+    """
+    if not records:
+        return [], []
+
+    import pandas as pd
+    df = pd.DataFrame.from_records(records)
+    for column in LOG_FIELDS:
+        if column not in df.columns:
+            df[column] = None
+
+    student_ids = df['student_id'].astype('string').str.strip()
+    dates = df['date'].where(df['date'].notna(), default_date).astype(str)
+    # Same check as /api/log-study: pandas would also accept '2024-1-5' or year 9999
+    valid_dates = dates.map(is_log_date).astype(bool)
+
+    hours_missing = df['study_hours'].isna()
+    hours = pd.to_numeric(df['study_hours'], errors='coerce').where(~hours_missing, 0.0)
+
+    # Like log_study, a falsy score (missing, 0, '') means "no quiz"
+    score_given = df['quiz_score'].notna() & ~df['quiz_score'].astype(str).isin(['', '0'])
+    scores = pd.to_numeric(df['quiz_score'].where(score_given), errors='coerce')
+
+    problems = [
+        (student_ids.isna() | (student_ids == ''), 'Missing student_id'),
+        (~valid_dates, f'Invalid date (expected YYYY-MM-DD between {MIN_LOG_DATE} and {MAX_LOG_DATE})'),
+        (hours.isna() | ~hours.between(0, 24), 'study_hours must be a number between 0 and 24'),
+        (score_given & (scores.isna() | ~scores.between(0, 100)), 'quiz_score must be a number between 0 and 100'),
+    ]
+    messages = pd.Series(None, index=df.index, dtype=object)
+    for mask, message in reversed(problems):
+        messages = messages.mask(mask.fillna(True).astype(bool), message)
+    valid = messages.isna()
+
+    errors = [{'index': int(i), 'message': messages[i]} for i in df.index[~valid]]
+
+    clean = pd.DataFrame({
+        'student_id': student_ids[valid],
+        'date': dates[valid],
+        'study_hours': hours[valid].astype(float),
+        'quiz_score': scores[valid].round().astype('Int64')
+    })
+    for column, default in LOG_TEXT_DEFAULTS.items():
+        clean[column] = df.loc[valid, column].where(df.loc[valid, column].notna(), default).astype(str)
+
+    entries = [
+        {
+            'student_id': row.student_id,
+            'date': row.date,
+            'study_hours': row.study_hours,
+            'subject': row.subject,
+            'study_time': row.study_time,
+            'method_used': row.method_used,
+            'distractions': row.distractions,
+            'quiz_score': None if pd.isna(row.quiz_score) else int(row.quiz_score)
+        }
+        for row in clean.itertuples(index=False)
+    ]
+    return entries, errors
@@ -0,0 +1,172 @@
+"""
+Background job runner for long-running admin tasks (model retraining)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+
+class Job:
+    """Status record for one background job"""
+
+    def __init__(self, name):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = 'Waiting to start'
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        # Called after progress updates (the executor persists the record)
+        self.on_change = None
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def set_progress(self, progress, message=None):
+        """Record progress as a fraction between 0 and 1"""
+        self.progress = max(0.0, min(1.0, float(progress)))
+        if message:
+            self.message = message
+        if self.on_change is not None:
+            self.on_change(self)
+
+    @classmethod
+    def from_dict(cls, record):
+        job = cls.__new__(cls)
+        job.__dict__.update(record)
+        job.on_change = None
+        return job
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class SingleFlightExecutor:
+    """Run jobs one at a time on a background thread, coalescing duplicates
+
+    At most one job per name is running and at most one is queued behind
+    it. Submitting while a job is already queued returns that job instead
+    of adding another, so a burst of identical requests costs one extra
+    run at most. The queued run still starts after the running one, which
+    picks up any data that changed while the first was in progress.
+
+    With a state_dir, every status change is also written there as JSON,
+    so other worker processes can answer status queries for the job.
+    """
+
+    def __init__(self, history_size=50, state_dir=None):
+        self.history_size = history_size
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._running = {}
+        self._queued = {}
+
+    def submit(self, name, fn):
+        """Schedule fn(job) and return the Job tracking it"""
+        with self._lock:
+            queued = self._queued.get(name)
+            if queued is not None:
+                return queued[0]
+
+            job = Job(name)
+            job.on_change = self._save
+            self._remember(job)
+            self._save(job)
+            if name in self._running:
+                self._queued[name] = (job, fn)
+                return job
+
+            self._start(job, fn)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and job_id.isalnum():
+            # Possibly started by another worker process
+            try:
+                with open(os.path.join(self.state_dir, f'{job_id}.json')) as f:
+                    job = Job.from_dict(json.load(f))
+            except (OSError, ValueError):
+                return None
+        return job
+
+    def _save(self, job):
+        if not self.state_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, prefix='.tmp-', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, os.path.join(self.state_dir, f'{job.job_id}.json'))
+
+    def _remember(self, job):
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.history_size:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done:
+                break
+            del self._jobs[oldest_id]
+            if self.state_dir:
+                try:
+                    os.unlink(os.path.join(self.state_dir, f'{oldest_id}.json'))
+                except OSError:
+                    pass
+
+    def _start(self, job, fn):
+        self._running[job.name] = job
+        thread = threading.Thread(target=self._run, args=(job, fn),
+                                  name=f'job-{job.name}', daemon=True)
+        thread.start()
+
+    def _run(self, job, fn):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        job.message = 'Running'
+        try:
+            self._save(job)
+            job.result = fn(job)
+            job.status = 'succeeded'
+            job.progress = 1.0
+            job.message = 'Completed'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            job.message = 'Failed'
+            traceback.print_exc()
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            try:
+                self._save(job)
+            finally:
+                # Even if the record can't be written (disk full, permissions),
+                # the name must be freed or no job by this name could run again
+                with self._lock:
+                    del self._running[job.name]
+                    queued = self._queued.pop(job.name, None)
+                    if queued is not None:
+                        self._start(*queued)
@@ -0,0 +1,329 @@
+"""
+In-memory study log store indexed by student and sorted by date
+"""
+
+import bisect
+from array import array
+from collections.abc import Mapping
+from datetime import date as Date
+
+import numpy as np
+
+from aggregates import day_ordinal
+
+# Stored in the quiz_score column for "no quiz"
+NO_SCORE = -2 ** 31
+
+# Wider typecodes a categorical column is promoted through as its vocabulary grows
+_CODE_TYPES = (('B', 2 ** 8), ('H', 2 ** 16), ('I', 2 ** 32))
+
+
+class CategoricalColumn:
+    """Dictionary-encoded column: each distinct value is stored once
+
+    Codes start as one byte each and the array is widened only when the
+    number of distinct values outgrows the current width.
+    """
+
+    __slots__ = ('values', '_codes_by_value', 'codes', '_width')
+
+    def __init__(self):
+        self.values = []
+        self._codes_by_value = {}
+        self._width = 0
+        self.codes = array(_CODE_TYPES[0][0])
+
+    def encode(self, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = len(self.values)
+            if code >= _CODE_TYPES[self._width][1]:
+                self._width += 1
+                self.codes = array(_CODE_TYPES[self._width][0], self.codes)
+            self.values.append(value)
+            self._codes_by_value[value] = code
+        return code
+
+    def append(self, value):
+        code = self.encode(value)  # may swap in a wider codes array
+        self.codes.append(code)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+
+def _merge_index(dates, rows, new_dates, new_rows):
+    """Merge new (date, row) pairs into a date-sorted index; return the new (dates, rows) arrays
+
+    New rows go after existing rows with the same date and keep their own
+    order among themselves, as successive bisect_right inserts would.
+    """
+    order = np.argsort(new_dates, kind='stable')
+    new_dates = new_dates[order]
+    at = np.searchsorted(np.frombuffer(dates, dtype='i'), new_dates, side='right')
+    merged_dates = array('i', np.insert(np.frombuffer(dates, dtype='i'), at, new_dates).tobytes())
+    merged_rows = array('I', np.insert(np.frombuffer(rows, dtype='I'), at, new_rows[order]).tobytes())
+    return merged_dates, merged_rows
+
+
+class LogRow(Mapping):
+    """Read-only dict-like view of one stored log
+
+    Supports log['field'], log.get(), iteration over keys and attribute
+    access from templates (Jinja falls back to item lookup). The app's
+    JSON provider serializes it like a dict.
+    """
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._store.field(self._row, key)
+
+    def __iter__(self):
+        return iter(LogStore.FIELDS)
+
+    def __len__(self):
+        return len(LogStore.FIELDS)
+
+    def __repr__(self):
+        return f'LogRow({dict(self)!r})'
+
+
+class LogStore:
+    """Study logs in columns (struct of arrays) with a per-student date index
+
+    Numbers live in typed arrays, dates as int32 day ordinals, and the
+    repetitive text fields (student, subject, study time, method,
+    distractions) are dictionary-encoded, so a log costs a few dozen
+    bytes instead of a nine-key dict. Reads return LogRow views that
+    behave like the dicts the routes have always used. Iterating the
+    store yields them in insertion order.
+
+    Values that don't fit their column (a date that isn't YYYY-MM-DD, a
+    non-numeric score) are kept verbatim in a small side table, so every
+    log reads back exactly as it was stored.
+    """
+
+    FIELDS = ('log_id', 'student_id', 'date', 'study_hours', 'subject',
+              'study_time', 'method_used', 'distractions', 'quiz_score')
+    CATEGORICAL_FIELDS = ('student_id', 'subject', 'study_time', 'method_used', 'distractions')
+
+    def __init__(self):
+        self.log_ids = array('q')
+        self.dates = array('i')
+        self.study_hours = array('d')
+        self.quiz_scores = array('i')
+        self.categories = {name: CategoricalColumn() for name in self.CATEGORICAL_FIELDS}
+        # row -> {field: original value} for values the columns can't hold
+        self._exceptions = {}
+        # student code -> row numbers sorted by date, plus a parallel array of dates for bisect
+        self._student_rows = {}
+        self._student_dates = {}
+        # All rows sorted by date for the admin "recent logs" view
+        self._all_dates = array('i')
+        self._all_rows = array('I')
+
+    def __len__(self):
+        return len(self.log_ids)
+
+    def __iter__(self):
+        return (LogRow(self, row) for row in range(len(self.log_ids)))
+
+    def append(self, log):
+        """Add a log entry and index it by student and date
+
+        The date indexes are kept sorted with array.insert, so a log dated
+        before others costs O(n) to move the later entries along; add
+        batches with extend(), which merges them into the indexes in one pass.
+        """
+        row, ordinal = self._append_columns(log)
+        student = self.categories['student_id'].codes[row]
+        dates = self._student_dates.get(student)
+        if dates is None:
+            dates = self._student_dates[student] = array('i')
+            self._student_rows[student] = array('I')
+        # bisect_right keeps logs with the same date in insertion order
+        pos = bisect.bisect_right(dates, ordinal)
+        dates.insert(pos, ordinal)
+        self._student_rows[student].insert(pos, row)
+
+        pos = bisect.bisect_right(self._all_dates, ordinal)
+        self._all_dates.insert(pos, ordinal)
+        self._all_rows.insert(pos, row)
+
+    def extend(self, logs):
+        """Add several log entries, merging them into the date indexes once per batch
+
+        Costs O(n + k log k) for k logs rather than k array inserts of O(n).
+        """
+        first = len(self.log_ids)
+        ordinals = array('i', (self._append_columns(log)[1] for log in logs))
+        if not ordinals:
+            return
+        rows = np.arange(first, len(self.log_ids), dtype='I')
+        days = np.frombuffer(ordinals, dtype='i')
+        self._all_dates, self._all_rows = _merge_index(self._all_dates, self._all_rows, days, rows)
+
+        codes = self.categories['student_id'].codes
+        students = np.frombuffer(codes, dtype=codes.typecode)[first:]
+        for student in np.unique(students).tolist():
+            mine = students == student
+            if student in self._student_dates:
+                dates, student_rows = self._student_dates[student], self._student_rows[student]
+            else:
+                dates, student_rows = array('i'), array('I')
+            self._student_dates[student], self._student_rows[student] = _merge_index(
+                dates, student_rows, days[mine], rows[mine])
+
+    def _append_columns(self, log):
+        """Append one log to the columns; return its (row, date ordinal)"""
+        row = len(self.log_ids)
+        odd = {}
+
+        self.log_ids.append(log['log_id'])
+
+        date_str = log.get('date', '')
+        ordinal = day_ordinal(date_str)
+        if ordinal is None or Date.fromordinal(ordinal).isoformat() != date_str:
+            # Not canonical YYYY-MM-DD: sorts before every real date, reads back verbatim
+            odd['date'] = date_str
+            ordinal = 0
+        self.dates.append(ordinal)
+
+        hours = log['study_hours']
+        if isinstance(hours, (int, float)):
+            self.study_hours.append(hours)
+        else:
+            odd['study_hours'] = hours
+            self.study_hours.append(0.0)
+
+        score = log.get('quiz_score')
+        if score is None:
+            self.quiz_scores.append(NO_SCORE)
+        elif type(score) is int and NO_SCORE < score < 2 ** 31:
+            self.quiz_scores.append(score)
+        else:
+            odd['quiz_score'] = score
+            self.quiz_scores.append(NO_SCORE)
+
+        for name, column in self.categories.items():
+            column.append(log.get(name))
+        if odd:
+            self._exceptions[row] = odd
+        return row, ordinal
+
+    def field(self, row, name):
+        """Decode one field of one stored log"""
+        if self._exceptions:
+            odd = self._exceptions.get(row)
+            if odd is not None and name in odd:
+                return odd[name]
+        if name == 'date':
+            return Date.fromordinal(self.dates[row]).isoformat()
+        if name == 'study_hours':
+            return self.study_hours[row]
+        if name == 'quiz_score':
+            score = self.quiz_scores[row]
+            return None if score == NO_SCORE else score
+        if name == 'log_id':
+            return self.log_ids[row]
+        column = self.categories.get(name)
+        if column is None:
+            raise KeyError(name)
+        return column[row]
+
+    def _rows(self, rows):
+        return [LogRow(self, row) for row in rows]
+
+    def _student(self, student_id):
+        return self.categories['student_id']._codes_by_value.get(student_id)
+
+    def between(self, student_id, start=None, end=None):
+        """Return a student's logs with start <= date <= end (ISO date strings; either may be None), oldest first"""
+        student = self._student(student_id)
+        dates = self._student_dates.get(student)
+        if not dates:
+            return []
+        lo = bisect.bisect_left(dates, day_ordinal(start) or 0) if start is not None else 0
+        hi = bisect.bisect_right(dates, day_ordinal(end) or 0) if end is not None else len(dates)
+        return self._rows(self._student_rows[student][lo:hi])
+
+    def day_count(self, student_id, day):
+        """Number of a student's logs on one day (a date ordinal)"""
+        dates = self._student_dates.get(self._student(student_id))
+        if not dates:
+            return 0
+        return bisect.bisect_right(dates, day) - bisect.bisect_left(dates, day)
+
+    def student_columns(self, student_id, start=None, end=None):
+        """(day ordinals, study hours, quiz scores) arrays of a student's logs in date order
+
+        Only logs with a YYYY-MM-DD date and start <= day <= end (ordinals)
+        are included; quiz scores are NO_SCORE where there was none.
+        """
+        student = self._student(student_id)
+        dates = self._student_dates.get(student)
+        if not dates:
+            return np.zeros(0, dtype='i'), np.zeros(0), np.zeros(0, dtype='i')
+        lo = bisect.bisect_left(dates, max(start, 1) if start is not None else 1)  # day 0: not YYYY-MM-DD
+        hi = bisect.bisect_right(dates, end) if end is not None else len(dates)
+        rows = np.frombuffer(self._student_rows[student][lo:hi], dtype='I')
+        # The views onto the live columns are gone once the rows are gathered
+        # (an array can't grow while a buffer onto it is held)
+        hours = np.frombuffer(self.study_hours, dtype='d')[rows]
+        scores = np.frombuffer(self.quiz_scores, dtype='i')[rows]
+        return np.frombuffer(dates[lo:hi], dtype='i'), hours, scores
+
+    def column_chunks(self, chunk_size=1000000):
+        """Yield (student codes, day ordinals, study hours, quiz scores) copies for consecutive blocks of rows
+
+        Student codes index categories['student_id'].values; days are 0 for
+        dates that aren't YYYY-MM-DD and scores NO_SCORE for no quiz.
+        """
+        students = self.categories['student_id'].codes
+        for start in range(0, len(self), chunk_size):
+            end = start + chunk_size
+            yield (np.frombuffer(students[start:end], dtype=students.typecode),
+                   np.frombuffer(self.dates[start:end], dtype='i'),
+                   np.frombuffer(self.study_hours[start:end], dtype='d'),
+                   np.frombuffer(self.quiz_scores[start:end], dtype='i'))
+
+    def latest(self, student_id, n):
+        """Return a student's n most recent logs, oldest first"""
+        if n <= 0:
+            return []
+        return self._rows(self._student_rows.get(self._student(student_id), array('I'))[-n:])
+
+    def recent(self, n):
+        """Return the n most recent logs across all students, newest first"""
+        if n <= 0:
+            return []
+        return self._rows(self._all_rows[-n:][::-1])
+
+    def iter_range(self, start=None, end=None, chunk_size=1000):
+        """Yield lists of logs with start <= date <= end, in date order, a chunk at a time
+
+        Each chunk is located afresh from the last (date, row) yielded, so
+        logs added between chunks neither shift nor repeat earlier ones.
+        """
+        lo = day_ordinal(start) or 0 if start is not None else 0
+        hi = day_ordinal(end) or 0 if end is not None else None
+        last = None
+        while True:
+            if last is None:
+                pos = bisect.bisect_left(self._all_dates, lo)
+            else:
+                # Rows with the same date are in ascending row order
+                same_lo = bisect.bisect_left(self._all_dates, last[0])
+                same_hi = bisect.bisect_right(self._all_dates, last[0])
+                pos = bisect.bisect_right(self._all_rows, last[1], same_lo, same_hi)
+            stop = bisect.bisect_right(self._all_dates, hi) if hi is not None else len(self._all_dates)
+            rows = self._all_rows[pos:min(pos + chunk_size, stop)]
+            if not rows:
+                return
+            last = (self._all_dates[pos + len(rows) - 1], rows[-1])
+            yield self._rows(rows)
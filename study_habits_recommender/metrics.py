@@ -0,0 +1,186 @@
+"""
+In-process metrics (counters, latency histograms, timed spans) rendered
+in the Prometheus text exposition format
+"""
+
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+# Upper bounds in seconds, from sub-millisecond cache hits to multi-second training
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named metric whose samples carry the same label names"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    def label_names(self, sample_name):
+        return self.labels
+
+    def samples(self):
+        """Return (sample name, label values, value) triples"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        samples = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((self.name + '_bucket', key + (_number(bound),), cumulative))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, cumulative))
+        return samples
+
+    def label_names(self, sample_name):
+        return self.labels + ('le',) if sample_name.endswith('_bucket') else self.labels
+
+
+class CallbackMetric(Metric):
+    """Metric whose value is read from elsewhere (e.g. a cache's own counters) at scrape time
+
+    fn returns a number, or a list of (label values, number) pairs.
+    """
+
+    def __init__(self, name, help_text, kind, fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self._fn = fn
+
+    def samples(self):
+        value = self._fn()
+        if isinstance(value, list):
+            return [(self.name, tuple(key), v) for key, v in value]
+        return [(self.name, (), value)]
+
+
+class MetricsRegistry:
+    """Named collection of metrics with a Prometheus text renderer"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(f'{self.prefix}_{name}', help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f'{self.prefix}_{name}', help_text, labels, buckets))
+
+    def callback(self, name, help_text, kind, fn, labels=()):
+        return self._add(CallbackMetric(f'{self.prefix}_{name}', help_text, kind, fn, labels))
+
+    def render(self):
+        """Return every metric in the Prometheus text format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, key, value in metric.samples():
+                names = metric.label_names(sample_name)
+                lines.append(f'{sample_name}{_label_text(names, key)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class SpanTimer:
+    """Times named code regions into one histogram labelled by span name"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    @contextlib.contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram.observe(time.perf_counter() - started, span=name)
+
+    def timed(self, name):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,102 @@
+"""
+Process-wide registry for the fitted clustering model
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+ModelSnapshot = namedtuple('ModelSnapshot', ['kmeans', 'scaler', 'mtimes', 'version'])
+
+
+class ModelRegistry:
+    """Load the KMeans model and scaler once and share them across threads
+
+    Readers get an immutable snapshot; a reload builds a new snapshot and
+    swaps the reference in one assignment, so in-flight predictions keep
+    using the model they started with and never wait on the reload.
+    """
+
+    def __init__(self, model_path, scaler_path, check_interval=2.0):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        # Number of times the pickles were (re)loaded from disk
+        self.reloads = 0
+
+    def _file_mtimes(self):
+        return (os.stat(self.model_path).st_mtime_ns, os.stat(self.scaler_path).st_mtime_ns)
+
+    def get(self):
+        """Return the current snapshot, reloading if the files changed on disk
+
+        Raises FileNotFoundError if no model has been trained yet.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._last_check < self.check_interval:
+            return snapshot
+
+        # Only one thread checks the files; the others keep serving the current model
+        if not self._reload_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            self._last_check = time.monotonic()
+            mtimes = self._file_mtimes()
+            if snapshot is None or snapshot.mtimes != mtimes:
+                with open(self.model_path, 'rb') as f:
+                    kmeans = pickle.load(f)
+                with open(self.scaler_path, 'rb') as f:
+                    scaler = pickle.load(f)
+                # Files are replaced one after the other; if we caught them
+                # mid-swap keep the current pair and look again next time
+                if snapshot is not None and _training_id(kmeans) != _training_id(scaler):
+                    return snapshot
+                version = snapshot.version + 1 if snapshot else 1
+                snapshot = ModelSnapshot(kmeans, scaler, mtimes, version)
+                self._snapshot = snapshot
+                self.reloads += 1
+            return snapshot
+        except FileNotFoundError:
+            if snapshot is None:
+                raise
+            return snapshot
+        finally:
+            self._reload_lock.release()
+
+    def publish(self, kmeans, scaler):
+        """Swap in a freshly trained model that has already been saved to disk"""
+        with self._reload_lock:
+            try:
+                mtimes = self._file_mtimes()
+            except FileNotFoundError:
+                mtimes = None
+            previous = self._snapshot
+            version = previous.version + 1 if previous else 1
+            self._snapshot = ModelSnapshot(kmeans, scaler, mtimes, version)
+            self._last_check = time.monotonic()
+
+
+def _training_id(obj):
+    return getattr(obj, 'training_id_', None)
+
+
+def atomic_pickle_dump(obj, path):
+    """Pickle obj to path via a temp file and rename so readers never see a partial file"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.pkl')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,131 @@
+"""
+Cluster-count selection: fit candidate models in parallel processes and
+score them on a fixed-size subsample
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SCORE_SAMPLE_SIZE = 5000
+
+
+def fit_minibatch_kmeans(features, scaler, n_clusters, epochs, chunk_size, progress=None):
+    """Mini-batch K-Means over a (possibly memory-mapped) feature matrix, one chunk at a time
+
+    progress, if given, is called as progress(fraction) after each chunk.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_samples = len(features)
+    chunks = [(start, min(start + chunk_size, n_samples)) for start in range(0, n_samples, chunk_size)]
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=1024, n_init=3)
+    done = 0
+    for epoch in range(epochs):
+        for start, end in chunks:
+            # The first partial_fit call needs at least n_clusters rows
+            if end - start >= n_clusters or hasattr(kmeans, 'cluster_centers_'):
+                kmeans.partial_fit(scaler.transform(features[start:end].astype(np.float64)))
+            done += 1
+            if progress is not None:
+                progress(done / (epochs * len(chunks)))
+    return kmeans
+
+
+def score_sample_indices(n_samples, size=SCORE_SAMPLE_SIZE, seed=42):
+    """The same random subsample for every candidate, so scores are comparable"""
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n_samples, size=min(n_samples, size), replace=False))
+
+
+def _score(sample, labels):
+    """Silhouette (higher is better) and Davies-Bouldin (lower is better), ignoring noise points"""
+    from sklearn.metrics import silhouette_score, davies_bouldin_score
+
+    clustered = labels >= 0
+    n_labels = len(np.unique(labels[clustered]))
+    if n_labels < 2 or n_labels >= clustered.sum():
+        return None, None
+    return (float(silhouette_score(sample[clustered], labels[clustered])),
+            float(davies_bouldin_score(sample[clustered], labels[clustered])))
+
+
+def evaluate_candidate(features_path, scaler, candidate, epochs, chunk_size, sample_size):
+    """Fit and score one candidate; runs in a worker process
+
+    candidate is ('kmeans', n_clusters) or ('dbscan', eps). K-Means is fit
+    on the full dataset; DBSCAN only on the scoring subsample, since it
+    needs memory quadratic in the number of points.
+    """
+    started = time.perf_counter()
+    features = np.load(features_path, mmap_mode='r')
+    sample = scaler.transform(np.asarray(features[score_sample_indices(len(features), sample_size)],
+                                         dtype=np.float64))
+    algorithm, param = candidate
+
+    result = {'algorithm': algorithm, 'pid': os.getpid()}
+    model = None
+    if algorithm == 'kmeans':
+        model = fit_minibatch_kmeans(features, scaler, param, epochs, chunk_size)
+        labels = model.predict(sample)
+        result['n_clusters'] = param
+    else:
+        from sklearn.cluster import DBSCAN
+        labels = DBSCAN(eps=param, min_samples=10).fit_predict(sample)
+        result['eps'] = param
+        result['n_clusters'] = int(len(np.unique(labels[labels >= 0])))
+        result['noise_share'] = round(float((labels < 0).mean()), 3)
+
+    silhouette, davies_bouldin = _score(sample, labels)
+    result['silhouette'] = round(silhouette, 4) if silhouette is not None else None
+    result['davies_bouldin'] = round(davies_bouldin, 4) if davies_bouldin is not None else None
+    result['wall_seconds'] = round(time.perf_counter() - started, 3)
+    return result, model
+
+
+def select_model(features_path, scaler, candidates, epochs, chunk_size, metric='silhouette',
+                 sample_size=SCORE_SAMPLE_SIZE, max_workers=None, progress=None):
+    """Evaluate candidates in a process pool; return (best K-Means model, per-candidate results)
+
+    Only K-Means candidates can be deployed (prediction is nearest-centroid);
+    DBSCAN results are reported alongside for comparison. Workers are
+    spawned rather than forked, since the web process has live threads.
+    Their entry point (evaluate_candidate) lives here because this module
+    never imports app; a spawned worker still re-imports the main script,
+    which is why app.py skips its startup work when loaded as __mp_main__.
+    """
+    max_workers = max_workers or min(len(candidates), os.cpu_count() or 1)
+    results = []
+    models = {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = {pool.submit(evaluate_candidate, features_path, scaler, candidate,
+                               epochs, chunk_size, sample_size): candidate
+                   for candidate in candidates}
+        for future in as_completed(futures):
+            result, model = future.result()
+            results.append(result)
+            if model is not None:
+                models[futures[future]] = model
+            if progress is not None:
+                progress(len(results) / len(candidates), result)
+
+    def rank(result):
+        if metric == 'davies_bouldin':
+            value = result['davies_bouldin']
+            return value if value is not None else float('inf')
+        value = result['silhouette']
+        return -value if value is not None else float('inf')
+
+    deployable = [r for r in results if r['algorithm'] == 'kmeans' and r['silhouette'] is not None]
+    if not deployable:
+        raise ValueError('No K-Means candidate could be scored')
+    best = min(deployable, key=rank)
+    for result in results:
+        result['selected'] = result is best
+
+    results.sort(key=lambda r: (r['algorithm'] != 'kmeans', r.get('n_clusters', 0), r.get('eps', 0)))
+    return models[('kmeans', best['n_clusters'])], results
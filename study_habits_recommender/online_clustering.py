@@ -0,0 +1,135 @@
+"""
+Online (streaming) k-means updates from live student behaviour
+"""
+
+import atexit
+import queue
+import threading
+import time
+import traceback
+
+from shared_model import streaming_update, file_lock
+
+
+class OnlineClusterer:
+    """Feed per-student feature rows into the shared centroids on a background thread
+
+    Request handlers call submit(), which never blocks: rows go into a
+    bounded queue and are dropped (and counted) if the learner falls
+    behind. The learner thread collects rows from up to batch_size
+    students, or whatever arrived within flush_interval seconds, and
+    applies them as one mini-batch update to the exported model file, so
+    every worker process predicts with the updated centers. Older data
+    loses half its weight every half_life seconds.
+
+    on_update, if given, is called with the updated record after each
+    batch, while the file lock is still held, so anything derived from the
+    centers (such as the cluster profiles) can be rebuilt to match.
+
+    A student counts once per batch: a later row replaces their earlier
+    one, since each is the student's whole running average. Otherwise a
+    student logging many sessions would pull the centers once per log.
+    """
+
+    def __init__(self, model_path, lock_path, half_life=86400.0, batch_size=256,
+                 queue_size=10000, flush_interval=5.0, on_update=None):
+        self.model_path = model_path
+        self.lock_path = lock_path
+        self.half_life = half_life
+        self.on_update = on_update
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.applied = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_update = None
+
+    def start(self):
+        """Start the learner thread; close() is registered to run at interpreter exit"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='online-kmeans', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return self
+
+    def submit(self, student_id, features):
+        """Queue a student's current raw feature row; return False if the queue is full"""
+        try:
+            self._queue.put_nowait((student_id, features))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def close(self):
+        """Apply the rows already queued, then stop the learner thread (safe to call twice)"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # student_id -> latest row
+            batch = dict([first])
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                student_id, features = item
+                batch[student_id] = features
+
+            try:
+                self.apply(list(batch.values()))
+            except Exception:
+                # A missing or replaced model file only costs this batch
+                with self._stats_lock:
+                    self.errors += 1
+                traceback.print_exc()
+            if stop:
+                return
+
+    def apply(self, batch):
+        """Apply one batch now (the learner thread calls this; also usable directly)"""
+        with file_lock(self.lock_path):
+            record = streaming_update(self.model_path, batch, self.half_life)
+            if self.on_update is not None:
+                self.on_update(record)
+        with self._stats_lock:
+            self.applied += len(batch)
+            self.batches += 1
+            self.last_update = time.time()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'applied': self.applied,
+                'batches': self.batches,
+                'errors': self.errors,
+                'queued': self._queue.qsize()
+            }
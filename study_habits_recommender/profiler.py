@@ -0,0 +1,88 @@
+"""
+Opt-in sampling profiler for individual requests
+"""
+
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+MAX_STACK_DEPTH = 64
+
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval from a helper thread
+
+    Sampling costs the profiled thread nothing beyond the interpreter's
+    own thread switching, unlike a tracing profiler that hooks every call.
+    Results are folded stacks ("outer;inner;leaf count"), the input format
+    of flame graph tools.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._started = None
+        self.duration = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+    def top_functions(self, n=20):
+        """Functions by samples in which they were on top of the stack"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'function': name, 'samples': count,
+                 'share': round(count / self.samples, 3) if self.samples else 0}
+                for name, count in leaves.most_common(n)]
+
+
+class ProfileStore:
+    """The most recent request profiles, kept for the admin to download"""
+
+    def __init__(self, maxsize=20):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._profiles = OrderedDict()
+
+    def add(self, profiler, path):
+        profile_id = uuid.uuid4().hex
+        with self._lock:
+            self._profiles[profile_id] = (path, profiler)
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
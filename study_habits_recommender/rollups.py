@@ -0,0 +1,253 @@
+"""
+Daily rollups of study logs and the trend series computed from them
+"""
+
+from datetime import date
+
+import numpy as np
+
+from aggregates import day_ordinal, is_iso_date
+from log_store import NO_SCORE
+
+# Per-day sums kept for each cluster. The scored_* and *_sq / hours_score
+# moments cover only logs with a quiz score and feed the correlations.
+ROLLUP_FIELDS = ('sessions', 'hours_sum', 'score_sum', 'score_count', 'scored_hours_sum',
+                 'scored_hours_sq', 'score_sq', 'hours_score', 'student_days')
+# Per-day sums kept for each student
+STUDENT_ROLLUP_FIELDS = ROLLUP_FIELDS[:4]
+
+UNASSIGNED = -1  # cluster id for logs written before the student had a cluster
+PERIODS = ('day', 'week', 'month')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MAX_GROW_ROWS = 4096  # largest single growth step of a DailySeries
+DAY_BITS = 22  # every day ordinal (date.max is 3652059) fits in this many bits of a packed key
+
+
+def log_metrics(log, first_of_day=False):
+    """A log's contribution to ROLLUP_FIELDS; first_of_day if it is its student's first log that day"""
+    hours = log['study_hours']
+    score = log['quiz_score']
+    student_days = 1 if first_of_day else 0
+    if score:
+        return (1, hours, score, 1, hours, hours * hours, score * score, hours * score, student_days)
+    return (1, hours, 0, 0, 0, 0, 0, 0, student_days)
+
+
+def daily_sums(days, hours, scores):
+    """STUDENT_ROLLUP_FIELDS summed per day from one student's log columns in date order
+
+    scores holds NO_SCORE where a log had no quiz; like log_metrics, a
+    score of 0 also counts as none. Returns (distinct days, sums).
+    """
+    if not len(days):
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(STUDENT_ROLLUP_FIELDS)))
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    scored = (scores != NO_SCORE) & (scores != 0)
+    columns = np.column_stack([np.ones(len(days)), hours, np.where(scored, scores, 0), scored])
+    return days[starts].astype(np.int64), np.add.reduceat(columns, starts, axis=0)
+
+
+class DailySeries:
+    """Rows of sums for the days that have logs, in arrival order (sparse)
+
+    A day -> row map finds a day's row, so space follows the number of
+    days with logs rather than the span between the earliest and latest
+    date. The arrays grow geometrically, by at most MAX_GROW_ROWS rows at
+    a time.
+    """
+
+    __slots__ = ('rows', 'days', 'values')
+
+    def __init__(self, width):
+        self.rows = {}
+        self.days = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((0, width))
+
+    def add(self, day, metrics):
+        row = self.rows.get(day)
+        if row is None:
+            row = self.rows[day] = len(self.rows)
+            if row == len(self.days):
+                grow = min(max(row, 64), MAX_GROW_ROWS)
+                self.days = np.concatenate([self.days, np.zeros(grow, dtype=np.int64)])
+                self.values = np.vstack([self.values, np.zeros((grow, self.values.shape[1]))])
+            self.days[row] = day
+        self.values[row] += metrics
+
+    def between(self, start, end):
+        """(days, values) for days with any logs in [start, end]; either bound may be None"""
+        used = len(self.rows)
+        days = self.days[:used]
+        selected = np.ones(used, dtype=bool)
+        if start is not None:
+            selected &= days >= start
+        if end is not None:
+            selected &= days <= end
+        return days[selected], self.values[:used][selected]
+
+
+class Rollups:
+    """In-memory daily rollups per cluster
+
+    The SQLite backend keeps the same sums in cluster_daily. A log counts
+    towards the cluster its student was in when it arrived; when a new
+    model gives the cluster ids new meanings, rebuild() re-attributes
+    every log to its student's cluster under that model. Logs whose
+    date isn't YYYY-MM-DD are left out. Per-student days (SQLite's
+    student_daily) aren't stored again here: MemoryStorage sums them on
+    request from the LogStore's date-sorted per-student rows.
+    """
+
+    def __init__(self):
+        self.clusters = {}
+
+    def add(self, log, cluster_id, first_of_day):
+        if not is_iso_date(log['date']):
+            return
+        cluster_id = UNASSIGNED if cluster_id is None else cluster_id
+        series = self.clusters.get(cluster_id)
+        if series is None:
+            series = self.clusters[cluster_id] = DailySeries(len(ROLLUP_FIELDS))
+        series.add(day_ordinal(log['date']), log_metrics(log, first_of_day))
+
+    def rebuild(self, cluster_of_student, chunks):
+        """Recompute every series from all logs, counting each towards its student's cluster now
+
+        cluster_of_student maps student codes to cluster ids (UNASSIGNED for
+        none); chunks yields (student codes, day ordinals, study hours, quiz
+        scores) arrays for blocks of logs, with day 0 for dates that aren't
+        YYYY-MM-DD and NO_SCORE for no quiz.
+        """
+        self.clusters = {}
+        student_days = []
+        for students, days, hours, scores in chunks:
+            dated = days > 0
+            students, days, hours, scores = students[dated], days[dated].astype(np.int64), hours[dated], scores[dated]
+            scored = (scores != NO_SCORE) & (scores != 0)
+            score = np.where(scored, scores, 0).astype(np.float64)
+            scored_hours = np.where(scored, hours, 0.0)
+            self._add_groups(cluster_of_student[students], days, 0,
+                             [np.ones(len(days)), hours, score, scored.astype(np.float64), scored_hours,
+                              scored_hours * hours, score * score, scored_hours * score])
+            student_days.append(np.unique((students.astype(np.int64) << DAY_BITS) | days))
+        if student_days:
+            # Distinct (student, day) pairs across all chunks
+            keys = np.unique(np.concatenate(student_days))
+            self._add_groups(cluster_of_student[keys >> DAY_BITS], keys & ((1 << DAY_BITS) - 1),
+                             len(ROLLUP_FIELDS) - 1, [np.ones(len(keys))])
+
+    def _add_groups(self, cluster_ids, days, first_field, columns):
+        """Sum columns (ROLLUP_FIELDS from first_field on) per (cluster, day) and add them to the series"""
+        keys = ((cluster_ids.astype(np.int64) - UNASSIGNED) << DAY_BITS) | days
+        groups, index = np.unique(keys, return_inverse=True)
+        sums = np.zeros((len(groups), len(ROLLUP_FIELDS)))
+        for offset, column in enumerate(columns):
+            sums[:, first_field + offset] = np.bincount(index, weights=column, minlength=len(groups))
+        for key, metrics in zip(groups.tolist(), sums):
+            cluster_id = (key >> DAY_BITS) + UNASSIGNED
+            series = self.clusters.get(cluster_id)
+            if series is None:
+                series = self.clusters[cluster_id] = DailySeries(len(ROLLUP_FIELDS))
+            series.add(key & ((1 << DAY_BITS) - 1), metrics)
+
+    def cluster_days(self, start=None, end=None):
+        """(cluster_ids, days, values) rows for every cluster with logs in [start, end]"""
+        cluster_ids, days, values = [], [], []
+        for cluster_id, series in self.clusters.items():
+            series_days, series_values = series.between(start, end)
+            cluster_ids.append(np.full(len(series_days), cluster_id, dtype=np.int64))
+            days.append(series_days)
+            values.append(series_values)
+        if not days:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, len(ROLLUP_FIELDS)))
+        return np.concatenate(cluster_ids), np.concatenate(days), np.concatenate(values)
+
+
+def period_keys(days, period):
+    """Integer bucket per day ordinal: the day itself, its ISO week (Monday start) or its month"""
+    if period == 'day':
+        return days
+    if period == 'week':
+        return (days - 1) // 7  # ordinal 1 (0001-01-01) is a Monday
+    return (days - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def period_label(key, period):
+    if period == 'day':
+        return date.fromordinal(int(key)).isoformat()
+    if period == 'week':
+        year, week, _ = date.fromordinal(int(key) * 7 + 1).isocalendar()
+        return f'{year}-W{week:02d}'
+    return str(np.datetime64(int(key), 'M'))
+
+
+def bucket(days, values, period, keys=None):
+    """Sum rows into periods; return (sorted period keys, summed values)
+
+    With keys given, the result is aligned to them (zeros where empty).
+    """
+    row_keys = period_keys(days, period)
+    if keys is None:
+        keys = np.unique(row_keys)
+    index = np.searchsorted(keys, row_keys)
+    totals = np.zeros((len(keys), values.shape[1]))
+    for column in range(values.shape[1]):
+        totals[:, column] = np.bincount(index, weights=values[:, column], minlength=len(keys))
+    return keys, totals
+
+
+def _ratio(numerator, denominator, digits):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.round(numerator / denominator, digits)
+    return [float(value) if count else None for value, count in zip(ratio, denominator)]
+
+
+def series_payload(keys, totals, period):
+    """JSON-ready series from bucket() output (works for student rows too)"""
+    payload = {
+        'periods': [period_label(key, period) for key in keys],
+        'sessions': totals[:, 0].astype(int).tolist(),
+        'hours': np.round(totals[:, 1], 1).tolist(),
+        'avg_hours': _ratio(totals[:, 1], totals[:, 0], 2),
+        'avg_score': _ratio(totals[:, 2], totals[:, 3], 1)
+    }
+    if totals.shape[1] == len(ROLLUP_FIELDS):
+        payload['student_days'] = totals[:, 8].astype(int).tolist()
+    return payload
+
+
+def correlation(totals):
+    """Pearson r and least-squares slope (score points per study hour) from summed moments
+
+    totals is a (rows, ROLLUP_FIELDS) array; returns arrays of r and
+    slope per row (NaN where fewer than three scored logs or no spread).
+    """
+    n, sx, sy = totals[:, 3], totals[:, 4], totals[:, 2]
+    sxx, syy, sxy = totals[:, 5], totals[:, 6], totals[:, 7]
+    cov = n * sxy - sx * sy
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = cov / np.sqrt(var_x * var_y)
+        slope = cov / var_x
+    # Rounding noise can leave a tiny positive variance for constant data
+    valid = (n >= 3) & (var_x > 1e-9 * n * n) & (var_y > 1e-9 * n * n)
+    return np.where(valid, r, np.nan), np.where(valid, slope, np.nan)
+
+
+def _floats(values, digits):
+    return [round(float(value), digits) if np.isfinite(value) else None for value in values]
+
+
+def correlation_payload(keys, totals, period):
+    r, slope = correlation(totals)
+    overall_r, overall_slope = correlation(totals.sum(axis=0, keepdims=True))
+    return {
+        'r': _floats(overall_r, 3)[0],
+        'slope': _floats(overall_slope, 3)[0],
+        'scored_logs': int(totals[:, 3].sum()),
+        'periods': [period_label(key, period) for key in keys],
+        'r_by_period': _floats(r, 3),
+        'slope_by_period': _floats(slope, 3),
+        'scored_logs_by_period': totals[:, 3].astype(int).tolist()
+    }
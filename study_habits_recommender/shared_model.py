@@ -0,0 +1,226 @@
+"""
+Model parameters shared between worker processes through a memory-mapped file
+
+Prediction only needs the scaler's mean/scale vectors and the centroid
+matrix, so those are exported from the fitted scikit-learn objects into
+a small versioned .npy file and served with plain NumPy.
+"""
+
+import contextlib
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the development server runs a single process anyway
+    fcntl = None
+
+
+# Bump when the record layout below changes; older files are rejected
+MODEL_FORMAT_VERSION = 3
+
+# Effective sample count per cluster when a model carries no training sizes
+DEFAULT_CLUSTER_WEIGHT = 100.0
+
+
+def model_dtype(n_clusters, n_features):
+    """Structured dtype of the exported record (no pickling needed to read it)"""
+    return np.dtype([
+        ('format_version', '<i4'),
+        ('training_id', 'S32'),
+        ('mean', '<f8', (n_features,)),
+        ('scale', '<f8', (n_features,)),
+        ('centers', '<f8', (n_clusters, n_features)),
+        # Decayed number of points behind each center, online batches applied
+        # and when the weights were last decayed (Unix time)
+        ('weights', '<f8', (n_clusters,)),
+        ('updates', '<i8'),
+        ('updated_at', '<f8')
+    ])
+
+
+def export_centroids(kmeans, scaler, path):
+    """Write scaler mean/scale and the scaled-space centroids as one .npy record
+
+    The file is replaced atomically, so workers that still map the
+    previous version keep a consistent copy.
+    """
+    n_clusters, n_features = kmeans.cluster_centers_.shape
+    record = np.zeros((), dtype=model_dtype(n_clusters, n_features))
+    record['format_version'] = MODEL_FORMAT_VERSION
+    record['training_id'] = (getattr(kmeans, 'training_id_', None) or '').encode()
+    record['mean'] = scaler.mean_
+    record['scale'] = scaler.scale_
+    record['centers'] = kmeans.cluster_centers_
+    clusters = (getattr(kmeans, 'insights_', None) or {}).get('clusters')
+    if clusters and len(clusters) == n_clusters:
+        record['weights'] = [cluster['size'] for cluster in clusters]
+    else:
+        record['weights'] = DEFAULT_CLUSTER_WEIGHT
+    record['updated_at'] = time.time()
+    _write_record(record, path)
+
+
+def _write_record(record, path):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_centroids(path):
+    """Memory-map an exported record; ValueError if it was written by another format version"""
+    record = np.load(path, mmap_mode='r')
+    names = record.dtype.names or ()
+    if 'format_version' not in names or int(record['format_version']) != MODEL_FORMAT_VERSION:
+        raise ValueError(f'{path} is not a version {MODEL_FORMAT_VERSION} model file')
+    return record
+
+
+def streaming_update(path, features, half_life, now=None):
+    """Fold a batch of raw feature rows into the exported centroids (streaming k-means)
+
+    Each center's weight is first decayed by the time since the last
+    update, decay = 0.5 ** (elapsed / half_life), then the batch points
+    closest to it are averaged in:
+        c' = (c * w * decay + sum(points)) / (w * decay + n)
+    so older data fades with age and the model follows current behaviour.
+    Because the decay depends on elapsed time rather than on the number of
+    batches, it is the same however many worker processes apply batches.
+    The caller must hold the training file lock. Returns the new record.
+    """
+    now = time.time() if now is None else now
+    record = np.array(load_centroids(path))  # private in-memory copy
+    points = (np.asarray(features, dtype=np.float64) - record['mean']) / record['scale']
+    labels = nearest_centroid(record, features)
+
+    n_clusters = len(record['centers'])
+    counts = np.bincount(labels, minlength=n_clusters)
+    sums = np.zeros_like(record['centers'])
+    np.add.at(sums, labels, points)
+
+    elapsed = max(0.0, now - float(record['updated_at']))
+    weights = record['weights'] * 0.5 ** (elapsed / half_life)
+    updated = counts > 0
+    new_weights = weights + counts
+    record['centers'][updated] = ((record['centers'][updated] * weights[updated, None] + sums[updated])
+                                  / new_weights[updated, None])
+    record['weights'] = new_weights
+    record['updates'] += 1
+    record['updated_at'] = now
+    _write_record(record, path)
+    return record
+
+
+def nearest_centroid(record, features):
+    """Vectorized scale-then-argmin over an exported record"""
+    centers = np.asarray(record['centers'])
+    scaled = (np.asarray(features, dtype=np.float64) - record['mean']) / record['scale']
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 is the same for every center
+    distances = (centers * centers).sum(axis=1) - 2 * scaled @ centers.T
+    return distances.argmin(axis=1)
+
+
+class SharedCentroids:
+    """Nearest-centroid predictor over a memory-mapped model record
+
+    Every worker maps the same file, so the operating system keeps one
+    copy of the model in the page cache however many processes serve
+    requests. The file's mtime is checked at most every check_interval
+    seconds, so a model retrained by any worker is picked up by all.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._record = None
+        self._rows = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        # Number of times the file was (re)mapped
+        self.reloads = 0
+
+    def get(self):
+        """Return the current model record
+
+        Raises FileNotFoundError if none has been exported yet and
+        ValueError if the file has an unsupported format version.
+        """
+        record = self._record
+        if record is not None and time.monotonic() - self._last_check < self.check_interval:
+            return record
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                if self._record is None:
+                    raise
+                return self._record
+            if mtime != self._mtime:
+                record = load_centroids(self.path)
+                # Plain Python copies for the single-row path
+                self._rows = (record['mean'].tolist(), record['scale'].tolist(), record['centers'].tolist())
+                self._record = record
+                self._mtime = mtime
+                self.reloads += 1
+            return self._record
+
+    def refresh(self):
+        """Look at the file again on the next call (after this process exported a model)"""
+        self._last_check = 0.0
+
+    def predict(self, features):
+        """Label each row of an (n, n_features) matrix with its nearest centroid"""
+        return nearest_centroid(self.get(), features)
+
+    def predict_one(self, row):
+        """Label a single feature row without building any arrays
+
+        For one row, NumPy's per-call overhead outweighs the arithmetic
+        (a handful of multiplies), so this uses plain floats.
+        """
+        self.get()
+        mean, scale, centers = self._rows
+        scaled = [(value - m) / s for value, m, s in zip(row, mean, scale)]
+        best, best_distance = 0, float('inf')
+        for label, center in enumerate(centers):
+            distance = sum((x - c) * (x - c) for x, c in zip(scaled, center))
+            if distance < best_distance:
+                best, best_distance = label, distance
+        return best
+
+
+def label_agreement(path, kmeans, scaler, features):
+    """Fraction of rows on which the exported model at path and scikit-learn agree"""
+    features = np.asarray(features, dtype=np.float64)
+    if not len(features):
+        return 1.0
+    expected = kmeans.predict(scaler.transform(features))
+    return float((nearest_centroid(load_centroids(path), features) == expected).mean())
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive advisory lock shared by every process that opens path"""
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
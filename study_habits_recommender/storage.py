@@ -0,0 +1,885 @@
+"""
+Pluggable storage backends for students, study logs and derived counters
+
+MemoryStorage keeps everything in process (the original behaviour).
+SQLiteStorage persists to a WAL-mode database that several worker
+processes can share; per-student aggregates, daily rollups and the
+admin counters are maintained by triggers, and study-day runs (for streaks) by the writer,
+in the same transaction as each insert.
+"""
+
+import queue
+import sqlite3
+import threading
+from datetime import date
+
+import numpy as np
+
+from log_store import LogStore
+from aggregates import StudentAggregates, StreakTracker, day_ordinal
+from analytics import AnalyticsView
+from rollups import Rollups, ROLLUP_FIELDS, STUDENT_ROLLUP_FIELDS, UNASSIGNED, daily_sums
+
+
+class MemoryStorage:
+    """Process-local storage backed by dicts and a LogStore"""
+
+    def __init__(self):
+        # Guards multi-step updates (log index + aggregates + counters)
+        self._lock = threading.RLock()
+        self.students = {}
+        self.logs = LogStore()
+        self.aggregates = {}
+        self.streaks = {}
+        # cluster_id -> student ids, for cluster-filtered exports
+        self.cluster_members = {}
+        self.rollups = Rollups()
+        self.analytics = AnalyticsView()
+
+    # Students
+
+    def get_student(self, student_id):
+        return self.students.get(student_id)
+
+    def add_student(self, student_id, record):
+        """Insert a student unless one already exists; return True if created"""
+        with self._lock:
+            if student_id in self.students:
+                return False
+            self.students[student_id] = dict(record)
+            self.analytics.student_added()
+            if record.get('cluster_id') is not None:
+                self.analytics.cluster_changed(None, record['cluster_id'])
+                self.cluster_members.setdefault(record['cluster_id'], set()).add(student_id)
+            return True
+
+    def set_student_clusters(self, assignments):
+        """Apply (student_id, cluster_id) pairs; return how many actually changed"""
+        changed = 0
+        with self._lock:
+            for student_id, cluster_id in assignments:
+                student = self.students.get(student_id)
+                if student is None or student.get('cluster_id') == cluster_id:
+                    continue
+                self.analytics.cluster_changed(student.get('cluster_id'), cluster_id)
+                self.cluster_members.get(student.get('cluster_id'), set()).discard(student_id)
+                self.cluster_members.setdefault(cluster_id, set()).add(student_id)
+                student['cluster_id'] = cluster_id
+                changed += 1
+        return changed
+
+    def set_student_cluster(self, student_id, cluster_id):
+        return self.set_student_clusters([(student_id, cluster_id)]) > 0
+
+    # Study logs
+
+    def add_log(self, entry):
+        """Store a log entry, assigning its log_id; return the stored log"""
+        return self.add_logs([entry])[0]
+
+    def add_logs(self, entries):
+        """Store several log entries in one operation; return the stored logs"""
+        with self._lock:
+            stored = [dict(entry, log_id=len(self.logs) + i) for i, entry in enumerate(entries, 1)]
+            batch_days = set()
+            for log in stored:
+                stats = self.aggregates.setdefault(log['student_id'], StudentAggregates())
+                stats.add(log)
+                self.analytics.log_added(log, first_for_student=stats.sessions == 1)
+                day = day_ordinal(log['date'])
+                self.streaks.setdefault(log['student_id'], StreakTracker()).add(day)
+                student = self.students.get(log['student_id'])
+                # The batch isn't in the log store yet, so earlier logs of this batch are tracked here
+                first_of_day = (day is not None and (log['student_id'], day) not in batch_days
+                                and self.logs.day_count(log['student_id'], day) == 0)
+                batch_days.add((log['student_id'], day))
+                self.rollups.add(log, student.get('cluster_id') if student else None, first_of_day=first_of_day)
+            self.logs.extend(stored)
+        return stored
+
+    def latest_logs(self, student_id, n):
+        return self.logs.latest(student_id, n)
+
+    def recent_logs(self, n):
+        return self.logs.recent(n)
+
+    def iter_logs(self, start=None, end=None, cluster_id=None, chunk_size=1000):
+        """Yield lists of logs with start <= date <= end, optionally only for one cluster's students
+
+        Logs come in date order, or grouped by student (then date) when
+        filtered by cluster. Chunks are taken under the lock one at a time.
+        """
+        if cluster_id is None:
+            chunks = self.logs.iter_range(start, end, chunk_size)
+        else:
+            chunks = self._iter_cluster_logs(start, end, cluster_id, chunk_size)
+        while True:
+            with self._lock:
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def _iter_cluster_logs(self, start, end, cluster_id, chunk_size):
+        chunk = []
+        for student_id in sorted(self.cluster_members.get(cluster_id, ())):
+            chunk.extend(self.logs.between(student_id, start, end))
+            while len(chunk) >= chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield chunk
+
+    # Derived state
+
+    def student_version(self, student_id):
+        """Cheap token that changes whenever a student's logs or cluster change"""
+        student = self.students.get(student_id)
+        stats = self.aggregates.get(student_id)
+        return (student.get('cluster_id') if student else None, stats.sessions if stats else 0)
+
+    def student_aggregates(self, student_id):
+        return self.aggregates.get(student_id)
+
+    def student_streak(self, student_id, today):
+        """Return (current, longest) streak in days; today is a date ordinal"""
+        streak = self.streaks.get(student_id)
+        if streak is None:
+            return 0, 0
+        return streak.current(today), streak.longest
+
+    def cluster_daily_rollups(self, start=None, end=None):
+        """(cluster_ids, days, values) arrays of ROLLUP_FIELDS sums per cluster and day ordinal in [start, end]"""
+        with self._lock:
+            return self.rollups.cluster_days(start, end)
+
+    def student_daily_rollups(self, student_id, start=None, end=None):
+        """(days, values) arrays of STUDENT_ROLLUP_FIELDS sums for one student's days in [start, end]"""
+        with self._lock:
+            days, hours, scores = self.logs.student_columns(student_id, start, end)
+        return daily_sums(days, hours, scores)
+
+    def rebuild_cluster_rollups(self):
+        """Re-attribute every log's daily sums to its student's current cluster (after a model change)"""
+        with self._lock:
+            clusters = []
+            for student_id in self.logs.categories['student_id'].values:
+                student = self.students.get(student_id)
+                cluster_id = student.get('cluster_id') if student else None
+                clusters.append(UNASSIGNED if cluster_id is None else cluster_id)
+            self.rollups.rebuild(np.array(clusters, dtype=np.int64), self.logs.column_chunks())
+            self.analytics.rollups_rebuilt()
+
+    def iter_aggregates(self, min_sessions, chunk_size):
+        """Yield lists of (student_id, StudentAggregates) for students with enough logs"""
+        with self._lock:
+            eligible = [(student_id, stats) for student_id, stats in self.aggregates.items()
+                        if stats.sessions >= min_sessions and student_id in self.students]
+        for start in range(0, len(eligible), chunk_size):
+            yield eligible[start:start + chunk_size]
+
+    def iter_students(self, cluster_id=None, chunk_size=1000):
+        """Yield lists of (student_id, record, StudentAggregates or None) in student_id order"""
+        with self._lock:
+            if cluster_id is None:
+                student_ids = sorted(self.students)
+            else:
+                student_ids = sorted(self.cluster_members.get(cluster_id, ()))
+        for start in range(0, len(student_ids), chunk_size):
+            with self._lock:
+                chunk = [(student_id, dict(self.students[student_id]), self.aggregates.get(student_id))
+                         for student_id in student_ids[start:start + chunk_size]]
+            yield chunk
+
+    def analytics_counters(self):
+        return self.analytics.counters()
+
+    def release_connection(self):
+        pass
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    cluster_id INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_students_cluster ON students (cluster_id, student_id);
+
+CREATE TABLE IF NOT EXISTS study_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    study_hours REAL NOT NULL,
+    subject TEXT,
+    study_time TEXT,
+    method_used TEXT,
+    distractions TEXT,
+    quiz_score INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_logs_student_date ON study_logs (student_id, date);
+CREATE INDEX IF NOT EXISTS idx_logs_date ON study_logs (date);
+
+CREATE TABLE IF NOT EXISTS student_aggregates (
+    student_id TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    total_hours REAL NOT NULL,
+    score_sum INTEGER NOT NULL,
+    score_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS student_category_counts (
+    student_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (student_id, field, value)
+) WITHOUT ROWID;
+
+-- Runs of consecutive study days (date ordinals), maintained by the log writer
+CREATE TABLE IF NOT EXISTS student_runs (
+    student_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    PRIMARY KEY (student_id, start)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_runs_student_end ON student_runs (student_id, end);
+
+CREATE TABLE IF NOT EXISTS student_streaks (
+    student_id TEXT PRIMARY KEY,
+    longest INTEGER NOT NULL
+);
+
+-- Daily rollups (day = date ordinal) for trend analytics. A log counts towards
+-- the cluster its student had when it was inserted (-1: none yet); after a
+-- retrain, rebuild_cluster_rollups() re-attributes every log under the new model.
+CREATE TABLE IF NOT EXISTS cluster_daily (
+    cluster_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    hours_sum REAL NOT NULL,
+    score_sum INTEGER NOT NULL,
+    score_count INTEGER NOT NULL,
+    scored_hours_sum REAL NOT NULL,
+    scored_hours_sq REAL NOT NULL,
+    score_sq INTEGER NOT NULL,
+    hours_score REAL NOT NULL,
+    student_days INTEGER NOT NULL,
+    PRIMARY KEY (day, cluster_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS student_daily (
+    student_id TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    hours_sum REAL NOT NULL,
+    score_sum INTEGER NOT NULL,
+    score_count INTEGER NOT NULL,
+    PRIMARY KEY (student_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES
+    ('version', 0), ('total_students', 0), ('total_logs', 0),
+    ('active_students', 0), ('hours_sum', 0);
+
+CREATE TABLE IF NOT EXISTS cluster_counts (
+    cluster_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_log_insert AFTER INSERT ON study_logs
+BEGIN
+    INSERT INTO student_aggregates (student_id, sessions, total_hours, score_sum, score_count)
+    VALUES (NEW.student_id, 1, NEW.study_hours,
+            CASE WHEN NEW.quiz_score THEN NEW.quiz_score ELSE 0 END,
+            CASE WHEN NEW.quiz_score THEN 1 ELSE 0 END)
+    ON CONFLICT (student_id) DO UPDATE SET
+        sessions = sessions + 1,
+        total_hours = total_hours + excluded.total_hours,
+        score_sum = score_sum + excluded.score_sum,
+        score_count = score_count + excluded.score_count;
+    INSERT INTO student_category_counts VALUES (NEW.student_id, 'distractions', NEW.distractions, 1)
+    ON CONFLICT DO UPDATE SET count = count + 1;
+    INSERT INTO student_category_counts VALUES (NEW.student_id, 'study_time', NEW.study_time, 1)
+    ON CONFLICT DO UPDATE SET count = count + 1;
+    UPDATE counters SET value = value + 1 WHERE name IN ('version', 'total_logs');
+    UPDATE counters SET value = value + NEW.study_hours WHERE name = 'hours_sum';
+END;
+
+-- Logs with a date that isn't YYYY-MM-DD are left out of the rollups. The cluster
+-- row goes first so the student_daily trigger below finds it.
+CREATE TRIGGER IF NOT EXISTS trg_log_rollup AFTER INSERT ON study_logs
+WHEN date(NEW.date) IS NEW.date
+BEGIN
+    INSERT INTO cluster_daily VALUES (
+        COALESCE((SELECT cluster_id FROM students WHERE student_id = NEW.student_id), -1),
+        CAST(julianday(NEW.date) - 1721424.5 AS INTEGER),
+        1, NEW.study_hours,
+        CASE WHEN NEW.quiz_score THEN NEW.quiz_score ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN 1 ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN NEW.study_hours ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN NEW.study_hours * NEW.study_hours ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN NEW.quiz_score * NEW.quiz_score ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN NEW.study_hours * NEW.quiz_score ELSE 0 END,
+        0)
+    ON CONFLICT DO UPDATE SET
+        sessions = sessions + 1,
+        hours_sum = hours_sum + excluded.hours_sum,
+        score_sum = score_sum + excluded.score_sum,
+        score_count = score_count + excluded.score_count,
+        scored_hours_sum = scored_hours_sum + excluded.scored_hours_sum,
+        scored_hours_sq = scored_hours_sq + excluded.scored_hours_sq,
+        score_sq = score_sq + excluded.score_sq,
+        hours_score = hours_score + excluded.hours_score;
+    INSERT INTO student_daily VALUES (
+        NEW.student_id, CAST(julianday(NEW.date) - 1721424.5 AS INTEGER), 1, NEW.study_hours,
+        CASE WHEN NEW.quiz_score THEN NEW.quiz_score ELSE 0 END,
+        CASE WHEN NEW.quiz_score THEN 1 ELSE 0 END)
+    ON CONFLICT DO UPDATE SET
+        sessions = sessions + 1,
+        hours_sum = hours_sum + excluded.hours_sum,
+        score_sum = score_sum + excluded.score_sum,
+        score_count = score_count + excluded.score_count;
+END;
+
+-- Only fires for a student's first log of a day
+CREATE TRIGGER IF NOT EXISTS trg_student_day AFTER INSERT ON student_daily
+BEGIN
+    UPDATE cluster_daily SET student_days = student_days + 1
+    WHERE day = NEW.day
+      AND cluster_id = COALESCE((SELECT cluster_id FROM students WHERE student_id = NEW.student_id), -1);
+END;
+
+-- Only fires for a student's first log (later logs take the UPSERT's update path)
+CREATE TRIGGER IF NOT EXISTS trg_first_log AFTER INSERT ON student_aggregates
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'active_students';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_student_insert AFTER INSERT ON students
+BEGIN
+    UPDATE counters SET value = value + 1 WHERE name IN ('version', 'total_students');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_student_cluster AFTER UPDATE OF cluster_id ON students
+WHEN OLD.cluster_id IS NOT NEW.cluster_id
+BEGIN
+    UPDATE cluster_counts SET count = count - 1 WHERE cluster_id = OLD.cluster_id;
+    INSERT INTO cluster_counts SELECT NEW.cluster_id, 1 WHERE NEW.cluster_id IS NOT NULL
+    ON CONFLICT DO UPDATE SET count = count + 1;
+    UPDATE counters SET value = value + 1 WHERE name = 'version';
+END;
+"""
+
+LOG_COLUMNS = ('log_id', 'student_id', 'date', 'study_hours', 'subject',
+               'study_time', 'method_used', 'distractions', 'quiz_score')
+LOG_SELECT = 'SELECT ' + ', '.join(LOG_COLUMNS) + ' FROM study_logs'
+INSERT_LOG = ('INSERT INTO study_logs (student_id, date, study_hours, subject, study_time, '
+              'method_used, distractions, quiz_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+AGGREGATES_SELECT = """
+SELECT a.student_id, a.sessions, a.total_hours, a.score_sum, a.score_count,
+    (SELECT value FROM student_category_counts c
+     WHERE c.student_id = a.student_id AND c.field = 'distractions'
+     ORDER BY c.count DESC, c.value LIMIT 1),
+    (SELECT value FROM student_category_counts c
+     WHERE c.student_id = a.student_id AND c.field = 'study_time'
+     ORDER BY c.count DESC, c.value LIMIT 1)
+FROM student_aggregates a
+"""
+
+STUDENT_EXPORT_SELECT = """
+SELECT s.student_id, s.name, s.email, s.cluster_id, s.created_at,
+    a.student_id, a.sessions, a.total_hours, a.score_sum, a.score_count,
+    (SELECT value FROM student_category_counts c
+     WHERE c.student_id = s.student_id AND c.field = 'distractions'
+     ORDER BY c.count DESC, c.value LIMIT 1),
+    (SELECT value FROM student_category_counts c
+     WHERE c.student_id = s.student_id AND c.field = 'study_time'
+     ORDER BY c.count DESC, c.value LIMIT 1)
+FROM students s LEFT JOIN student_aggregates a ON a.student_id = s.student_id
+"""
+
+ROLLUP_BACKFILL_STUDENTS = """
+INSERT INTO student_daily
+SELECT student_id, CAST(julianday(date) - 1721424.5 AS INTEGER), COUNT(*), SUM(study_hours),
+    SUM(CASE WHEN quiz_score THEN quiz_score ELSE 0 END), SUM(CASE WHEN quiz_score THEN 1 ELSE 0 END)
+FROM study_logs WHERE date(date) IS date
+GROUP BY 1, 2
+"""
+ROLLUP_BACKFILL_CLUSTERS = """
+INSERT INTO cluster_daily
+SELECT COALESCE(s.cluster_id, -1), CAST(julianday(l.date) - 1721424.5 AS INTEGER), COUNT(*),
+    SUM(l.study_hours),
+    SUM(CASE WHEN l.quiz_score THEN l.quiz_score ELSE 0 END),
+    SUM(CASE WHEN l.quiz_score THEN 1 ELSE 0 END),
+    SUM(CASE WHEN l.quiz_score THEN l.study_hours ELSE 0 END),
+    SUM(CASE WHEN l.quiz_score THEN l.study_hours * l.study_hours ELSE 0 END),
+    SUM(CASE WHEN l.quiz_score THEN l.quiz_score * l.quiz_score ELSE 0 END),
+    SUM(CASE WHEN l.quiz_score THEN l.study_hours * l.quiz_score ELSE 0 END),
+    COUNT(DISTINCT l.student_id)
+FROM study_logs l LEFT JOIN students s ON s.student_id = l.student_id
+WHERE date(l.date) IS l.date
+GROUP BY 1, 2
+"""
+
+# Bounds for open-ended date ranges (dates are ISO strings)
+MIN_DATE = ''
+MAX_DATE = '\uffff'
+MAX_DAY = date.max.toordinal()
+
+
+def _log_params(entry):
+    return (entry['student_id'], entry['date'], entry['study_hours'], entry['subject'],
+            entry['study_time'], entry['method_used'], entry['distractions'], entry['quiz_score'])
+
+
+def _aggregates_from_row(row):
+    stats = StudentAggregates()
+    (_, stats.sessions, stats.total_hours, stats.score_sum, stats.score_count,
+     stats.top_distraction, stats.top_study_time) = row
+    return stats
+
+
+def _add_study_day(conn, student_id, day):
+    """Merge one study day into the student's runs; O(log n) index lookups"""
+    if day is None:
+        return
+    row = conn.execute('SELECT start FROM student_runs WHERE student_id = ? AND end >= ?'
+                       ' ORDER BY end LIMIT 1', (student_id, day)).fetchone()
+    if row is not None and row[0] <= day:
+        return  # already inside a run
+
+    start = end = day
+    left = conn.execute('SELECT start FROM student_runs WHERE student_id = ? AND end = ?',
+                        (student_id, day - 1)).fetchone()
+    if left is not None:
+        start = left[0]
+        conn.execute('DELETE FROM student_runs WHERE student_id = ? AND start = ?', (student_id, start))
+    right = conn.execute('SELECT end FROM student_runs WHERE student_id = ? AND start = ?',
+                         (student_id, day + 1)).fetchone()
+    if right is not None:
+        end = right[0]
+        conn.execute('DELETE FROM student_runs WHERE student_id = ? AND start = ?', (student_id, day + 1))
+    conn.execute('INSERT INTO student_runs (student_id, start, end) VALUES (?, ?, ?)', (student_id, start, end))
+    conn.execute('INSERT INTO student_streaks (student_id, longest) VALUES (?, ?)'
+                 ' ON CONFLICT (student_id) DO UPDATE SET longest = MAX(longest, excluded.longest)',
+                 (student_id, end - start + 1))
+
+
+class _PendingWrite:
+    __slots__ = ('entries', 'done', 'log_ids', 'error')
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.done = threading.Event()
+        self.log_ids = None
+        self.error = None
+
+
+class GroupCommitWriter:
+    """Background writer that commits queued log inserts in shared transactions
+
+    Callers block until their rows are committed, so reads afterwards see
+    them. Whatever queues up while a commit is in flight goes into the next
+    transaction, so under burst load many inserts share one commit (and
+    one fsync) while a lone insert is never held back waiting for company.
+    """
+
+    def __init__(self, connect, max_batch=512):
+        self._connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def insert(self, entries):
+        """Insert log entries and return their log_ids once committed"""
+        pending = _PendingWrite(entries)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.log_ids
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._commit(conn, batch)
+            except sqlite3.Error:
+                # Retry one by one so a single bad entry only fails its own caller
+                for pending in batch:
+                    try:
+                        self._commit(conn, [pending])
+                    except sqlite3.Error as e:
+                        pending.error = e
+            for pending in batch:
+                pending.done.set()
+            if stop:
+                break
+        conn.close()
+
+    @staticmethod
+    def _commit(conn, batch):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for pending in batch:
+                pending.log_ids = [conn.execute(INSERT_LOG, _log_params(entry)).lastrowid
+                                   for entry in pending.entries]
+                for entry in pending.entries:
+                    _add_study_day(conn, entry['student_id'], day_ordinal(entry['date']))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+
+class _ThreadConnection:
+    """A connection checked out by one thread
+
+    Held only in the thread's threading.local, so when the thread exits
+    without calling release_connection() the holder is freed and hands
+    the connection back then.
+    """
+
+    __slots__ = ('storage', 'conn')
+
+    def __init__(self, storage, conn):
+        self.storage = storage
+        self.conn = conn
+
+    def release(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            self.storage._checkin(conn)
+
+    def __del__(self):
+        self.release()
+
+
+class SQLiteStorage:
+    """SQLite (WAL mode) storage shareable by several worker processes
+
+    A thread checks a connection out of a small pool on first use and
+    keeps it until release_connection() (the app calls it when each
+    request ends) or until the thread exits, so short-lived threads don't
+    pile up open connections. At most pool_size idle connections are kept;
+    statements are fixed strings so sqlite3's per-connection statement
+    cache reuses them as prepared statements. Log inserts go through a
+    GroupCommitWriter.
+    """
+
+    def __init__(self, path, pool_size=8):
+        self.path = path
+        self.pool_size = pool_size
+        self._local = threading.local()
+        # Every open connection (checked out or idle), so close() can reach them
+        self._connections = set()
+        self._idle = []
+        self._closed = False
+        self._connections_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self._backfill_streaks(conn)
+        self._backfill_rollups(conn)
+        self._writer = GroupCommitWriter(self._open)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def _connection(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            with self._connections_lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open()
+                with self._connections_lock:
+                    self._connections.add(conn)
+            holder = self._local.holder = _ThreadConnection(self, conn)
+        return holder.conn
+
+    def release_connection(self):
+        """Return this thread's connection to the pool (a no-op if it has none)"""
+        holder = self._local.__dict__.pop('holder', None)
+        if holder is not None:
+            holder.release()
+
+    def _checkin(self, conn):
+        with self._connections_lock:
+            if not self._closed and len(self._idle) < self.pool_size:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.append(conn)
+                return
+            self._connections.discard(conn)
+        conn.close()
+
+    def _write(self, sql, params_seq):
+        """Run one statement per parameter tuple in a single transaction; return rows changed"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # rowcount sums the statement's own changes, excluding trigger side effects
+            changed = conn.executemany(sql, params_seq).rowcount
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return changed
+
+    @staticmethod
+    def _backfill_streaks(conn):
+        """Build the streak tables for databases created before they existed"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if (conn.execute('SELECT 1 FROM student_streaks LIMIT 1').fetchone() is None
+                    and conn.execute('SELECT 1 FROM study_logs LIMIT 1').fetchone() is not None):
+                for student_id, date_str in conn.execute(
+                        'SELECT DISTINCT student_id, date FROM study_logs').fetchall():
+                    _add_study_day(conn, student_id, day_ordinal(date_str))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _backfill_rollups(conn):
+        """Build the daily rollups for databases created before they existed
+
+        Logs are attributed to their student's current cluster.
+        """
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if (conn.execute('SELECT 1 FROM cluster_daily LIMIT 1').fetchone() is None
+                    and conn.execute('SELECT 1 FROM study_logs LIMIT 1').fetchone() is not None):
+                # student_daily first: its trigger finds no cluster rows to update yet
+                conn.execute(ROLLUP_BACKFILL_STUDENTS)
+                conn.execute(ROLLUP_BACKFILL_CLUSTERS)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _log_rows(cursor):
+        return [dict(zip(LOG_COLUMNS, row)) for row in cursor]
+
+    # Students
+
+    def get_student(self, student_id):
+        row = self._connection().execute(
+            'SELECT name, email, cluster_id, created_at FROM students WHERE student_id = ?',
+            (student_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('name', 'email', 'cluster_id', 'created_at'), row))
+
+    def add_student(self, student_id, record):
+        changed = self._write(
+            'INSERT OR IGNORE INTO students (student_id, name, email, created_at) VALUES (?, ?, ?, ?)',
+            [(student_id, record.get('name'), record.get('email'), record.get('created_at'))])
+        if changed and record.get('cluster_id') is not None:
+            self.set_student_cluster(student_id, record['cluster_id'])
+        return changed > 0
+
+    def set_student_clusters(self, assignments):
+        return self._write(
+            'UPDATE students SET cluster_id = ? WHERE student_id = ? AND cluster_id IS NOT ?',
+            [(cluster_id, student_id, cluster_id) for student_id, cluster_id in assignments])
+
+    def set_student_cluster(self, student_id, cluster_id):
+        return self.set_student_clusters([(student_id, cluster_id)]) > 0
+
+    # Study logs
+
+    def add_log(self, entry):
+        return self.add_logs([entry])[0]
+
+    def add_logs(self, entries):
+        """Insert several logs in a single transaction"""
+        log_ids = self._writer.insert(entries)
+        return [dict(entry, log_id=log_id) for entry, log_id in zip(entries, log_ids)]
+
+    def latest_logs(self, student_id, n):
+        rows = self._log_rows(self._connection().execute(
+            LOG_SELECT + ' WHERE student_id = ? ORDER BY date DESC, log_id DESC LIMIT ?', (student_id, n)))
+        return rows[::-1]
+
+    def recent_logs(self, n):
+        return self._log_rows(self._connection().execute(
+            LOG_SELECT + ' ORDER BY date DESC, log_id DESC LIMIT ?', (n,)))
+
+    def iter_logs(self, start=None, end=None, cluster_id=None, chunk_size=1000):
+        # Keyset pagination, so no read transaction stays open for the whole export.
+        # Date ranges walk idx_logs_date; a cluster filter walks idx_students_cluster
+        # and each member's idx_logs_student_date (logs grouped by student).
+        bounds = (start if start is not None else MIN_DATE, end if end is not None else MAX_DATE)
+        if cluster_id is None:
+            sql = (LOG_SELECT + ' WHERE date >= ? AND date <= ? AND (date, log_id) > (?, ?)'
+                   ' ORDER BY date, log_id LIMIT ?')
+            last = (MIN_DATE, 0)
+        else:
+            sql = ('SELECT ' + ', '.join('l.' + column for column in LOG_COLUMNS) +
+                   ' FROM students s JOIN study_logs l ON l.student_id = s.student_id'
+                   ' WHERE s.cluster_id = ? AND l.date >= ? AND l.date <= ?'
+                   ' AND (s.student_id, l.date, l.log_id) > (?, ?, ?)'
+                   ' ORDER BY s.student_id, l.date, l.log_id LIMIT ?')
+            bounds = (cluster_id,) + bounds
+            last = ('', MIN_DATE, 0)
+        while True:
+            rows = self._log_rows(self._connection().execute(sql, bounds + last + (chunk_size,)))
+            if not rows:
+                return
+            yield rows
+            if cluster_id is None:
+                last = (rows[-1]['date'], rows[-1]['log_id'])
+            else:
+                last = (rows[-1]['student_id'], rows[-1]['date'], rows[-1]['log_id'])
+
+    # Derived state
+
+    def student_version(self, student_id):
+        row = self._connection().execute(
+            'SELECT s.cluster_id, COALESCE(a.sessions, 0) FROM students s'
+            ' LEFT JOIN student_aggregates a ON a.student_id = s.student_id WHERE s.student_id = ?',
+            (student_id,)).fetchone()
+        return tuple(row) if row else (None, 0)
+
+    def student_aggregates(self, student_id):
+        row = self._connection().execute(
+            AGGREGATES_SELECT + ' WHERE a.student_id = ?', (student_id,)).fetchone()
+        return _aggregates_from_row(row) if row else None
+
+    def student_streak(self, student_id, today):
+        conn = self._connection()
+        row = conn.execute('SELECT start, end FROM student_runs WHERE student_id = ? AND start <= ?'
+                           ' ORDER BY start DESC LIMIT 1', (student_id, today)).fetchone()
+        current = today - row[0] + 1 if row is not None and row[1] >= today else 0
+        longest = conn.execute('SELECT longest FROM student_streaks WHERE student_id = ?',
+                               (student_id,)).fetchone()
+        return current, longest[0] if longest else 0
+
+    def cluster_daily_rollups(self, start=None, end=None):
+        rows = self._connection().execute(
+            'SELECT cluster_id, day, ' + ', '.join(ROLLUP_FIELDS) + ' FROM cluster_daily'
+            ' WHERE day >= ? AND day <= ?',
+            (start if start is not None else 0, end if end is not None else MAX_DAY)).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 2 + len(ROLLUP_FIELDS))
+        return table[:, 0].astype(np.int64), table[:, 1].astype(np.int64), table[:, 2:]
+
+    def student_daily_rollups(self, student_id, start=None, end=None):
+        rows = self._connection().execute(
+            'SELECT day, ' + ', '.join(STUDENT_ROLLUP_FIELDS) + ' FROM student_daily'
+            ' WHERE student_id = ? AND day >= ? AND day <= ? ORDER BY day',
+            (student_id, start if start is not None else 0, end if end is not None else MAX_DAY)).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 1 + len(STUDENT_ROLLUP_FIELDS))
+        return table[:, 0].astype(np.int64), table[:, 1:]
+
+    def rebuild_cluster_rollups(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cluster_daily')
+            conn.execute(ROLLUP_BACKFILL_CLUSTERS)
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'version'")
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def iter_aggregates(self, min_sessions, chunk_size):
+        # Keyset pagination: each page is read in full before the caller writes
+        last = ''
+        while True:
+            rows = self._connection().execute(
+                AGGREGATES_SELECT + ' JOIN students s ON s.student_id = a.student_id'
+                ' WHERE a.sessions >= ? AND a.student_id > ? ORDER BY a.student_id LIMIT ?',
+                (min_sessions, last, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield [(row[0], _aggregates_from_row(row)) for row in rows]
+            last = rows[-1][0]
+
+    def iter_students(self, cluster_id=None, chunk_size=1000):
+        last = ''
+        where = ' WHERE s.student_id > ?' if cluster_id is None else ' WHERE s.cluster_id = ? AND s.student_id > ?'
+        while True:
+            params = (last, chunk_size) if cluster_id is None else (cluster_id, last, chunk_size)
+            rows = self._connection().execute(
+                STUDENT_EXPORT_SELECT + where + ' ORDER BY s.student_id LIMIT ?', params).fetchall()
+            if not rows:
+                return
+            yield [(row[0], dict(zip(('name', 'email', 'cluster_id', 'created_at'), row[1:5])),
+                    _aggregates_from_row(row[5:]) if row[5] is not None else None)
+                   for row in rows]
+            last = rows[-1][0]
+
+    def analytics_counters(self):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            counters = dict(conn.execute('SELECT name, value FROM counters'))
+            cluster_counts = dict(conn.execute('SELECT cluster_id, count FROM cluster_counts'))
+        finally:
+            conn.execute('COMMIT')
+        return {
+            'version': int(counters['version']),
+            'total_students': int(counters['total_students']),
+            'total_logs': int(counters['total_logs']),
+            'active_students': int(counters['active_students']),
+            'hours_sum': counters['hours_sum'],
+            'cluster_counts': cluster_counts
+        }
+
+    def close(self):
+        self._writer.close()
+        self.release_connection()
+        with self._connections_lock:
+            self._closed = True
+            connections, self._connections, self._idle = self._connections, set(), []
+        for conn in connections:
+            conn.close()
+
+
+def create_storage(backend, database_path=None):
+    """Build the storage backend named in the app config ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(database_path)
+    raise ValueError(f'Unknown storage backend: {backend}')
@@ -0,0 +1,61 @@
+"""
+Make the app's modules importable by bare name, as they import each other,
+and start the app from a scratch copy of the files shipped with it
+"""
+
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(APP_DIR)
+sys.path.insert(0, APP_DIR)
+
+# The committed model pickles and sample data, relative to the repository root
+SHIPPED_FILES = ('models/kmeans_model.pkl', 'models/scaler.pkl', 'data/sample_student_data.csv')
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Import a fresh copy of app.py in tmp_path, as if started from a new checkout
+
+    make_app(backend='memory', **config) returns the module; config items
+    override app.config after import.
+    """
+    modules = []
+
+    def make(backend='memory', **config):
+        for name in SHIPPED_FILES:
+            os.makedirs(tmp_path / os.path.dirname(name), exist_ok=True)
+            shutil.copy2(os.path.join(REPO_DIR, name), tmp_path / name)
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('STORAGE_BACKEND', backend)
+        monkeypatch.setenv('SECRET_KEY', 'test')
+        monkeypatch.delenv('ONLINE_LEARNING', raising=False)
+        sys.modules.pop('app', None)
+        module = importlib.import_module('app')
+        module.app.config.update(TESTING=True, **config)
+        modules.append(module)
+        return module
+
+    yield make
+    for module in modules:
+        module.storage.close()
+    sys.modules.pop('app', None)
+
+
+def student_client(module, email='student@example.com', name='Student'):
+    client = module.app.test_client()
+    response = client.post('/student/login', json={'email': email, 'name': name})
+    assert response.status_code == 200
+    return client
+
+
+def admin_client(module):
+    client = module.app.test_client()
+    response = client.post('/admin/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
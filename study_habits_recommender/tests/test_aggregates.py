@@ -0,0 +1,101 @@
+"""
+StreakTracker: runs of study days built from inserts in any order
+"""
+
+import random
+from datetime import date
+
+import pytest
+
+from aggregates import StreakTracker
+from storage import MemoryStorage, SQLiteStorage
+
+
+def tracker(days):
+    streak = StreakTracker()
+    for day in days:
+        streak.add(day)
+    return streak
+
+
+def runs(streak):
+    return list(zip(streak.starts, streak.ends))
+
+
+def test_in_order_days_make_one_run():
+    streak = tracker([10, 11, 12])
+    assert runs(streak) == [(10, 12)]
+    assert streak.longest == 3
+    assert streak.current(12) == 3
+
+
+def test_gaps_split_runs():
+    streak = tracker([1, 2, 4, 7, 8, 9])
+    assert runs(streak) == [(1, 2), (4, 4), (7, 9)]
+    assert streak.longest == 3
+    assert streak.current(4) == 1
+    assert streak.current(5) == 0  # no log on the day itself
+    assert streak.current(3) == 0
+
+
+def test_out_of_order_inserts_match_sorted_inserts():
+    days = [3, 4, 5, 9, 10, 12, 13, 14, 15, 20]
+    shuffled = days[:]
+    random.Random(7).shuffle(shuffled)
+    assert runs(tracker(shuffled)) == runs(tracker(days)) == [(3, 5), (9, 10), (12, 15), (20, 20)]
+    assert tracker(shuffled).longest == 4
+
+
+def test_back_dated_day_merges_two_runs():
+    streak = tracker([1, 2, 4, 5, 6])
+    assert streak.longest == 3
+    streak.add(3)
+    assert runs(streak) == [(1, 6)]
+    assert streak.longest == 6
+    assert streak.current(6) == 6
+
+
+def test_day_extends_a_run_on_either_side():
+    streak = tracker([5, 6])
+    streak.add(4)
+    streak.add(7)
+    assert runs(streak) == [(4, 7)]
+    assert streak.longest == 4
+
+
+def test_duplicate_days_change_nothing():
+    streak = tracker([1, 2, 3, 2, 1, 3, 3])
+    assert runs(streak) == [(1, 3)]
+    assert streak.longest == 3
+    streak.add(None)  # logs with an unparseable date
+    assert runs(streak) == [(1, 3)]
+
+
+def test_empty_tracker():
+    streak = StreakTracker()
+    assert streak.current(100) == 0
+    assert streak.longest == 0
+
+
+def test_future_dated_run_counts_up_to_today():
+    # Logs for today and the next two days; the streak is the days up to today
+    streak = tracker([10, 11, 12, 13])
+    assert streak.current(11) == 2
+    assert streak.longest == 4
+    # A run entirely in the future gives no current streak
+    assert tracker([15, 16]).current(11) == 0
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_storage_streaks_match_tracker(backend, tmp_path):
+    # SQLiteStorage keeps the same runs in its student_runs table
+    storage = MemoryStorage() if backend == 'memory' else SQLiteStorage(str(tmp_path / 'streaks.db'))
+    days = [738000 + d for d in (3, 4, 5, 9, 10, 12, 13, 14, 15, 20, 11, 4, 30, 31)]
+    random.Random(3).shuffle(days)
+    storage.add_logs([{'student_id': 'S', 'date': date.fromordinal(day).isoformat(), 'study_hours': 1.0,
+                       'subject': 'Math', 'study_time': 'Morning', 'method_used': 'Pomodoro',
+                       'distractions': 'Low', 'quiz_score': None} for day in days])
+    expected = tracker(days)
+    for today in range(738000, 738035):
+        assert storage.student_streak('S', today) == (expected.current(today), expected.longest)
+    storage.close()
@@ -0,0 +1,119 @@
+"""
+/api/bulk-log-study and validate_log_batch: ownership, validation and the NDJSON body
+"""
+
+import json
+
+import pytest
+
+from conftest import admin_client, student_client
+from ingest import validate_log_batch
+
+ME = 'student@example.com'
+
+
+def entry(**fields):
+    return dict({'date': '2024-03-01', 'study_hours': 2.0, 'subject': 'Math', 'study_time': 'Morning',
+                 'method_used': 'Pomodoro', 'distractions': 'Low', 'quiz_score': 75}, **fields)
+
+
+def ndjson(records):
+    return '\n'.join(json.dumps(record) for record in records) + '\n'
+
+
+def post(client, records):
+    return client.post('/api/bulk-log-study', json=records)
+
+
+def test_student_cannot_import_for_someone_else(make_app):
+    module = make_app()
+    client = student_client(module)
+    response = post(client, [entry(), entry(student_id='other@example.com')])
+    assert response.status_code == 403
+    assert module.storage.analytics_counters()['total_logs'] == 0
+
+    # Their own id, or none at all, is fine
+    response = post(client, [entry(student_id=ME), entry(student_id=''), entry()])
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 3
+    assert module.storage.student_aggregates(ME).sessions == 3
+
+
+def test_admin_imports_for_many_students(make_app):
+    module = make_app()
+    response = post(admin_client(module), [entry(student_id=f'S{i % 3}', date=f'2024-03-0{i + 1}')
+                                           for i in range(6)])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['inserted'], body['students'], body['students_reclustered']) == (6, 3, 0)
+    assert module.storage.get_student('S1')['name'] == 'S1'
+    assert post(admin_client(module), [entry()]).get_json()['errors'][0]['message'] == 'Missing student_id'
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'date': '2024-02-30'}, 'Invalid date'),
+    ({'date': '2024-3-1'}, 'Invalid date'),
+    ({'date': '1969-12-31'}, 'Invalid date'),
+    ({'date': '2100-01-01'}, 'Invalid date'),
+    ({'date': 'tomorrow'}, 'Invalid date'),
+    ({'study_hours': 25}, 'study_hours must be a number between 0 and 24'),
+    ({'study_hours': -1}, 'study_hours must be a number between 0 and 24'),
+    ({'study_hours': 'lots'}, 'study_hours must be a number between 0 and 24'),
+    ({'quiz_score': 101}, 'quiz_score must be a number between 0 and 100'),
+    ({'quiz_score': 'A+'}, 'quiz_score must be a number between 0 and 100'),
+])
+def test_invalid_records_are_rejected_individually(make_app, fields, message):
+    module = make_app()
+    response = post(student_client(module), [entry(), entry(**fields), entry(date='2024-03-02')])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['inserted'], body['rejected']) == (2, 1)
+    assert body['errors'][0]['index'] == 1
+    assert body['errors'][0]['message'].startswith(message)
+    assert module.storage.student_aggregates(ME).sessions == 2
+
+
+def test_ndjson_body(make_app):
+    module = make_app()
+    client = student_client(module)
+    records = [entry(date=f'2024-03-0{day}', quiz_score=None) for day in range(1, 5)]
+    body = ndjson(records[:2]) + '\n' + ndjson(records[2:] + [entry(study_hours=30)])
+    response = client.post('/api/bulk-log-study', data=body, content_type='application/x-ndjson')
+    result = response.get_json()
+    assert response.status_code == 200
+    assert (result['inserted'], result['rejected'], result['students_reclustered']) == (4, 1, 1)
+    assert result['errors'] == [{'index': 4, 'message': 'study_hours must be a number between 0 and 24'}]
+    assert module.storage.get_student(ME)['cluster_id'] is not None
+
+    response = client.post('/api/bulk-log-study', data=ndjson(records[:1]) + '{"date": \n',
+                           content_type='application/jsonl')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid JSON on line 2'
+    # A bad line rejects the whole body
+    assert module.storage.student_aggregates(ME).sessions == 4
+
+
+def test_body_must_be_a_list_of_objects(make_app):
+    client = student_client(make_app())
+    assert client.post('/api/bulk-log-study', json={'logs': [entry()]}).status_code == 200
+    for body in ({'date': '2024-03-01'}, [1, 2], 'text'):
+        assert client.post('/api/bulk-log-study', json=body).status_code == 400
+    assert client.post('/api/bulk-log-study', data='not json', content_type='text/plain').status_code == 400
+
+
+def test_requires_login(make_app):
+    assert post(make_app().app.test_client(), [entry()]).status_code == 401
+
+
+def test_validate_log_batch_applies_log_study_defaults():
+    entries, errors = validate_log_batch(
+        [{'student_id': ' S1 ', 'study_hours': '1.5', 'quiz_score': 0},
+         {'student_id': 'S2', 'date': '2024-03-01', 'quiz_score': '88'}], '2024-06-01')
+    assert errors == []
+    assert entries == [
+        {'student_id': 'S1', 'date': '2024-06-01', 'study_hours': 1.5, 'subject': '', 'study_time': '',
+         'method_used': '', 'distractions': 'None', 'quiz_score': None},
+        {'student_id': 'S2', 'date': '2024-03-01', 'study_hours': 0.0, 'subject': '', 'study_time': '',
+         'method_used': '', 'distractions': 'None', 'quiz_score': 88},
+    ]
+    assert validate_log_batch([], '2024-06-01') == ([], [])
@@ -0,0 +1,38 @@
+"""
+/api/clustering-insights on a fresh checkout (shipped model, no retrain)
+"""
+
+import pandas as pd
+
+from conftest import SHIPPED_FILES
+
+
+def test_insights_from_shipped_model(make_app):
+    module = make_app()
+    client = module.app.test_client()
+
+    response = client.get('/api/clustering-insights')
+    assert response.status_code == 200
+    data = response.get_json()
+
+    rows = len(pd.read_csv(SHIPPED_FILES[2]))
+    assert data['total_students'] == rows == 1248
+    assert 0 <= data['data_quality'] <= 100
+    assert -1 <= data['silhouette'] <= 1
+    clusters = data['clusters']
+    assert [cluster['cluster_id'] for cluster in clusters] == list(range(module.model_registry.get().kmeans.n_clusters))
+    assert sum(cluster['size'] for cluster in clusters) == rows
+    assert all(cluster['name'] for cluster in clusters)
+    assert all(set(cluster['centroid']) == {'study_hours', 'quiz_score', 'distraction_encoded', 'time_encoded'}
+               for cluster in clusters)
+
+
+def test_insights_are_computed_once_and_cached(make_app):
+    module = make_app()
+    client = module.app.test_client()
+
+    first = client.get('/api/clustering-insights')
+    insights = module.live_insights['insights']
+    again = client.get('/api/clustering-insights', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert module.live_insights['insights'] is insights
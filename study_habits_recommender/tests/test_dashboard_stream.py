@@ -0,0 +1,100 @@
+"""
+/api/student-dashboard/stream: snapshot, pushed changes, heartbeat and the stream limit
+"""
+
+import json
+import socket
+
+from conftest import student_client
+from dashboard_events import client_disconnected
+
+
+def read_events(chunks, count):
+    """Parse the next count messages (events and comments) off a streamed response"""
+    messages = []
+    while len(messages) < count:
+        chunk = next(chunks).decode()
+        for block in chunk.split('\n\n'):
+            if not block:
+                continue
+            fields = {}
+            for line in block.split('\n'):
+                name, _, value = line.partition(':')
+                fields[name or 'comment'] = value.strip()
+            if 'data' in fields:
+                fields['data'] = json.loads(fields['data'])
+            messages.append(fields)
+    return messages
+
+
+def open_stream(client):
+    response = client.get('/api/student-dashboard/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return response, iter(response.response)
+
+
+def test_stream_sends_snapshot_then_changes(make_app):
+    module = make_app(DASHBOARD_STREAM_POLL_INTERVAL=0.05, DASHBOARD_STREAM_HEARTBEAT=60.0)
+    client = student_client(module)
+    response, chunks = open_stream(client)
+
+    retry, snapshot = read_events(chunks, 2)
+    assert retry['retry'] == '50'
+    assert snapshot['event'] == 'dashboard'
+    assert snapshot['data']['stats']['total_sessions'] == 0
+
+    client.post('/api/log-study', json={'date': '2024-03-01', 'study_hours': 2.5, 'quiz_score': 80})
+    (update,) = read_events(chunks, 1)
+    assert update['event'] == 'stats'
+    assert update['data']['total_sessions'] == 1
+    assert update['data']['total_hours'] == 2.5
+    response.close()
+
+
+def test_idle_stream_sends_heartbeats(make_app):
+    module = make_app(DASHBOARD_STREAM_POLL_INTERVAL=0.01, DASHBOARD_STREAM_HEARTBEAT=0.02)
+    response, chunks = open_stream(student_client(module))
+    read_events(chunks, 2)
+    (heartbeat,) = read_events(chunks, 1)
+    assert heartbeat == {'comment': 'keep-alive'}
+    response.close()
+
+
+def test_stream_limit_and_release_on_close(make_app):
+    module = make_app()
+    module.dashboard_streams.limit = 1
+    client = student_client(module)
+
+    first, chunks = open_stream(client)
+    read_events(chunks, 2)
+    refused = client.get('/api/student-dashboard/stream', buffered=False)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+    assert module.dashboard_streams.rejected == 1
+
+    # What the server does when a heartbeat write finds the client gone
+    first.close()
+    assert module.dashboard_streams.active == 0
+
+    # A stream closed before it sent anything gives its slot back too
+    second = client.get('/api/student-dashboard/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
+    assert module.dashboard_streams.active == 0
+
+
+def test_stream_requires_login(make_app):
+    module = make_app()
+    assert module.app.test_client().get('/api/student-dashboard/stream').status_code == 401
+
+
+def test_client_disconnected_sees_a_closed_peer():
+    server, client = socket.socketpair()
+    try:
+        assert not client_disconnected(server)
+        client.close()
+        assert client_disconnected(server)
+    finally:
+        server.close()
+    assert not client_disconnected(None)
@@ -0,0 +1,117 @@
+"""
+/api/admin/export: streamed, gzip-compressed exports match what storage holds, on each backend
+"""
+
+import csv
+import gzip
+import io
+import json
+import random
+import zlib
+
+import pytest
+
+from conftest import admin_client
+from exports import STUDENT_EXPORT_FIELDS, gzip_chunks
+from storage import LOG_COLUMNS
+
+STUDENTS = ['S1', 'S2', 'S3', 'S4']
+
+
+def imported_logs():
+    """Logs for several students, posted in scrambled date order"""
+    rng = random.Random(11)
+    logs = []
+    for i in range(60):
+        logs.append({'student_id': STUDENTS[i % 4], 'date': f'2024-03-{rng.randrange(1, 29):02d}',
+                     'study_hours': round(rng.uniform(0.5, 6), 2), 'subject': rng.choice(['Math', 'Physics, "A"']),
+                     'study_time': rng.choice(['Morning', 'Night']), 'method_used': 'Pomodoro',
+                     'distractions': rng.choice(['Low', 'High']), 'quiz_score': rng.choice([None, 55, 90])})
+    return logs
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def exporting_app(request, make_app):
+    # A small chunk size so every export spans many storage reads and response chunks
+    module = make_app(request.param, EXPORT_CHUNK_SIZE=7)
+    client = admin_client(module)
+    logs = imported_logs()
+    assert client.post('/api/bulk-log-study', json=logs).get_json()['inserted'] == len(logs)
+    return module, client, logs
+
+
+def download(client, url):
+    """Stream an export and return the decompressed text"""
+    response = client.get(url, buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.gz"')
+    body = b''.join(response.response)
+    response.close()
+    return gzip.decompress(body).decode()
+
+
+def stored_logs(module, **filters):
+    return [dict(log) for chunk in module.storage.iter_logs(**filters) for log in chunk]
+
+
+def expected_logs(logs, start=None, end=None):
+    """What storage should hold: log_ids in posting order, then sorted by date (stable)"""
+    rows = [dict(log, log_id=log_id) for log_id, log in enumerate(logs, 1)
+            if (start is None or log['date'] >= start) and (end is None or log['date'] <= end)]
+    return sorted(rows, key=lambda row: row['date'])
+
+
+def as_csv_rows(records, fields):
+    return [{field: '' if record[field] is None else str(record[field]) for field in fields} for record in records]
+
+
+def test_gzip_csv_log_export_matches_storage(exporting_app):
+    module, client, logs = exporting_app
+    text = download(client, '/api/admin/export/logs?format=csv&gzip=1')
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert text.splitlines()[0] == ','.join(LOG_COLUMNS)
+    assert rows == as_csv_rows(stored_logs(module), LOG_COLUMNS)
+    assert rows == as_csv_rows(expected_logs(logs), LOG_COLUMNS)
+
+
+def test_gzip_ndjson_log_export_matches_storage(exporting_app):
+    module, client, logs = exporting_app
+    text = download(client, '/api/admin/export/logs?format=ndjson&gzip=1&start=2024-03-05&end=2024-03-20')
+    records = [json.loads(line) for line in text.splitlines()]
+    assert records == stored_logs(module, start='2024-03-05', end='2024-03-20')
+    assert records == expected_logs(logs, '2024-03-05', '2024-03-20')
+
+
+def test_gzip_student_export_matches_storage(exporting_app):
+    module, client, logs = exporting_app
+    records = [json.loads(line) for line in download(client, '/api/admin/export/students?format=ndjson&gzip=1')
+               .splitlines()]
+    assert [record['student_id'] for record in records] == STUDENTS
+    for record in records:
+        stats = module.storage.student_aggregates(record['student_id'])
+        mine = [log for log in logs if log['student_id'] == record['student_id']]
+        assert record['sessions'] == stats.sessions == len(mine)
+        assert record['total_hours'] == round(sum(log['study_hours'] for log in mine), 2)
+        assert record['cluster_id'] == module.storage.get_student(record['student_id'])['cluster_id']
+        assert set(record) == set(STUDENT_EXPORT_FIELDS)
+
+
+def test_cluster_filtered_export(exporting_app):
+    module, client, _ = exporting_app
+    cluster_id = module.storage.get_student('S2')['cluster_id']
+    members = {student for student in STUDENTS if module.storage.get_student(student)['cluster_id'] == cluster_id}
+    text = download(client, f'/api/admin/export/logs?format=ndjson&gzip=1&cluster_id={cluster_id}')
+    records = [json.loads(line) for line in text.splitlines()]
+    assert {record['student_id'] for record in records} == members
+    assert records == stored_logs(module, cluster_id=cluster_id)
+
+
+def test_gzip_chunks_is_one_valid_member():
+    pieces = [b'a' * 1000, b'', b'b,c\n' * 500]
+    compressed = b''.join(gzip_chunks(iter(pieces)))
+    assert gzip.decompress(compressed) == b''.join(pieces)
+    decompressor = zlib.decompressobj(31)
+    decompressor.decompress(compressed)
+    assert decompressor.eof and not decompressor.unused_data
@@ -0,0 +1,73 @@
+"""
+Behaviour CSV ingestion: chunked validation and the admin upload route
+"""
+
+import io
+import os
+
+import pytest
+
+from conftest import admin_client
+from ingest import CHUNK_SIZE, ingest_csv
+
+HEADER = b'study_hours,quiz_score,distraction_frequency,preferred_time\n'
+GOOD_ROW = b'2.5,80,Low,Morning\n'
+
+
+def csv_with(bad_line, rows_before=250, rows_after=50):
+    """A CSV whose first chunks are fine and whose bad line sits deep in the file"""
+    return HEADER + GOOD_ROW * rows_before + bad_line + GOOD_ROW * rows_after
+
+
+@pytest.mark.parametrize('bad_line, message', [
+    (b'1,2,3,4,5,6\n', 'Malformed CSV: Expected 4 fields in line 252, saw 6'),
+    (b'2.5,"80,Low,Morning\n', 'Malformed CSV: EOF inside string'),
+    (b'2.5,80,L\xffw,Morning\n', 'The CSV file is not valid UTF-8 text'),
+])
+def test_bad_chunk_mid_file_keeps_existing_data(tmp_path, bad_line, message):
+    dest = tmp_path / 'data.csv'
+    dest.write_bytes(b'existing')
+    with pytest.raises(ValueError, match=message):
+        ingest_csv(io.BytesIO(csv_with(bad_line)), str(dest), chunksize=100)
+    assert dest.read_bytes() == b'existing'
+    assert os.listdir(tmp_path) == ['data.csv']
+
+
+def test_invalid_rows_are_dropped_and_counted(tmp_path):
+    dest = tmp_path / 'data.csv'
+    summary = ingest_csv(io.BytesIO(csv_with(b'30,80,Low,Morning\n2,80,Sometimes,Morning\n')), str(dest),
+                         chunksize=100)
+    assert summary == {'rows': 300, 'rejected': 2}
+    assert dest.read_bytes().splitlines()[1] == b'2.5,80,Low,Morning'
+
+
+def upload(client, content, filename='data.csv'):
+    return client.post('/api/admin/upload-data', data={'file': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('bad_line', [b'1,2,3,4,5,6\n', b'2.5,80,L\xffw,Morning\n'])
+def test_upload_with_bad_chunk_is_400(make_app, bad_line):
+    module = make_app()
+    data_file = module.app.config['DATA_FILE']
+    with open(data_file, 'rb') as f:
+        before = f.read()
+
+    # Past the first CHUNK_SIZE rows, so the route has already written a chunk
+    response = upload(admin_client(module), csv_with(bad_line, rows_before=CHUNK_SIZE + 10))
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert 'CSV' in response.get_json()['message']
+    with open(data_file, 'rb') as f:
+        assert f.read() == before
+
+
+def test_upload_replaces_data_file(make_app):
+    module = make_app()
+    client = admin_client(module)
+    response = upload(client, csv_with(b'-1,80,Low,Morning\n'))
+    assert response.status_code == 200
+    assert response.get_json()['rows'] == 300
+    assert response.get_json()['rejected'] == 1
+    assert upload(client, HEADER, 'data.txt').status_code == 400
+    assert upload(module.app.test_client(), HEADER).status_code == 401
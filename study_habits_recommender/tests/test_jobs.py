@@ -0,0 +1,164 @@
+"""
+SingleFlightExecutor: coalescing, queueing behind a running job, failures and the on-disk handoff
+"""
+
+import threading
+import time
+
+from jobs import SingleFlightExecutor
+
+
+def wait_done(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        assert time.monotonic() < deadline, f'{job.name} still {job.status}'
+        time.sleep(0.005)
+    return job
+
+
+class GatedTask:
+    """Job function that blocks until released and records how runs overlap"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.lock = threading.Lock()
+        self.active = self.max_active = self.runs = 0
+
+    def __call__(self, job):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.runs += 1
+            run = self.runs
+        self.started.release()
+        self.release.wait(5)
+        with self.lock:
+            self.active -= 1
+        return {'run': run}
+
+
+def test_concurrent_submits_coalesce():
+    executor = SingleFlightExecutor()
+    task = GatedTask()
+    first = executor.submit('retrain', task)
+    assert task.started.acquire(timeout=5)
+
+    # A burst of submits from many threads while the first run is in flight
+    barrier = threading.Barrier(8)
+    submitted = []
+
+    def submit():
+        barrier.wait()
+        submitted.append(executor.submit('retrain', task))
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    queued = submitted[0]
+    assert all(job is queued for job in submitted)
+    assert queued is not first and queued.status == 'queued'
+
+    task.release.set()
+    assert wait_done(first).result == {'run': 1}
+    assert wait_done(queued).result == {'run': 2}
+    assert task.runs == 2
+
+
+def test_submit_while_running_waits_for_the_running_job():
+    executor = SingleFlightExecutor()
+    task = GatedTask()
+    first = executor.submit('retrain', task)
+    assert task.started.acquire(timeout=5)
+    assert first.status == 'running'
+
+    second = executor.submit('retrain', task)
+    assert second.status == 'queued'
+    time.sleep(0.05)
+    assert task.runs == 1  # not started alongside the first
+
+    task.release.set()
+    wait_done(second)
+    assert task.max_active == 1
+    assert first.finished_at <= second.started_at
+
+
+def test_different_names_run_side_by_side():
+    executor = SingleFlightExecutor()
+    task = GatedTask()
+    jobs = [executor.submit('retrain', task), executor.submit('select-model', task)]
+    assert task.started.acquire(timeout=5) and task.started.acquire(timeout=5)
+    assert task.max_active == 2
+    task.release.set()
+    for job in jobs:
+        wait_done(job)
+
+
+def test_failed_job_frees_its_name():
+    executor = SingleFlightExecutor()
+    task = GatedTask()
+    release_failure = threading.Event()
+
+    def broken(job):
+        job.set_progress(0.5, 'Halfway')
+        release_failure.wait(5)
+        raise RuntimeError('model file missing')
+
+    failed = executor.submit('retrain', broken)
+    queued = executor.submit('retrain', task)
+    release_failure.set()
+    wait_done(failed)
+    assert failed.status == 'failed'
+    assert failed.error == 'model file missing'
+    assert failed.progress == 0.5 and failed.message == 'Failed'
+
+    # The job queued behind the failure still runs, and the name accepts new work
+    task.release.set()
+    assert wait_done(queued).status == 'succeeded'
+    assert wait_done(executor.submit('retrain', task)).result == {'run': 2}
+
+
+def test_status_is_handed_off_through_state_dir(tmp_path):
+    state_dir = str(tmp_path / 'jobs')
+    owner = SingleFlightExecutor(state_dir=state_dir)
+    # Another worker process: same directory, its own (empty) memory
+    other = SingleFlightExecutor(state_dir=state_dir)
+    progressed = threading.Event()
+    finish = threading.Event()
+
+    def fn(job):
+        job.set_progress(0.4, 'Fitting K-Means')
+        progressed.set()
+        finish.wait(5)
+        return {'clusters': 4}
+
+    job = owner.submit('retrain', fn)
+    assert progressed.wait(5)
+    seen = other.get(job.job_id)
+    assert (seen.status, seen.progress, seen.message) == ('running', 0.4, 'Fitting K-Means')
+    assert seen is not job
+
+    finish.set()
+    # The record is written once more after the status changes, in the job's own thread
+    wait_done(job)
+    deadline = time.monotonic() + 5
+    while not other.get(job.job_id).finished_at:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    seen = other.get(job.job_id)
+    assert seen.to_dict() == job.to_dict()
+    assert seen.result == {'clusters': 4} and seen.done
+
+    assert other.get('0' * 32) is None
+    assert other.get('../jobs') is None
+
+
+def test_history_is_trimmed_on_disk(tmp_path):
+    state_dir = tmp_path / 'jobs'
+    executor = SingleFlightExecutor(history_size=2, state_dir=str(state_dir))
+    jobs = [wait_done(executor.submit('retrain', lambda job: None)) for _ in range(4)]
+    assert sorted(path.name for path in state_dir.iterdir()) == sorted(
+        f'{job.job_id}.json' for job in jobs[-2:])
+    assert executor.get(jobs[0].job_id) is None
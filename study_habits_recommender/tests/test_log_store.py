@@ -0,0 +1,110 @@
+"""
+LogStore columns and date indexes
+"""
+
+import random
+from datetime import date
+
+import pytest
+
+from log_store import NO_SCORE, CategoricalColumn, LogStore
+
+
+def entry(log_id, student_id='S1', date='2024-01-01', hours=1.0, score=None):
+    return {'log_id': log_id, 'student_id': student_id, 'date': date, 'study_hours': hours,
+            'subject': 'Math', 'study_time': 'Morning', 'method_used': 'Pomodoro',
+            'distractions': 'Low', 'quiz_score': score}
+
+
+def ids(logs):
+    return [log['log_id'] for log in logs]
+
+
+@pytest.mark.parametrize('distinct, typecode', [(256, 'B'), (257, 'H'), (65536, 'H'), (65537, 'I')])
+def test_categorical_codes_widen(distinct, typecode):
+    column = CategoricalColumn()
+    for i in range(distinct):
+        column.append(f'value-{i}')
+    column.append('value-0')
+    assert column.codes.typecode == typecode
+    assert column[0] == column[distinct] == 'value-0'
+    assert column[distinct - 1] == f'value-{distinct - 1}'
+    assert len(column.codes) == distinct + 1
+
+
+def test_store_reads_back_after_widening():
+    store = LogStore()
+    for i in range(300):
+        store.append(entry(i + 1, student_id=f'S{i}'))
+    assert store.categories['student_id'].codes.typecode == 'H'
+    assert store.field(0, 'student_id') == 'S0'
+    assert store.field(299, 'student_id') == 'S299'
+    assert ids(store.between('S255')) == [256]
+
+
+def test_quiz_scores_round_trip():
+    store = LogStore()
+    scores = [None, 0, 95, -5, NO_SCORE, 2 ** 31, 'n/a', 7.5]
+    for i, score in enumerate(scores):
+        store.append(entry(i + 1, score=score))
+    # NO_SCORE itself and values outside int32 are kept verbatim in the side table
+    assert [log['quiz_score'] for log in store] == scores
+    assert store.quiz_scores[0] == NO_SCORE
+    assert dict(store.between('S1')[2]) == entry(3, score=95)
+
+
+def test_odd_dates_read_back_and_sort_first():
+    store = LogStore()
+    store.append(entry(1, date='2024-01-02'))
+    store.append(entry(2, date='20240101'))
+    store.append(entry(3, date='yesterday'))
+    assert [log['date'] for log in store.between('S1')] == ['20240101', 'yesterday', '2024-01-02']
+    # Only real dates take part in range queries with a start
+    assert ids(store.between('S1', '2024-01-01')) == [1]
+
+
+def test_back_dated_logs_are_kept_in_date_order():
+    store = LogStore()
+    for log_id, day in enumerate(['2024-01-05', '2024-01-03', '2024-01-05', '2024-01-01', '2024-01-03'], 1):
+        store.append(entry(log_id, date=day))
+    # Date order, then insertion order within a date
+    assert ids(store.between('S1')) == [4, 2, 5, 1, 3]
+    assert ids(store.between('S1', '2024-01-02', '2024-01-04')) == [2, 5]
+    assert store.day_count('S1', date(2024, 1, 3).toordinal()) == 2
+    assert store.day_count('S1', date(2024, 1, 2).toordinal()) == 0
+    assert ids(store.latest('S1', 2)) == [1, 3]
+    assert ids(log for chunk in store.iter_range(chunk_size=2) for log in chunk) == [4, 2, 5, 1, 3]
+
+
+def test_recent_is_newest_first_across_students():
+    store = LogStore()
+    store.append(entry(1, 'S1', '2024-01-03'))
+    store.append(entry(2, 'S2', '2024-01-01'))
+    store.append(entry(3, 'S2', '2024-01-04'))
+    store.append(entry(4, 'S1', '2024-01-03'))
+    assert ids(store.recent(3)) == [3, 4, 1]
+    assert ids(store.recent(10)) == [3, 4, 1, 2]
+    assert store.recent(0) == []
+
+
+def test_extend_matches_append():
+    rng = random.Random(5)
+    first = [entry(i, f'S{rng.randrange(4)}', f'2024-01-{rng.randrange(1, 29):02d}') for i in range(1, 201)]
+    batch = [entry(i, f'S{rng.randrange(6)}', f'2024-01-{rng.randrange(1, 29):02d}') for i in range(201, 401)]
+    batch[10]['date'] = 'not a date'
+
+    appended, extended = LogStore(), LogStore()
+    for log in first + batch:
+        appended.append(log)
+    extended.extend(first[:150])
+    for log in first[150:]:
+        extended.append(log)
+    extended.extend(batch)
+    extended.extend([])
+
+    assert list(extended._all_rows) == list(appended._all_rows)
+    assert list(extended._all_dates) == list(appended._all_dates)
+    for student in ('S0', 'S3', 'S5'):
+        assert ids(extended.between(student)) == ids(appended.between(student))
+    assert ids(extended.recent(50)) == ids(appended.recent(50))
+    assert [dict(log) for log in extended] == [dict(log) for log in appended]
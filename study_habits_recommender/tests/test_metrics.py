@@ -0,0 +1,95 @@
+"""
+/api/admin/metrics: access control and the Prometheus text exposition format
+"""
+
+import re
+
+from conftest import admin_client
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """{family: {'help', 'type', 'samples': [(name, labels, value)]}}; asserts every line is well formed"""
+    assert text.endswith('\n')
+    families = {}
+    family = current = None
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            family, _, help_text = line[7:].partition(' ')
+            assert family not in families, f'{family} declared twice'
+            current = families[family] = {'help': help_text, 'type': None, 'samples': []}
+        elif line.startswith('# TYPE '):
+            name, _, kind = line[7:].partition(' ')
+            assert name == family and kind in ('counter', 'gauge', 'histogram', 'untyped')
+            current['type'] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f'malformed sample: {line!r}'
+            name, labels, value = match.group(1), dict(LABEL.findall(match.group(2) or '')), match.group(3)
+            assert name.startswith(family), f'{name} outside its family {family}'
+            current['samples'].append((name, labels, float(value)))
+    return families
+
+
+def samples(family, suffix=''):
+    return [(labels, value) for name, labels, value in family['samples'] if name.endswith(suffix)]
+
+
+def test_metrics_require_admin_or_token(make_app):
+    module = make_app(METRICS_TOKEN='scrape-me')
+    client = module.app.test_client()
+    assert client.get('/api/admin/metrics').status_code == 401
+    assert client.get('/api/admin/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/api/admin/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+
+
+def test_scrape_is_valid_exposition_format(make_app):
+    module = make_app()
+    client = admin_client(module)
+    for _ in range(3):
+        assert client.get('/').status_code == 200
+    client.get('/no-such-page')
+
+    families = parse(client.get('/api/admin/metrics').get_data(as_text=True))
+    assert all(family['type'] for family in families.values())
+    assert all(name.startswith('study_habits_') for name in families)
+
+    requests = families['study_habits_http_requests_total']
+    assert requests['type'] == 'counter'
+    totals = {(labels['endpoint'], labels['status']): value for labels, value in samples(requests)}
+    assert totals[('/', '200')] == 3
+    assert totals[('unmatched', '404')] == 1
+
+    latency = families['study_habits_http_request_duration_seconds']
+    assert latency['type'] == 'histogram'
+    index = [labels for labels, _ in samples(latency, '_count') if labels['endpoint'] == '/']
+    assert index == [{'endpoint': '/', 'method': 'GET', 'status': '200'}]
+    buckets = [(labels['le'], value) for labels, value in samples(latency, '_bucket')
+               if labels['endpoint'] == '/' and labels['status'] == '200']
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1] == ('+Inf', 3)
+    assert [value for labels, value in samples(latency, '_count') if labels['endpoint'] == '/'] == [3]
+
+    assert samples(families['study_habits_recommendation_cache_hits_total']) == [({}, 0)]
+    assert families['study_habits_dashboard_streams_open']['type'] == 'gauge'
+
+
+def test_unhandled_exceptions_are_counted(make_app):
+    module = make_app(PROPAGATE_EXCEPTIONS=False)
+
+    def broken():
+        raise RuntimeError('boom')
+    module.app.add_url_rule('/broken', 'broken', broken)
+
+    client = admin_client(module)
+    assert client.get('/broken').status_code == 500
+    families = parse(client.get('/api/admin/metrics').get_data(as_text=True))
+    assert samples(families['study_habits_http_request_exceptions_total']) == [
+        ({'endpoint': '/broken', 'exception': 'RuntimeError'}, 1)]
+    totals = samples(families['study_habits_http_requests_total'])
+    assert ({'endpoint': '/broken', 'method': 'GET', 'status': '500'}, 1) in totals
@@ -0,0 +1,69 @@
+"""
+Online k-means: time-based decay, derived profiles and insights, shutdown
+"""
+
+import numpy as np
+import pytest
+
+from online_clustering import OnlineClusterer
+from shared_model import load_centroids, streaming_update
+
+
+def centroids(module):
+    module._load_centroids()
+    return module.shared_centroids.path
+
+
+def test_decay_depends_on_time_not_batches(make_app):
+    path = centroids(make_app())
+    start = float(load_centroids(path)['updated_at'])
+    weights = np.array(load_centroids(path)['weights'])
+    row = [[3.0, 75.0, 1, 1]]
+    label = int(np.argmax(streaming_update(path, row, 100.0, now=start)['weights'] - weights))
+
+    # Any number of batches (from any number of workers) at the same moment: no decay
+    for _ in range(5):
+        streaming_update(path, row, 100.0, now=start)
+    assert load_centroids(path)['weights'][label] == pytest.approx(weights[label] + 6)
+
+    # One half-life later the old weight counts half
+    record = streaming_update(path, row, 100.0, now=start + 100.0)
+    assert record['weights'][label] == pytest.approx((weights[label] + 6) / 2 + 1)
+    others = np.arange(len(weights)) != label
+    assert record['weights'][others] == pytest.approx(weights[others] / 2)
+    assert record['updated_at'] == start + 100.0
+    assert record['updates'] == 7
+
+
+def test_update_refreshes_profiles_and_insights(make_app):
+    module = make_app()
+    client = module.app.test_client()
+    before = client.get('/api/clustering-insights')
+    profiles_version = module.cluster_profiles.version
+
+    # A burst of unusual students drags one center a long way
+    module.online_clusterer.apply([[11.5, 99.0, 0, 0]] * 2000)
+
+    assert module.cluster_profiles.version != profiles_version
+    record = load_centroids(module.shared_centroids.path)
+    raw = record['centers'] * record['scale'] + record['mean']
+    moved = int(np.argmax(raw[:, 0]))
+    assert module.cluster_profiles.get()[moved]['avg_study_duration'] == round(float(raw[moved, 0]), 1)
+
+    after = client.get('/api/clustering-insights', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    cluster = after.get_json()['clusters'][moved]
+    assert cluster['centroid']['study_hours'] == round(float(raw[moved, 0]), 3)
+
+
+def test_close_flushes_queue_and_is_idempotent(make_app):
+    path = centroids(make_app())
+    seen = []
+    learner = OnlineClusterer(path, path + '.lock', flush_interval=60.0, on_update=seen.append).start()
+    for student in range(3):
+        learner.submit(student, [2.0, 70.0, 1, 2])
+    learner.close()
+    learner.close()
+    assert learner.stats()['applied'] == 3
+    assert learner.batches == len(seen) == 1
+    assert int(seen[0]['updates']) == 1
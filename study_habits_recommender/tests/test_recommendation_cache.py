@@ -0,0 +1,43 @@
+"""
+Recommendation cache: size and counters in the metrics, kept across retrains that don't change the profiles
+"""
+
+from conftest import admin_client
+from jobs import Job
+from response_cache import LRUCache
+
+
+def test_stats_track_lookups_and_evictions():
+    cache = LRUCache(2)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'
+    assert cache.get('b', 2) is None  # stale token: a miss, and the entry goes
+    cache.put('c', 1, 'C')
+    cache.put('d', 1, 'D')
+    assert cache.stats() == {'size': 2, 'hits': 1, 'misses': 1, 'evictions': 1}
+
+
+def test_cache_metrics_are_scraped(make_app):
+    module = make_app()
+    module.recommendation_cache.put('S1', 'token', {})
+    module.recommendation_cache.get('S1', 'token')
+    body = admin_client(module).get('/api/admin/metrics').get_data(as_text=True)
+    assert 'study_habits_recommendation_cache_entries 1\n' in body
+    assert 'study_habits_recommendation_cache_hits_total 1\n' in body
+
+
+def test_retrain_clears_cache_only_when_profiles_change(make_app):
+    module = make_app()
+
+    # The shipped model has no generated profiles yet, so the first retrain changes them
+    module.recommendation_cache.put('S1', 'token', {})
+    module._retrain_job(Job('retrain-model'))
+    assert module.recommendation_cache.stats()['size'] == 0
+
+    # Same data, same seed: identical profiles, so cached payloads stay valid
+    version = module.cluster_profiles.version
+    module.recommendation_cache.put('S1', 'token', {})
+    module._retrain_job(Job('retrain-model'))
+    assert module.cluster_profiles.version == version
+    assert module.recommendation_cache.get('S1', 'token') == {}
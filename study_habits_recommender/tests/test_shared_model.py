@@ -0,0 +1,45 @@
+"""
+The NumPy nearest-centroid predictor must label rows exactly like scikit-learn
+"""
+
+import numpy as np
+import pytest
+
+from shared_model import SharedCentroids, export_centroids, label_agreement
+
+
+def assert_same_labels(path, kmeans, scaler, features):
+    expected = kmeans.predict(scaler.transform(features))
+    centroids = SharedCentroids(path)
+    assert centroids.predict(features).tolist() == expected.tolist()
+    assert [centroids.predict_one(row) for row in features.tolist()] == expected.tolist()
+    assert label_agreement(path, kmeans, scaler, features) == 1.0
+
+
+def test_shipped_model_matches_sklearn(make_app):
+    module = make_app()
+    snapshot = module.model_registry.get()
+    module._load_centroids()
+    features = np.asarray(module.feature_cache.load(), dtype=np.float64)
+    assert len(features) == 1248
+    assert_same_labels(module.shared_centroids.path, snapshot.kmeans, snapshot.scaler, features)
+
+
+@pytest.mark.parametrize('n_clusters', [2, 4, 7])
+def test_fresh_model_matches_sklearn(tmp_path, n_clusters):
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(n_clusters)
+    features = np.column_stack([
+        rng.uniform(0.5, 10, 3000), rng.integers(0, 101, 3000),
+        rng.integers(0, 3, 3000), rng.integers(0, 4, 3000)
+    ]).astype(np.float64)
+    scaler = StandardScaler().fit(features)
+    kmeans = KMeans(n_clusters=n_clusters, n_init=3, random_state=0).fit(scaler.transform(features))
+
+    path = str(tmp_path / 'centroids.npy')
+    export_centroids(kmeans, scaler, path)
+    # Unseen rows too, including ones far outside the training range
+    unseen = np.vstack([rng.uniform(0, 12, (500, 4)) * [1, 10, 0.25, 0.35], [[0, 0, 0, 0], [24, 100, 2, 3]]])
+    assert_same_labels(path, kmeans, scaler, np.vstack([features, unseen]))
@@ -0,0 +1,78 @@
+"""
+SQLiteStorage connection handling across many threads
+"""
+
+import os
+import threading
+
+import pytest
+
+from storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'threads.db'), pool_size=4)
+    storage.add_student('S1', {'name': 'A', 'email': 'a@example.com', 'cluster_id': None, 'created_at': 'x'})
+    yield storage
+    storage.close()
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def run_threads(target, count, concurrency=20):
+    for start in range(0, count, concurrency):
+        threads = [threading.Thread(target=target) for _ in range(min(concurrency, count - start))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def test_short_lived_threads_hand_connections_back(storage):
+    # Like request threads that exit without anything closing their connection
+    before = open_fds()
+    run_threads(lambda: storage.get_student('S1'), 2000)
+    assert len(storage._connections) <= storage.pool_size + 1
+    assert len(storage._idle) <= storage.pool_size
+    if os.path.isdir('/proc/self/fd'):
+        assert open_fds() - before < 40
+
+
+def test_released_connections_are_reused(storage):
+    def request():
+        assert storage.get_student('S1')['name'] == 'A'
+        storage.release_connection()
+
+    run_threads(request, 500, concurrency=3)
+    # Three threads at a time never need more than three connections (plus the fixture's)
+    assert len(storage._connections) <= 4
+    storage.release_connection()
+    storage.release_connection()  # releasing twice is harmless
+
+
+def test_release_rolls_back_an_open_transaction(storage):
+    conn = storage._connection()
+    conn.execute('BEGIN')
+    storage.release_connection()
+    assert not conn.in_transaction
+    assert storage._connection() is conn
+
+
+def test_close_closes_connections_still_checked_out(storage):
+    ready, done = threading.Event(), threading.Event()
+
+    def holder():
+        storage.get_student('S1')
+        ready.set()
+        done.wait()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    ready.wait()
+    storage.close()
+    assert not storage._connections
+    done.set()
+    thread.join()  # the exiting thread's connection is already closed; handing it back must not fail
@@ -0,0 +1,160 @@
+"""
+Known logs in, known aggregates, streaks, rollups and exports out, on each storage backend
+"""
+
+from datetime import date
+
+import pytest
+
+from exports import encode_records, log_records
+from rollups import ROLLUP_FIELDS, UNASSIGNED
+from storage import LOG_COLUMNS, MemoryStorage, SQLiteStorage
+
+
+def day(text):
+    return date.fromisoformat(text).toordinal()
+
+
+def log(student_id, date_str, hours, score, study_time, distractions):
+    return {'student_id': student_id, 'date': date_str, 'study_hours': hours, 'subject': 'Math',
+            'study_time': study_time, 'method_used': 'Pomodoro', 'distractions': distractions,
+            'quiz_score': score}
+
+
+# Student A (cluster 1) logs twice on Jan 2, back-dates Dec 31 and skips Jan 3; B has no cluster
+LOGS = [
+    log('A', '2024-01-01', 2.0, 80, 'Morning', 'Low'),
+    log('A', '2024-01-02', 3.0, None, 'Night', 'Low'),
+    log('A', '2024-01-02', 1.0, 90, 'Night', 'High'),
+    log('A', '2024-01-04', 4.0, 0, 'Morning', 'High'),  # a score of 0 means no quiz
+    log('A', '2023-12-31', 0.5, 70, 'Evening', 'None'),
+    log('B', '2024-01-02', 1.5, 60, 'Afternoon', 'Medium'),
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    storage = MemoryStorage() if request.param == 'memory' else SQLiteStorage(str(tmp_path / 'known.db'))
+    storage.add_student('A', {'name': 'Ann', 'email': 'a@example.com', 'cluster_id': 1, 'created_at': 'x'})
+    storage.add_student('B', {'name': 'Ben', 'email': 'b@example.com', 'cluster_id': None, 'created_at': 'x'})
+    stored = storage.add_logs(LOGS[:3])
+    stored += [storage.add_log(entry) for entry in LOGS[3:]]
+    assert [entry['log_id'] for entry in stored] == [1, 2, 3, 4, 5, 6]
+    yield storage
+    storage.close()
+
+
+def cluster_rows(storage, start=None, end=None):
+    """{(cluster_id, day): {field: value}} from cluster_daily_rollups"""
+    cluster_ids, days, values = storage.cluster_daily_rollups(start, end)
+    return {(int(c), int(d)): dict(zip(ROLLUP_FIELDS, v.tolist())) for c, d, v in zip(cluster_ids, days, values)}
+
+
+def assert_rows_equal(actual, expected):
+    assert set(actual) == set(expected)
+    for key, row in expected.items():
+        assert actual[key] == pytest.approx(row), key
+
+
+def rollup(sessions, hours, scores, student_days=1):
+    """Expected ROLLUP_FIELDS for one day from the (hours, score) pairs of its scored logs"""
+    return {
+        'sessions': sessions, 'hours_sum': hours,
+        'score_sum': sum(s for _, s in scores), 'score_count': len(scores),
+        'scored_hours_sum': sum(h for h, _ in scores), 'scored_hours_sq': sum(h * h for h, _ in scores),
+        'score_sq': sum(s * s for _, s in scores), 'hours_score': sum(h * s for h, s in scores),
+        'student_days': student_days
+    }
+
+
+def test_aggregates(storage):
+    stats = storage.student_aggregates('A')
+    assert stats.sessions == 5
+    assert stats.total_hours == pytest.approx(10.5)
+    assert stats.avg_hours == pytest.approx(2.1)
+    assert stats.avg_score == pytest.approx(80.0)  # (80 + 90 + 70) / 3: None and 0 aren't quizzes
+    # Low/High and Morning/Night tie at two each; the smallest value wins
+    assert stats.top_distraction == 'High'
+    assert stats.top_study_time == 'Morning'
+    assert storage.student_aggregates('nobody') is None
+
+
+def test_streaks(storage):
+    # Runs: Dec 31 - Jan 2 (3 days, joined by the back-dated log) and Jan 4
+    assert storage.student_streak('A', day('2024-01-04')) == (1, 3)
+    assert storage.student_streak('A', day('2024-01-03')) == (0, 3)
+    assert storage.student_streak('A', day('2024-01-02')) == (3, 3)
+    assert storage.student_streak('A', day('2024-01-01')) == (2, 3)
+    assert storage.student_streak('A', day('2024-01-05')) == (0, 3)
+    assert storage.student_streak('B', day('2024-01-02')) == (1, 1)
+    assert storage.student_streak('nobody', day('2024-01-02')) == (0, 0)
+
+
+def test_student_rollups(storage):
+    days, values = storage.student_daily_rollups('A')
+    assert days.tolist() == [day('2023-12-31'), day('2024-01-01'), day('2024-01-02'), day('2024-01-04')]
+    # sessions, hours_sum, score_sum, score_count
+    assert values.tolist() == [[1, 0.5, 70, 1], [1, 2.0, 80, 1], [2, 4.0, 90, 1], [1, 4.0, 0, 0]]
+
+    days, values = storage.student_daily_rollups('A', day('2024-01-01'), day('2024-01-03'))
+    assert days.tolist() == [day('2024-01-01'), day('2024-01-02')]
+    assert values.tolist() == [[1, 2.0, 80, 1], [2, 4.0, 90, 1]]
+
+
+def test_cluster_rollups(storage):
+    assert_rows_equal(cluster_rows(storage), {
+        (1, day('2023-12-31')): rollup(1, 0.5, [(0.5, 70)]),
+        (1, day('2024-01-01')): rollup(1, 2.0, [(2.0, 80)]),
+        # Two logs, one student-day; only the scored one feeds the score moments
+        (1, day('2024-01-02')): rollup(2, 4.0, [(1.0, 90)]),
+        (1, day('2024-01-04')): rollup(1, 4.0, []),
+        (UNASSIGNED, day('2024-01-02')): rollup(1, 1.5, [(1.5, 60)]),
+    })
+    assert set(cluster_rows(storage, day('2024-01-02'), day('2024-01-02'))) == {
+        (1, day('2024-01-02')), (UNASSIGNED, day('2024-01-02'))}
+
+
+def test_rebuild_moves_history_to_current_clusters(storage):
+    before = cluster_rows(storage)
+    storage.set_student_clusters([('A', 2), ('B', 1)])
+    storage.rebuild_cluster_rollups()
+    after = cluster_rows(storage)
+    moved = {(2 if cluster == 1 else 1, day_): row for (cluster, day_), row in before.items()}
+    assert_rows_equal(after, moved)
+
+
+def test_counters(storage):
+    counters = storage.analytics_counters()
+    assert counters['total_students'] == 2
+    assert counters['total_logs'] == 6
+    assert counters['active_students'] == 2
+    assert counters['hours_sum'] == pytest.approx(12.0)
+    assert {k: v for k, v in counters['cluster_counts'].items() if v} == {1: 1}
+
+
+def test_log_export_in_date_order(storage):
+    body = b''.join(encode_records(log_records(storage.iter_logs(chunk_size=2)), LOG_COLUMNS, 'csv')).decode()
+    lines = body.splitlines()
+    assert lines[0] == ','.join(LOG_COLUMNS)
+    # Date order, and insertion order within a date
+    assert [line.split(',')[0] for line in lines[1:]] == ['5', '1', '2', '3', '6', '4']
+    assert lines[1] == '5,A,2023-12-31,0.5,Math,Evening,Pomodoro,None,70'
+    assert lines[3] == '2,A,2024-01-02,3.0,Math,Night,Pomodoro,Low,'
+
+    ranged = [entry['log_id'] for chunk in storage.iter_logs('2024-01-02', '2024-01-03') for entry in chunk]
+    assert ranged == [2, 3, 6]
+    assert [entry['log_id'] for chunk in storage.iter_logs(cluster_id=1) for entry in chunk] == [5, 1, 2, 3, 4]
+
+
+def test_recent_and_latest_logs(storage):
+    assert [entry['log_id'] for entry in storage.latest_logs('A', 2)] == [3, 4]
+    assert [entry['log_id'] for entry in storage.recent_logs(3)][0] == 4
+
+
+def test_student_version_changes_with_logs_and_cluster(storage):
+    version = storage.student_version('A')
+    storage.add_log(log('A', '2024-01-05', 1.0, None, 'Morning', 'Low'))
+    assert storage.student_version('A') != version
+    version = storage.student_version('A')
+    storage.set_student_cluster('A', 3)
+    assert storage.student_version('A') != version
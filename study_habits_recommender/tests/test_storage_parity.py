@@ -0,0 +1,177 @@
+"""
+Both storage backends must report the same derived state for the same logs
+"""
+
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+
+from aggregates import MAX_LOG_DATE
+from exports import STUDENT_EXPORT_FIELDS, encode_records, log_records, student_records
+from rollups import UNASSIGNED
+from storage import LOG_COLUMNS, MemoryStorage, SQLiteStorage
+
+STUDENTS = [f'S{i:03d}' for i in range(12)]
+FIRST_DAY = date(2024, 1, 1).toordinal()
+TODAY = FIRST_DAY + 40
+
+
+def make_logs(seed=7, batches=15, batch_size=40):
+    """Batches of logs with repeated and back-dated days, quiz 0/None and frequency ties"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(batches):
+        batch = []
+        for _ in range(batch_size):
+            batch.append({
+                # One id with no student record, like logs for a deleted student
+                'student_id': rng.choice(STUDENTS + ['GHOST']),
+                'date': date.fromordinal(FIRST_DAY + rng.randrange(45)).isoformat(),
+                'study_hours': round(rng.uniform(0, 6), 1),
+                'subject': rng.choice(['Math', 'Physics', '']),
+                'study_time': rng.choice(['Morning', 'Night']),
+                'method_used': rng.choice(['Pomodoro', 'Flashcards']),
+                'distractions': rng.choice(['None', 'Low', 'High']),
+                'quiz_score': rng.choice([None, 0, rng.randint(30, 100)])
+            })
+        result.append(batch)
+    return result
+
+
+def load(storage, batches, seed=11):
+    """Add every student, then each batch followed by some cluster changes"""
+    rng = random.Random(seed)
+    for i, student_id in enumerate(STUDENTS):
+        storage.add_student(student_id, {'name': f'Student {i}', 'email': f'{student_id}@example.com',
+                                         'cluster_id': i % 3 if i % 4 else None,
+                                         'created_at': '2024-01-01T00:00:00'})
+    for batch in batches:
+        storage.add_logs(batch)
+        storage.set_student_clusters([(rng.choice(STUDENTS), rng.randrange(4)) for _ in range(3)])
+    return storage
+
+
+@pytest.fixture
+def backends(tmp_path):
+    batches = make_logs()
+    memory = load(MemoryStorage(), batches)
+    sqlite = load(SQLiteStorage(str(tmp_path / 'parity.db')), batches)
+    yield memory, sqlite
+    sqlite.close()
+
+
+def sorted_cluster_rollups(storage, start=None, end=None):
+    cluster_ids, days, values = storage.cluster_daily_rollups(start, end)
+    order = np.lexsort((days, cluster_ids))
+    return cluster_ids[order], days[order], values[order]
+
+
+def exported(storage, fmt):
+    logs = b''.join(encode_records(log_records(storage.iter_logs(chunk_size=64)), LOG_COLUMNS, fmt))
+    students = b''.join(encode_records(student_records(storage.iter_students(chunk_size=5)),
+                                       STUDENT_EXPORT_FIELDS, fmt))
+    return logs, students
+
+
+def test_counters_match(backends):
+    memory, sqlite = backends
+    expected, actual = memory.analytics_counters(), sqlite.analytics_counters()
+    for name in ('total_students', 'total_logs', 'active_students'):
+        assert actual[name] == expected[name]
+    assert actual['hours_sum'] == pytest.approx(expected['hours_sum'])
+    assert {k: v for k, v in actual['cluster_counts'].items() if v} == \
+        {k: v for k, v in expected['cluster_counts'].items() if v}
+
+
+@pytest.mark.parametrize('student_id', STUDENTS + ['GHOST', 'NOBODY'])
+def test_student_aggregates_match(backends, student_id):
+    memory, sqlite = backends
+    expected, actual = memory.student_aggregates(student_id), sqlite.student_aggregates(student_id)
+    if expected is None:
+        assert actual is None
+        return
+    assert actual.sessions == expected.sessions
+    assert actual.total_hours == pytest.approx(expected.total_hours)
+    assert actual.avg_score == pytest.approx(expected.avg_score)
+    # Frequency ties must resolve to the same value
+    assert actual.top_distraction == expected.top_distraction
+    assert actual.top_study_time == expected.top_study_time
+
+
+@pytest.mark.parametrize('today', [FIRST_DAY - 1, FIRST_DAY, FIRST_DAY + 20, FIRST_DAY + 44, TODAY + 30])
+def test_streaks_match(backends, today):
+    memory, sqlite = backends
+    for student_id in STUDENTS + ['GHOST', 'NOBODY']:
+        assert sqlite.student_streak(student_id, today) == memory.student_streak(student_id, today)
+
+
+def test_student_rollups_match(backends):
+    memory, sqlite = backends
+    for student_id in STUDENTS + ['GHOST', 'NOBODY']:
+        for start, end in [(None, None), (FIRST_DAY + 5, FIRST_DAY + 25)]:
+            expected_days, expected = memory.student_daily_rollups(student_id, start, end)
+            actual_days, actual = sqlite.student_daily_rollups(student_id, start, end)
+            np.testing.assert_array_equal(actual_days, expected_days)
+            np.testing.assert_allclose(actual, expected)
+
+
+@pytest.mark.parametrize('start, end', [(None, None), (FIRST_DAY + 10, FIRST_DAY + 30)])
+def test_cluster_rollups_match(backends, start, end):
+    memory, sqlite = backends
+    expected, actual = sorted_cluster_rollups(memory, start, end), sorted_cluster_rollups(sqlite, start, end)
+    np.testing.assert_array_equal(actual[0], expected[0])
+    np.testing.assert_array_equal(actual[1], expected[1])
+    np.testing.assert_allclose(actual[2], expected[2])
+
+
+def test_rebuilt_cluster_rollups_match(backends):
+    memory, sqlite = backends
+    _, _, before = sorted_cluster_rollups(memory)
+    for storage in backends:
+        rng = random.Random(3)
+        storage.set_student_clusters([(student_id, rng.randrange(5)) for student_id in STUDENTS])
+        storage.rebuild_cluster_rollups()
+    expected, actual = sorted_cluster_rollups(memory), sorted_cluster_rollups(sqlite)
+    np.testing.assert_array_equal(actual[0], expected[0])
+    np.testing.assert_array_equal(actual[1], expected[1])
+    np.testing.assert_allclose(actual[2], expected[2])
+    # Re-attributing moves the history between clusters without changing its totals
+    np.testing.assert_allclose(expected[2].sum(axis=0)[:-1], before.sum(axis=0)[:-1])
+    assert set(expected[0]) <= set(range(5)) | {UNASSIGNED}
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_exports_match(backends, fmt):
+    memory, sqlite = backends
+    assert exported(sqlite, fmt) == exported(memory, fmt)
+
+
+def test_cluster_filtered_logs_match(backends):
+    memory, sqlite = backends
+    for cluster_id in range(4):
+        expected = [log for chunk in memory.iter_logs(cluster_id=cluster_id) for log in chunk]
+        actual = [log for chunk in sqlite.iter_logs(cluster_id=cluster_id) for log in chunk]
+        assert actual == expected
+
+
+def test_out_of_range_dates_stay_in_parity(tmp_path):
+    # validate_log_batch rejects these, but stored data may predate the check
+    logs = [{'student_id': 'S000', 'date': day, 'study_hours': 1.0, 'subject': '', 'study_time': 'Night',
+             'method_used': '', 'distractions': 'None', 'quiz_score': None}
+            for day in ['0001-01-01', MAX_LOG_DATE, '9999-12-31', 'not a date']]
+    memory = load(MemoryStorage(), [logs])
+    sqlite = load(SQLiteStorage(str(tmp_path / 'dates.db')), [logs])
+    try:
+        for today in [1, date.fromisoformat(MAX_LOG_DATE).toordinal(), date.max.toordinal()]:
+            assert sqlite.student_streak('S000', today) == memory.student_streak('S000', today)
+        expected, actual = sorted_cluster_rollups(memory), sorted_cluster_rollups(sqlite)
+        np.testing.assert_array_equal(actual[1], expected[1])
+        np.testing.assert_allclose(actual[2], expected[2])
+        # Unparseable dates sort first in memory and last in SQLite, so compare the log export unordered
+        expected, actual = exported(memory, 'ndjson'), exported(sqlite, 'ndjson')
+        assert sorted(actual[0].splitlines()) == sorted(expected[0].splitlines())
+        assert actual[1] == expected[1]
+    finally:
+        sqlite.close()